@@ -1,7 +1,10 @@
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 from matplotlib.patches import Rectangle, Circle, Ellipse
 
+from geometry import locate_in_rects
+
 # 读取 Excel 文件
 def read_excel(file_path):
     excel_file = pd.ExcelFile(file_path)
@@ -13,8 +16,31 @@ def read_excel(file_path):
     }
     return data
 
+# 一次性确定所有病床所在的房间或办公室及其门的位置（办公室优先，与原来逐行查找的结果一致）
+# 返回与 bed_data 行对应的表：room_id / office_id / door_x / door_y，不在任何房间或办公室内时为 NaN
+def assign_beds(bed_data, room_data, office_data):
+    x = bed_data['x'].to_numpy(dtype=float)
+    y = bed_data['y'].to_numpy(dtype=float)
+    fields = ['x', 'y', 'width', 'height']
+    room = locate_in_rects(x, y, room_data[fields].to_numpy(dtype=float))
+    office = locate_in_rects(x, y, office_data[fields].to_numpy(dtype=float))
+
+    def column(table, index, name):
+        values = table[name].to_numpy()
+        return np.where(index >= 0, values[np.maximum(index, 0)] if values.size else np.nan, np.nan)
+
+    in_office = office >= 0
+    return pd.DataFrame({
+        'room_id': column(room_data, room, 'ID'),
+        'office_id': column(office_data, office, 'ID'),
+        'door_x': np.where(in_office, column(office_data, office, 'door_x'), column(room_data, room, 'door_x')),
+        'door_y': np.where(in_office, column(office_data, office, 'door_y'), column(room_data, room, 'door_y')),
+    }, index=bed_data.index)
+
+
 # 绘制单个病床及其对应的病人形状，并实现向门口移动
-def draw_bed_with_patient(bed_row, ax, room_data, office_data):
+# door_x / door_y 为病床所在房间或办公室的门（由 assign_beds 预先算好），没有时为 NaN
+def draw_bed_with_patient(bed_row, ax, door_x, door_y):
     x = bed_row['x']
     y = bed_row['y']
     width = bed_row['width']
@@ -25,22 +51,6 @@ def draw_bed_with_patient(bed_row, ax, room_data, office_data):
     bed_patch = Rectangle((x, y), width, height, edgecolor='black', facecolor='pink', linewidth=0.5)
     ax.add_patch(bed_patch)
 
-    # 确定门的位置信息（这里假设每个病床所在房间或办公室只有一个门）
-    room_id = None
-    office_id = None
-    for index, room_row in room_data.iterrows():
-        if x >= room_row['x'] and x <= room_row['x'] + room_row['width'] and y >= room_row['y'] and y <= room_row['y'] + room_row['height']:
-            room_id = room_row['ID']
-            door_x = room_row['door_x']
-            door_y = room_row['door_y']
-            break
-    for index, office_row in office_data.iterrows():
-        if x >= office_row['x'] and x <= office_row['x'] + office_row['width'] and y >= office_row['y'] and y <= office_row['y'] + office_row['height']:
-            office_id = office_row['ID']
-            door_x = office_row['door_x']
-            door_y = office_row['door_y']
-            break
-
     # 根据病人状态绘制不同形状
     if patient_state == 'SAP':
         patient_x = x + width / 2
@@ -62,7 +72,7 @@ def draw_bed_with_patient(bed_row, ax, room_data, office_data):
 
     # 计算移动方向和距离（简单示例，这里假设每次移动固定距离 0.1 向门靠近）
     move_distance = 0.1
-    if room_id is not None or office_id is not None:
+    if not (pd.isna(door_x) or pd.isna(door_y)):
         if patient_x < door_x:
             patient_x += move_distance
         elif patient_x > door_x:
@@ -156,9 +166,10 @@ def plot_building_plan(data):
         ax.add_patch(Rectangle((door_x, door_y), door_width, wall_thickness, edgecolor='red', facecolor='red',
                                linewidth=0.2))
 
-    # 绘制病床及病人形状，并传递房间和办公室数据
-    for index, row in data['bed'].iterrows():
-        draw_bed_with_patient(row, ax, data['room'], data['office'])
+    # 绘制病床及病人形状，门的位置一次性查好
+    doors = assign_beds(data['bed'], data['room'], data['office'])
+    for (index, row), door_x, door_y in zip(data['bed'].iterrows(), doors['door_x'], doors['door_y']):
+        draw_bed_with_patient(row, ax, door_x, door_y)
 
     # 设置坐标轴范围和标签
     plt.gcf().set_size_inches(10, 8)  # 设置图形的大小为宽度 10 英寸，高度 8 英寸
@@ -2,6 +2,8 @@ import numpy as np
 import random
 import matplotlib.pyplot as plt
 import matplotlib.animation as animation
+from geometry import bed_bounds, rects_to_bounds
+from renderer import FloorPlanRenderer, FrameCost
 
 # 病床类
 class Bed:
@@ -43,6 +45,7 @@ class Patient:
         self.bed = bed
         self.target_dx = 0
         self.target_dy = 0
+        self.evacuated = False
         if bed_index <= 2:
             self.speed = 0.05
         elif 3 <= bed_index < 5:
@@ -100,7 +103,7 @@ class Patient:
 
                 # 判断是否到达最近的楼梯间门口
                 if distance_to_stair_door <= self.speed:
-                    room.patients.remove(self)
+                    self.evacuated = True
 
             # 更新病人位置
             self.x += self.vx
@@ -309,151 +312,94 @@ room22.initialize_patients()
 
 rooms_one= [room1, room2,room6,room7,room11,room12,room16,room17,room21,room22]
 rooms_two= [room3,room4,room5,room8,room9,room10,room13,room14,room15,room18,room19,room20]
+# 仍在疏散中的病人，只在开始时收集一次
+active_patients = [patient for room in rooms_one + rooms_two for patient in room.patients]
 # 更新病人位置
 def update_patients():
-    all_patients = room1.patients + room2.patients+ room3.patients + room4.patients + room5.patients + room6.patients + room7.patients + room8.patients + room9.patients + room10.patients + room11.patients +room12.patients+ room13.patients + room14.patients + room15.patients + room16.patients + room17.patients + room18.patients + room19.patients + room20.patients + room21.patients+ room22.patients
-    all_evacuated = True
-    for patient in all_patients:
-        if patient in room1.patients or patient in room2.patients or patient in room3.patients or patient in room4.patients or patient in room5.patients or patient in room6.patients or patient in room7.patients or patient in room8.patients or patient in room9.patients or patient in room10.patients or patient in room11.patients or  patient in room12.patients or patient in room13.patients or patient in room14.patients or patient in room15.patients or patient in room16.patients or patient in room17.patients or patient in room18.patients or patient in room19.patients or patient in room20.patients or patient in room21.patients or patient in room22.patients:
-            all_evacuated = False
-            patient.update_position()
-    return all_evacuated
+    # 疏散完成的病人用列表末尾的病人填补其位置（swap-remove），每步只遍历仍在疏散中的病人
+    i = 0
+    while i < len(active_patients):
+        patient = active_patients[i]
+        patient.update_position()
+        if patient.evacuated:
+            active_patients[i] = active_patients[-1]
+            active_patients.pop()
+        else:
+            i += 1
+    return not active_patients
 
 
 # 创建图形窗口
 fig, ax = plt.subplots()
 
-def draw():
-    ax.set_xlim(0, 20)  # 根据实际情况调整合适的坐标轴范围
-    ax.set_ylim(-2, 20)
-    ax.set_aspect('equal', adjustable='box')
-    ax.cla()
+# 平面图的矩形 (x, y, width, height)：墙壁、门和房间内部空间，位置与原来每帧重画时完全相同，只计算一次
+def floor_plan():
     wall_thickness = 0.37
-    # 绘制楼梯间
-    for staircase in staircases_one:
-        # 绘制楼梯的墙壁
-        left_wall = plt.Rectangle((staircase.x,staircase.y), wall_thickness, staircase.height+wall_thickness*2 , color='black', lw=2, ec="black", fill=True)
-        ax.add_patch(left_wall)
-
-        right_wall = plt.Rectangle((staircase.x + staircase.width + wall_thickness, staircase.y), wall_thickness, staircase.height+wall_thickness*2, color='black', lw=2, ec="black", fill=True)
-        ax.add_patch(right_wall)
-
-        bottom_wall = plt.Rectangle((staircase.x+wall_thickness, staircase.y), staircase.width, wall_thickness, color='black', lw=2, ec="black", fill=True)
-        ax.add_patch(bottom_wall)
+    walls, doors, interiors = [], [], []
 
-        top_wall = plt.Rectangle((staircase.x + wall_thickness + staircase.door_width, staircase.y + staircase.height + wall_thickness), staircase.width - staircase.door_width, 0.37, color='black', lw=2, ec="black", fill=True)
-        ax.add_patch(top_wall)
+    def shell(obj):
+        # 左侧、右侧的墙壁
+        walls.append((obj.x, obj.y, wall_thickness, obj.height + wall_thickness * 2))
+        walls.append((obj.x + obj.width + wall_thickness, obj.y, wall_thickness, obj.height + wall_thickness * 2))
 
-        # 绘制楼梯的门
-        door = plt.Rectangle((staircase.door_x - staircase.door_width / 2, staircase.door_y), staircase.door_width, wall_thickness,color='brown', lw=2, ec="black")
-        ax.add_patch(door)
+    def door(obj):
+        doors.append((obj.door_x - obj.door_width / 2, obj.door_y, obj.door_width, wall_thickness))
 
+    top = lambda obj: obj.y + obj.height + wall_thickness
+    # 楼梯间：门在上侧左端 / 下侧右端
+    for staircase in staircases_one:
+        shell(staircase)
+        walls.append((staircase.x + wall_thickness, staircase.y, staircase.width, wall_thickness))
+        walls.append((staircase.x + wall_thickness + staircase.door_width, top(staircase),
+                      staircase.width - staircase.door_width, wall_thickness))
+        door(staircase)
     for staircase in staircases_two:
-        # 绘制楼梯的墙壁
-        left_wall = plt.Rectangle((staircase.x,staircase.y), wall_thickness, staircase.height+wall_thickness*2 , color='black', lw=2, ec="black", fill=True)
-        ax.add_patch(left_wall)
-
-        right_wall = plt.Rectangle((staircase.x + staircase.width + wall_thickness, staircase.y), wall_thickness, staircase.height+wall_thickness*2, color='black', lw=2, ec="black", fill=True)
-        ax.add_patch(right_wall)
-
-        bottom_wall = plt.Rectangle((staircase.x+wall_thickness, staircase.y), staircase.width-staircase.door_width, wall_thickness, color='black', lw=2, ec="black", fill=True)
-        ax.add_patch(bottom_wall)
-
-        top_wall = plt.Rectangle((staircase.x + wall_thickness , staircase.y + staircase.height + wall_thickness), staircase.width , 0.37, color='black', lw=2, ec="black", fill=True)
-        ax.add_patch(top_wall)
-
-        # 绘制楼梯的门
-        door = plt.Rectangle((staircase.door_x - staircase.door_width / 2, staircase.door_y), staircase.door_width, wall_thickness,color='brown', lw=2, ec="black")
-        ax.add_patch(door)
-
+        shell(staircase)
+        walls.append((staircase.x + wall_thickness, staircase.y, staircase.width - staircase.door_width, wall_thickness))
+        walls.append((staircase.x + wall_thickness, top(staircase), staircase.width, wall_thickness))
+        door(staircase)
+    # 办公室：四面墙完整，门画在墙上
     for office in offices:
-        # 绘制办公室的墙壁
-        left_wall = plt.Rectangle((office.x,office.y), wall_thickness, office.height+wall_thickness*2 , color='black', lw=2, ec="black", fill=True)
-        ax.add_patch(left_wall)
-
-        right_wall = plt.Rectangle((office.x + office.width + wall_thickness, office.y), wall_thickness, office.height+wall_thickness*2, color='black', lw=2, ec="black", fill=True)
-        ax.add_patch(right_wall)
-
-        bottom_wall = plt.Rectangle((office.x+wall_thickness, office.y), office.width, wall_thickness, color='black', lw=2, ec="black", fill=True)
-        ax.add_patch(bottom_wall)
-
-        top_wall = plt.Rectangle((office.x+wall_thickness, office.y + office.height + wall_thickness), office.width , wall_thickness, color='black', lw=2, ec="black", fill=True)
-        ax.add_patch(top_wall)
-
-        # 绘制办公室的门
-        door = plt.Rectangle((office.door_x - office.door_width / 2, office.door_y), office.door_width, wall_thickness, color='brown', lw=2, ec="black")
-        ax.add_patch(door)
-
-    # 绘制房间的墙壁
+        shell(office)
+        walls.append((office.x + wall_thickness, office.y, office.width, wall_thickness))
+        walls.append((office.x + wall_thickness, top(office), office.width, wall_thickness))
+        door(office)
+    # 房间：门在上侧右端 / 上侧中间
     for room in rooms_one:
-
-        #绘制左侧墙壁
-        left_wall = plt.Rectangle((room.x, room.y), wall_thickness, room.height+wall_thickness*2 , color='black', lw=2, ec="black", fill=True)
-        ax.add_patch(left_wall)
-        #绘制右侧墙壁
-        right_wall = plt.Rectangle((room.x + room.width + wall_thickness, room.y), wall_thickness, room.height+wall_thickness*2 , color='black', lw=2, ec="black", fill=True)
-        ax.add_patch(right_wall)
-        #绘制下侧墙壁
-        bottom_wall = plt.Rectangle((room.x+wall_thickness, room.y), room.width , wall_thickness, color='black', lw=2, ec="black", fill=True)
-        ax.add_patch(bottom_wall)
-        # 绘制上部墙壁
-        top_wall = plt.Rectangle((room.x + wall_thickness, room.y + room.height + wall_thickness), room.width - room.door_width, wall_thickness, color='black', lw=2, ec="black", fill=True)
-        ax.add_patch(top_wall)
-
-        # 绘制房间内部空间
-        inner_rect = plt.Rectangle((room.x + wall_thickness, room.y + wall_thickness), room.width ,room.height , color='lightblue' , lw=2, ec="black")
-        ax.add_patch(inner_rect)
-
-        # 绘制房间的门
-        door = plt.Rectangle((room.door_x - room.door_width / 2, room.door_y), room.door_width, wall_thickness, color='brown', lw=2, ec="black")
-        ax.add_patch(door)
-
-        for bed in room1.beds + room2.beds + room6.beds + room7.beds+ room11.beds + room12.beds + room16.beds + room17.beds + room21.beds+ room22.beds:
-            ax.add_patch(plt.Rectangle((bed.x, bed.y), bed.width, bed.height, color='brown', lw=2, ec="black"))
-
+        shell(room)
+        walls.append((room.x + wall_thickness, room.y, room.width, wall_thickness))
+        walls.append((room.x + wall_thickness, top(room), room.width - room.door_width, wall_thickness))
+        interiors.append((room.x + wall_thickness, room.y + wall_thickness, room.width, room.height))
+        door(room)
     for room in rooms_two:
-        # 绘制房间的墙壁
-        # 绘制左侧墙壁
-        left_wall = plt.Rectangle((room.x, room.y), wall_thickness, room.height + wall_thickness * 2, color='black', lw=2, ec="black", fill=True)
-        ax.add_patch(left_wall)
-        # 绘制右侧墙壁
-        right_wall = plt.Rectangle((room.x + room.width + wall_thickness, room.y), wall_thickness, room.height + wall_thickness * 2, color='black', lw=2, ec="black", fill=True)
-        ax.add_patch(right_wall)
-        # 绘制下侧墙壁
-        bottom_wall = plt.Rectangle((room.x + wall_thickness, room.y), room.width, wall_thickness, color='black', lw=2, ec="black", fill=True)
-        ax.add_patch(bottom_wall)
-        # 绘制上部墙壁(左侧)
-        top_wall_left = plt.Rectangle((room.x + wall_thickness, room.y + room.height + wall_thickness), room.width/2 - room.door_width/2, wall_thickness, color='black', lw=2, ec="black",fill=True)
-        ax.add_patch(top_wall_left)
-        # 绘制上部墙壁(右侧)
-        top_wall_right = plt.Rectangle((room.x + wall_thickness + room.width/2 + room.door_width/2, room.y + room.height + wall_thickness), room.width/2 - room.door_width/2, wall_thickness, color='black', lw=2, ec="black", fill=True)
-        ax.add_patch(top_wall_right)
-        # 绘制房间内部空间
-        inner_rect = plt.Rectangle((room.x + wall_thickness, room.y + wall_thickness), room.width, room.height,color='lightblue', lw=2)
-        ax.add_patch(inner_rect)
-        #绘制房间的门
-        door = plt.Rectangle((room.door_x - room.door_width / 2, room.door_y), room.door_width, 0.37, color='brown', lw=2, ec="black")
-        ax.add_patch(door)
-
-    # 绘制房间的病床
-    for bed in  room3.beds + room4.beds + room5.beds + room8.beds+ room9.beds + room10.beds+room13.beds + room14.beds + room15.beds + room18.beds+ room19.beds + room20.beds:
-        ax.add_patch(plt.Rectangle((bed.x, bed.y), bed.width, bed.height, color='brown', lw=2, ec="black"))
-
-        # 绘制病人（遍历所有房间的病人列表合并后的数据）
-        all_patients = []
-        for room in rooms_one:
-            all_patients.extend(room.patients)
-        for room in rooms_two:
-            all_patients.extend(room.patients)
-        for patient in all_patients:
-            ax.plot(patient.x, patient.y, 'ro', markersize=1)
+        shell(room)
+        walls.append((room.x + wall_thickness, room.y, room.width, wall_thickness))
+        half = room.width / 2 - room.door_width / 2
+        walls.append((room.x + wall_thickness, top(room), half, wall_thickness))
+        walls.append((room.x + wall_thickness + room.width / 2 + room.door_width / 2, top(room), half, wall_thickness))
+        interiors.append((room.x + wall_thickness, room.y + wall_thickness, room.width, room.height))
+        door(room)
+    return rects_to_bounds(walls), rects_to_bounds(doors), rects_to_bounds(interiors)
+
+
+# 静态的平面图只绘制一次，之后每帧只更新病人位置
+walls, doors, interiors = floor_plan()
+renderer = FloorPlanRenderer(ax, walls, doors, interiors, bed_bounds(rooms_one + rooms_two))
+# 保留模式下每帧不应新建任何绘图对象，例如每帧重画平面图或逐个重画病人都会超出预算
+frame_cost = FrameCost(ax, budget=0)
+
+def draw():
+    return renderer.update([patient.x for patient in active_patients], [patient.y for patient in active_patients])
 
 # 动画函数
 def animate(i):
     if update_patients():
         ani.event_source.stop()
-    draw()
+    artists = draw()
+    frame_cost.record()
+    return artists
 
 
-ani = animation.FuncAnimation(fig, animate, frames=200, interval=50, repeat=False)
+# 病人散点是 animated 对象，只在 blit 时绘制
+ani = animation.FuncAnimation(fig, animate, init_func=renderer.init, frames=200, interval=50, repeat=False, blit=True)
 plt.show()
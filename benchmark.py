@@ -0,0 +1,165 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from engine import PatientEngine
+from layout import compile_layout, read_layout, stamp_layout
+from navigation import NavigationField
+from runner import run
+from sweep import code_version
+
+TEMPLATE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'layouts', 'ward.json')
+DEFAULT_SIZES = (100, 1000, 10000, 100000)
+
+# 引擎的几种实现方式：(名称, 构造参数)。每种都测全部规模：导航距离场的计算量与平面面积成正比，
+# 两两比较的避让是 O(n^2)，大规模时由 time_limit 限制建立距离场和运行的时间，记录下超时或只跑了部分步数的结果
+VARIANTS = (
+    ('hash+nav', {'neighbor_search': 'hash', 'navigation': True}),
+    ('hash', {'neighbor_search': 'hash', 'navigation': False}),
+    ('dense', {'neighbor_search': 'dense', 'navigation': False}),
+)
+MEMORY_STEPS = 50  # 测量内存峰值时推进的步数
+
+
+def synthetic_ward(patients, template=TEMPLATE, all_exits=False):
+    # 按 simulation.py 病区的样式（3 床和 6 床的房间沿走廊排列，两端和中间有楼梯间）复制出至少 patients 个床位
+    spec = read_layout(template)
+    per_copy = sum(len(room.get('beds', [])) for room in spec['rooms']) + len(spec.get('beds', []))
+    copies = max(int(np.ceil(patients / per_copy)), 1)
+    return compile_layout(stamp_layout(spec, copies, all_exits=all_exits)), copies
+
+
+def measure(layout, options, max_steps, time_limit):
+    # 一次测量：建立引擎并运行到全部疏散（或达到步数/时间上限），再单独测一次内存峰值。
+    # 导航距离场的建立同样受 time_limit 限制，超时只记录建立用时；运行超时记录已完成的步数
+    options = dict(options)
+    start = time.perf_counter()
+    if options.get('navigation') is True:
+        try:
+            options['navigation'] = NavigationField(layout.walls, layout.exit_stair_doors, time_limit=time_limit)
+        except TimeoutError:
+            return {'patients': int(layout.beds.shape[0]), 'build_s': time.perf_counter() - start,
+                    'timed_out': 'build'}
+    engine = PatientEngine.from_layout(layout, **options)
+    build_s = time.perf_counter() - start
+    start = time.perf_counter()
+    result = run(engine, max_steps, time_limit=time_limit)
+    wall_s = time.perf_counter() - start
+
+    # tracemalloc 会拖慢分配，因此与计时分开：重新建立引擎并推进 MEMORY_STEPS 步（同样受 time_limit 限制）。
+    # 导航距离场沿用上面建好的，不再重复计算
+    tracemalloc.start()
+    engine = PatientEngine.from_layout(layout, **options)
+    run(engine, MEMORY_STEPS, time_limit=time_limit)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    step_ms = result.step_ns / 1e6
+    entry = {
+        'patients': int(len(engine)),
+        'build_s': build_s,
+        'steps': result.steps,
+        'evacuated': bool(result.evacuated),
+        'evacuation_step': result.evacuation_step,
+        'evacuation_time': result.evacuation_time,
+        'wall_s': wall_s,
+        'steps_per_sec': result.steps / (step_ms.sum() / 1e3) if result.steps else None,
+        'step_ms_mean': float(step_ms.mean()) if result.steps else None,
+        'step_ms_p95': float(np.percentile(step_ms, 95)) if result.steps else None,
+        'peak_mib': peak / 2 ** 20,
+    }
+    if not result.evacuated and result.steps < max_steps:
+        entry['timed_out'] = 'run'
+    return entry
+
+
+def run_benchmark(sizes=DEFAULT_SIZES, variants=None, max_steps=100000, time_limit=60.0, log=None):
+    results = []
+    for size in sizes:
+        layout, copies = synthetic_ward(size)
+        for name, options in VARIANTS:
+            if variants is not None and name not in variants:
+                continue
+            entry = {'size': size, 'copies': copies, 'variant': name}
+            entry.update(measure(layout, options, max_steps, time_limit))
+            results.append(entry)
+            if log is not None:
+                log(_format(entry))
+    return {
+        'code_version': code_version(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'results': results,
+    }
+
+
+def _format(entry):
+    if entry.get('timed_out') == 'build':
+        return "%7d %-9s navigation field not built within %.1f s" % (entry['size'], entry['variant'],
+                                                                      entry['build_s'])
+    line = "%7d %-9s %8.1f steps/s  %8.1f MiB  evacuation step %-6s  %6.1f s" % (
+        entry['size'], entry['variant'], entry['steps_per_sec'] or 0, entry['peak_mib'],
+        entry['evacuation_step'], entry['wall_s'])
+    if entry.get('timed_out') == 'run':
+        line += "  (timed out after %d steps)" % entry['steps']
+    return line
+
+
+def compare(old, new, tolerance=0.2):
+    # 与以前的结果比较，返回 (性能退化, 结果变化) 两个列表：
+    # 步速下降或内存增长超过 tolerance 记为退化，疏散步数不同记为结果变化
+    # 跳过或距离场超时的结果没有步速和内存，不参与比较；运行超时的结果只比较步速和内存
+    previous = {(entry['size'], entry['variant']): entry for entry in old['results'] if 'steps' in entry}
+    regressions, changes = [], []
+    for entry in new['results']:
+        before = previous.get((entry['size'], entry['variant']))
+        if before is None or 'steps' not in entry:
+            continue
+        label = "%d %s" % (entry['size'], entry['variant'])
+        if before['steps_per_sec'] and entry['steps_per_sec'] is not None and \
+                entry['steps_per_sec'] < before['steps_per_sec'] * (1 - tolerance):
+            regressions.append("%s: %.1f -> %.1f steps/s" % (label, before['steps_per_sec'], entry['steps_per_sec']))
+        if entry['peak_mib'] > before['peak_mib'] * (1 + tolerance):
+            regressions.append("%s: %.1f -> %.1f MiB" % (label, before['peak_mib'], entry['peak_mib']))
+        if before['evacuated'] and entry['evacuated'] and before['evacuation_step'] != entry['evacuation_step']:
+            changes.append("%s: evacuation step %s -> %s" % (label, before['evacuation_step'],
+                                                              entry['evacuation_step']))
+    return regressions, changes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scaling benchmark on synthetic copies of the ward layout")
+    parser.add_argument('--sizes', default=','.join(str(size) for size in DEFAULT_SIZES),
+                        help="comma separated patient counts")
+    parser.add_argument('--variants', help="comma separated subset of %s" % ', '.join(v[0] for v in VARIANTS))
+    parser.add_argument('--max-steps', type=int, default=100000)
+    parser.add_argument('--time-limit', type=float, default=60.0, help="seconds per navigation field build and per run before stopping early")
+    parser.add_argument('--output', default='benchmark.json')
+    parser.add_argument('--compare', help="earlier benchmark JSON to check for regressions")
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args()
+
+    report = run_benchmark([int(size) for size in args.sizes.split(',')],
+                           args.variants.split(',') if args.variants else None,
+                           args.max_steps, args.time_limit, log=print)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print("written to %s" % args.output)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions, changes = compare(json.load(f), report, args.tolerance)
+        for line in changes:
+            print("changed:    " + line)
+        for line in regressions:
+            print("regression: " + line)
+        if regressions:
+            sys.exit(1)
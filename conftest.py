@@ -0,0 +1 @@
+# 测试直接导入仓库根目录下的模块（engine、navigation 等），pytest 会把本文件所在的目录加入 sys.path
@@ -0,0 +1,173 @@
+import sys
+
+import numpy as np
+
+
+# 密度/拥堵累计：平面划分为固定网格，每步把活动病人的位置归入格子，只对有人的格子做更新（代价与活动人数成正比）。
+# 得到三张 (行, 列) 数组：
+#   integrated  人·步，每个格子中病人数对时间的累计（除以步数和格子面积即为平均密度）
+#   peak        单步内出现过的最大人数（除以格子面积即为峰值密度，人/m²）
+#   dwell       有人停留的步数
+# 给出区域划分（regions.RegionMap）时，另外按区域（房间、走廊、楼梯间等）累计人·步和单步最大人数
+class DensityAccumulator:
+    def __init__(self, bounds, cell_size=0.5, regions=None):
+        x0, y0, x1, y1 = (float(value) for value in bounds)
+        self.origin = (x0, y0)
+        self.cell_size = float(cell_size)
+        self.shape = (max(int(np.ceil((y1 - y0) / cell_size)), 1), max(int(np.ceil((x1 - x0) / cell_size)), 1))
+        size = self.shape[0] * self.shape[1]
+        self.integrated = np.zeros(size, dtype=np.int64)
+        self.peak = np.zeros(size, dtype=np.int64)
+        self.dwell = np.zeros(size, dtype=np.int64)
+        self.steps = 0
+        self.regions = regions
+        self.region_area = None if regions is None else regions.areas
+        self.region_integrated = None if regions is None else np.zeros(len(regions), dtype=np.int64)
+        self.region_peak = None if regions is None else np.zeros(len(regions), dtype=np.int64)
+
+    @classmethod
+    def for_walls(cls, walls, cell_size=0.5, margin=1.0, regions=None):
+        # 网格覆盖全部墙壁（(n, 4) 的 (x0, y0, x1, y1) 数组）外加 margin
+        walls = np.asarray(walls, dtype=float).reshape(-1, 4)
+        bounds = (walls[:, 0].min() - margin, walls[:, 1].min() - margin,
+                  walls[:, 2].max() + margin, walls[:, 3].max() + margin)
+        return cls(bounds, cell_size, regions)
+
+    @classmethod
+    def attach(cls, engine, walls, cell_size=0.5, margin=1.0):
+        # 建立覆盖平面的累计器并加入 engine.observers；引擎有区域划分时同时按区域累计
+        density = cls.for_walls(walls, cell_size, margin, engine.regions)
+        engine.observers.append(density)
+        return density
+
+    @property
+    def cell_area(self):
+        return self.cell_size ** 2
+
+    def add(self, x, y, region=None):
+        # 累计一步：x, y 为这一步所有病人的坐标，网格外的坐标忽略；
+        # region 为已经算好的区域编号（例如 engine.region），不给时由 regions 查表
+        j = np.floor((np.asarray(x) - self.origin[0]) / self.cell_size).astype(np.intp)
+        i = np.floor((np.asarray(y) - self.origin[1]) / self.cell_size).astype(np.intp)
+        inside = (i >= 0) & (i < self.shape[0]) & (j >= 0) & (j < self.shape[1])
+        cells, counts = np.unique(i[inside] * self.shape[1] + j[inside], return_counts=True)
+        self.integrated[cells] += counts
+        self.peak[cells] = np.maximum(self.peak[cells], counts)
+        self.dwell[cells] += 1
+        if self.regions is not None:
+            if region is None:
+                region = self.regions.locate(x, y)
+            region = np.asarray(region)
+            counts = np.bincount(region[region >= 0], minlength=self.region_integrated.size)
+            self.region_integrated += counts
+            self.region_peak = np.maximum(self.region_peak, counts)
+        self.steps += 1
+
+    def observe(self, engine, arrived):
+        x, y = engine.positions()
+        # 与引擎使用同一份区域划分时，直接使用引擎本步算好的区域编号
+        self.add(x, y, engine.region[:engine.n_active] if engine.regions is self.regions else None)
+
+    def merge(self, other):
+        # 合并另一次运行（同一网格）的结果：人·步和停留步数相加，峰值取较大者
+        self.integrated += other.integrated
+        self.peak = np.maximum(self.peak, other.peak)
+        self.dwell += other.dwell
+        if self.region_integrated is not None and other.region_integrated is not None:
+            self.region_integrated += other.region_integrated
+            self.region_peak = np.maximum(self.region_peak, other.region_peak)
+        self.steps += other.steps
+        return self
+
+    def arrays(self):
+        # 导出为 (行, 列) 数组，密度单位为 人/m²
+        shape = self.shape
+        arrays = {
+            'origin': np.asarray(self.origin),
+            'cell_size': np.float64(self.cell_size),
+            'steps': np.int64(self.steps),
+            'integrated': self.integrated.reshape(shape),
+            'mean_density': (self.integrated / (max(self.steps, 1) * self.cell_area)).reshape(shape),
+            'peak_density': (self.peak / self.cell_area).reshape(shape),
+            'dwell': self.dwell.reshape(shape),
+        }
+        if self.region_integrated is not None:
+            # 按区域的结果，顺序与 RegionMap 的区域编号一致
+            area = np.maximum(self.region_area, 1e-12)
+            arrays.update({
+                'region_area': self.region_area,
+                'region_integrated': self.region_integrated,
+                'region_mean_density': self.region_integrated / (max(self.steps, 1) * area),
+                'region_peak_density': self.region_peak / area,
+            })
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        origin = arrays['origin']
+        cell_size = float(arrays['cell_size'])
+        shape = arrays['integrated'].shape
+        density = cls((origin[0], origin[1], origin[0] + shape[1] * cell_size, origin[1] + shape[0] * cell_size),
+                      cell_size)
+        density.integrated = arrays['integrated'].ravel().astype(np.int64)
+        density.peak = np.round(arrays['peak_density'] * density.cell_area).ravel().astype(np.int64)
+        density.dwell = arrays['dwell'].ravel().astype(np.int64)
+        density.steps = int(arrays['steps'])
+        if 'region_integrated' in arrays:
+            density.region_area = np.asarray(arrays['region_area'], dtype=float)
+            density.region_integrated = arrays['region_integrated'].astype(np.int64)
+            density.region_peak = np.round(arrays['region_peak_density'] * density.region_area).astype(np.int64)
+        return density
+
+    def save(self, path):
+        np.savez(path, **self.arrays())
+
+    @property
+    def extent(self):
+        x0, y0 = self.origin
+        return (x0, x0 + self.shape[1] * self.cell_size, y0, y0 + self.shape[0] * self.cell_size)
+
+    def render(self, ax, field='peak_density', walls=(), doors=(), beds=(), cmap='inferno_r'):
+        # 在 ax 上画出热力图（没有人到过的格子透明），并用 FloorPlanRenderer 叠加墙壁、门和病床
+        from renderer import FloorPlanRenderer
+        values = np.ma.masked_equal(self.arrays()[field], 0)
+        image = ax.imshow(values, origin='lower', extent=self.extent, cmap=cmap, interpolation='nearest', zorder=0)
+        FloorPlanRenderer(ax, walls, doors, beds=beds)
+        return image
+
+    def export_images(self, prefix, walls=(), doors=(), beds=(), fields=('mean_density', 'peak_density', 'dwell')):
+        # 每个字段保存一张 PNG：prefix_字段名.png
+        import matplotlib.pyplot as plt
+        labels = {'mean_density': 'mean density (persons/m²)', 'peak_density': 'peak density (persons/m²)',
+                  'dwell': 'occupied steps', 'integrated': 'person-steps'}
+        paths = []
+        for field in fields:
+            fig, ax = plt.subplots(figsize=(14, 3))
+            image = self.render(ax, field, walls, doors, beds)
+            fig.colorbar(image, ax=ax, label=labels.get(field, field))
+            path = '%s_%s.png' % (prefix, field)
+            fig.savefig(path, dpi=150, bbox_inches='tight')
+            plt.close(fig)
+            paths.append(path)
+        return paths
+
+
+if __name__ == "__main__":
+    # 用法：python density.py 布局文件 输出前缀 [格子边长]
+    # 运行一次布局，保存 输出前缀.npz 和每个字段的热力图 PNG
+    import matplotlib
+    matplotlib.use('Agg')
+    from engine import PatientEngine
+    from layout import load_layout
+    from runner import run
+
+    args = sys.argv[1:]
+    if len(args) < 2:
+        sys.exit("usage: python density.py LAYOUT PREFIX [CELL_SIZE]")
+    layout = load_layout(args[0])
+    engine = PatientEngine.from_layout(layout, regions=True)
+    density = DensityAccumulator.attach(engine, layout.walls, float(args[2]) if len(args) > 2 else 0.5)
+    print(run(engine).summary())
+    density.save(args[1] + '.npz')
+    for path in density.export_images(args[1], layout.walls, layout.doors, layout.bed_bounds):
+        print(path)
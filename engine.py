@@ -0,0 +1,380 @@
+import numpy as np
+
+from navigation import NavigationField
+from obstacles import KIND_BED, ObstacleIndex
+from regions import KIND_STAIR, OUTSIDE, RegionMap
+from spatial_hash import SpatialHash
+
+# 病人所处阶段：房间 -> 门口 -> 走廊 -> 楼梯间入口 -> 楼梯间出口。
+# 每步先用掩码对全部病人判断阶段转换，再按阶段计算速度，最后统一积分一次
+PHASE_TO_DOOR = 0  # 在房间内朝房间门口移动
+PHASE_TO_STAIR = 1  # 到达门口后沿走廊朝最近的楼梯间入口（楼梯间门）移动
+PHASE_IN_STAIR = 2  # 进入楼梯间后朝楼梯间出口移动（只在设置了 stair_exits 时使用）
+PHASE_DONE = 3  # 已疏散
+
+# 物理时间：速度单位为 m/s，每步推进固定的 dt 秒，与绘图的帧间隔无关
+DEFAULT_DT = 0.05
+# 按床号分配的步行速度（m/s）：需要搀扶的病人、行动较慢的病人、正常步行的成年人
+SPEED_CLASSES = (0.6, 0.9, 1.2)
+# 每个相邻病人产生的避让速度（m/s），与最慢一档的步行速度相同
+AVOID_GAIN = 0.6
+# 原脚本中 FuncAnimation 的帧间隔（50 ms），Patient.speed 是每帧移动的距离
+LEGACY_FRAME = 0.05
+# 原脚本的标定：每帧 0.1、0.2、0.3 m 的速度和 0.1 m 的避让按 LEGACY_FRAME 换算，步数与原脚本完全一致，
+# 但相当于 2~6 m/s 的奔跑速度，由此得到的秒数不是真实的疏散时间
+LEGACY_SPEED_CLASSES = (2.0, 4.0, 6.0)
+LEGACY_AVOID_GAIN = 2.0
+# 'dense' 邻居搜索每块两两矩阵的元素数上限（约 32 MiB 的 float64）
+DENSE_BLOCK = 1 << 22
+
+
+def bed_speeds(bed_index, speed_classes=SPEED_CLASSES):
+    # 按病床在房间中的序号分配速度，与 Patient 中的规则一致：0~2 号床、3~4 号床、其余
+    bed_index = np.asarray(bed_index)
+    slow, medium, fast = speed_classes
+    return np.where(bed_index <= 2, slow, np.where(bed_index < 5, medium, fast)).astype(float)
+
+
+# 批量病人引擎：所有病人的状态保存在连续的 NumPy 数组中，一次向量化地推进全部病人
+class PatientEngine:
+    def __init__(self, x, y, speed, room_index, doors, obstacles, stairs, stair_widths=None,
+                 door_radius=0.5, bed_radius=1.5, avoid_radius=1.0, avoid_gain=AVOID_GAIN, neighbor_search='hash',
+                 navigation=None, start_step=None, stair_exits=None, regions=None, dt=DEFAULT_DT,
+                 legacy_speeds=False):
+        # 按槽位存放的状态：前 n_active 个槽位是仍在疏散中的病人，ids 记录槽位对应的病人编号。
+        # 病人疏散后用末尾的病人填补空位（swap-remove），每步只处理 [0, n_active) 这一段
+        if dt <= 0:
+            raise ValueError("dt must be positive")
+        self.dt = float(dt)  # 每步的物理时间（秒）
+        self.legacy_speeds = legacy_speeds  # 速度是否按原脚本每帧的距离换算（结果的秒数不是真实时间）
+        self.x = np.array(x, dtype=float)
+        self.y = np.array(y, dtype=float)
+        self.vx = np.zeros_like(self.x)  # 速度，m/s
+        self.vy = np.zeros_like(self.x)
+        self.speed = np.array(speed, dtype=float)  # 期望速度，m/s
+        self.room = np.array(room_index, dtype=np.intp)
+        self.phase = np.full(self.x.shape, PHASE_TO_DOOR, dtype=np.int8)
+        self.target = np.full(self.x.shape, -1, dtype=np.intp)  # 目标楼梯间编号
+        # 开始移动的步数（反应/准备时间），之前原地不动
+        if start_step is None:
+            start_step = np.zeros(self.x.shape, dtype=np.int64)
+        self.start_step = np.array(start_step, dtype=np.int64)
+        self.ids = np.arange(self.x.shape[0])
+        # 所在区域编号（regions.RegionMap），每步积分后更新一次，供阶段转换和观察者使用；没有区域划分时为 -1
+        self.regions = regions
+        self.region = np.full(self.x.shape, OUTSIDE, dtype=np.intp)
+        if regions is not None:
+            self.region[:] = regions.locate(self.x, self.y)
+        self.n_active = self.x.shape[0]
+        self._slot_arrays = (self.x, self.y, self.vx, self.vy, self.speed, self.room, self.phase, self.target,
+                             self.start_step, self.ids, self.region)
+
+        # 按病人编号存放的初始房间和结果
+        self.home_room = self.room.copy()
+        self.exit_step = np.full(self.x.shape, -1, dtype=np.int64)
+        self.exit_stair = np.full(self.x.shape, -1, dtype=np.intp)
+
+        self.doors = np.asarray(doors, dtype=float).reshape(-1, 2)  # 每个房间的门口中心
+        self.obstacles = obstacles  # 静态障碍物索引（病床记录所属房间编号）
+        self.navigation = navigation  # 可选的导航距离场，楼梯间顺序与 stairs 一致
+        self.stairs = np.asarray(stairs, dtype=float).reshape(-1, 2)  # 楼梯间门的坐标
+        if stair_widths is None:
+            stair_widths = np.zeros(self.stairs.shape[0])
+        # 进入楼梯门宽度一半的范围内（或一步之内）即视为到达
+        self.stair_radius = np.asarray(stair_widths, dtype=float) / 2
+        # 可选的楼梯间出口坐标（与 stairs 一一对应）：设置后病人到达楼梯间门口先进入楼梯间，
+        # 走到出口一步之内才算疏散完成；为 None 时到达楼梯间门口即完成
+        self.stair_exits = None if stair_exits is None else np.asarray(stair_exits, dtype=float).reshape(-1, 2)
+        if self.stair_exits is not None and self.stair_exits.shape[0] != self.stairs.shape[0]:
+            raise ValueError("stair_exits must have one point per staircase")
+
+        self.door_radius = door_radius
+        self.bed_radius = bed_radius
+        self.avoid_radius = avoid_radius
+        self.avoid_gain = avoid_gain  # 每个相邻病人产生的避让速度，m/s
+        # 'hash' 使用空间哈希只比较相互作用半径内的病人；'dense' 为两两比较的参考实现
+        if neighbor_search not in ('hash', 'dense'):
+            raise ValueError("neighbor_search must be 'hash' or 'dense'")
+        self.neighbor_search = neighbor_search
+        self.grid = SpatialHash(avoid_radius)
+        self.step_count = 0
+        # 每步调用 observe(engine, arrived) 的对象，例如 metrics.EvacuationMetrics、density.DensityAccumulator
+        self.observers = []
+        # 可选的 profiling.PhaseProfiler，记录每步各阶段的耗时；为 None 时不计时
+        self.profiler = None
+
+    @classmethod
+    def from_rooms(cls, rooms, staircases, walls=(), door_offset=(0.6, 1.0), **kwargs):
+        # 从现有的 Room/Bed/Patient/Staircase 对象构建引擎；Patient.speed 是每帧（LEGACY_FRAME）的距离，换算为 m/s，
+        # 避让也沿用原脚本的标定，与原脚本逐帧推进的结果一致
+        xs, ys, speeds, room_index = [], [], [], []
+        for index, room in enumerate(rooms):
+            for patient in room.patients:
+                xs.append(patient.x)
+                ys.append(patient.y)
+                speeds.append(patient.speed / LEGACY_FRAME)
+                room_index.append(index)
+
+        doors = [(room.door_x + door_offset[0], room.door_y + door_offset[1]) for room in rooms]
+        obstacles = ObstacleIndex.from_layout(rooms, walls)
+        stairs = [(staircase.door_x, staircase.door_y) for staircase in staircases]
+        stair_widths = [staircase.door_width for staircase in staircases]
+        kwargs.setdefault('avoid_gain', LEGACY_AVOID_GAIN)
+        return cls(xs, ys, speeds, room_index, doors, obstacles, stairs, stair_widths, legacy_speeds=True, **kwargs)
+
+    @classmethod
+    def from_layout(cls, layout, speed_classes=None, navigation=True, occupied=None, speed=None,
+                    obstacles=None, stair_exits=None, regions=None, legacy_speeds=False, **kwargs):
+        # 从编译后的布局（layout.CompiledLayout）构建引擎：每张有人的病床一个病人，站在床尾中间
+        # occupied 为病床是否有人的布尔数组（默认全部有人）；speed 可以覆盖按床号分配的速度（每个病人一个值）
+        # stair_exits=True 时病人要穿过楼梯间门走到楼梯间中心才算疏散完成；regions=True 时建立区域标号栅格；
+        # legacy_speeds=True 时默认的速度和避让使用原脚本的标定（LEGACY_SPEED_CLASSES、LEGACY_AVOID_GAIN）
+        if speed_classes is None:
+            speed_classes = LEGACY_SPEED_CLASSES if legacy_speeds else SPEED_CLASSES
+        if legacy_speeds:
+            kwargs.setdefault('avoid_gain', LEGACY_AVOID_GAIN)
+        beds = layout.beds
+        if occupied is None:
+            occupied = np.ones(beds.shape[0], dtype=bool)
+        x = beds[occupied, 0] + beds[occupied, 2] / 2
+        y = beds[occupied, 1] + beds[occupied, 3]
+        if speed is None:
+            speed = bed_speeds(layout.bed_index[occupied], speed_classes)
+        if obstacles is None:
+            # 空床仍然是障碍物
+            obstacles = ObstacleIndex.from_arrays(layout.bed_bounds, layout.bed_space, layout.walls)
+        if navigation is True:
+            navigation = NavigationField(layout.walls, layout.exit_stair_doors)
+        elif navigation is False:
+            navigation = None
+        if stair_exits is True:
+            stair_exits = layout.exit_stair_centers
+        if regions is True:
+            regions = RegionMap.from_layout(layout)
+        return cls(x, y, speed, layout.bed_space[occupied], layout.space_doors, obstacles, layout.exit_stair_points,
+                   layout.exit_stair_widths, navigation=navigation, stair_exits=stair_exits, regions=regions,
+                   legacy_speeds=legacy_speeds, **kwargs)
+
+    def __len__(self):
+        return self.x.shape[0]
+
+    def active_indices(self):
+        # 仍在疏散中的病人编号
+        return self.ids[:self.n_active]
+
+    def all_evacuated(self):
+        return self.n_active == 0
+
+    @property
+    def time(self):
+        # 已经模拟的物理时间（秒）
+        return self.step_count * self.dt
+
+    def positions(self):
+        # 返回仍在疏散中的病人坐标（视图，不复制），供绘图使用
+        return self.x[:self.n_active], self.y[:self.n_active]
+
+    def step(self):
+        n = self.n_active
+        if n == 0:
+            return
+        prof = self.profiler
+        if prof is not None:
+            t = prof.clock()
+        # 以下均为活动段的视图，计算结果直接写回状态数组
+        px = self.x[:n]
+        py = self.y[:n]
+        vx = self.vx[:n]
+        vy = self.vy[:n]
+        speed = self.speed[:n]
+        phase = self.phase[:n]
+        room = self.room[:n]
+        vx.fill(0.0)
+        vy.fill(0.0)
+        # 还没到开始移动时间的病人不参与本步的移动，但仍是其他病人要避让的对象
+        ready = self.start_step[:n] <= self.step_count
+        dt = self.dt
+
+        # 判断是否已经到达房间门口
+        door = self.doors[room]
+        dx = door[:, 0] - px
+        dy = door[:, 1] - py
+        distance_to_door = np.hypot(dx, dy)
+        phase[(phase == PHASE_TO_DOOR) & ready & (distance_to_door <= self.door_radius)] = PHASE_TO_STAIR
+        if self.stair_exits is not None and self.regions is not None:
+            # 已经走进目标楼梯间内部的病人（例如从门的边缘进入）直接进入楼梯间阶段
+            kind, owner = self.regions.describe(self.region[:n])
+            phase[(phase == PHASE_TO_STAIR) & (kind == KIND_STAIR) & (owner == self.target[:n])] = PHASE_IN_STAIR
+        # 各阶段的病人按本步开始时（门口转换之后）的阶段划分，本步内新进入楼梯间的病人下一步才换目标
+        to_door = np.flatnonzero((phase == PHASE_TO_DOOR) & ready)
+        to_stair = np.flatnonzero(phase == PHASE_TO_STAIR)
+        in_stair = np.flatnonzero(phase == PHASE_IN_STAIR)
+        if prof is not None:
+            t = prof.lap('door_check', t)
+
+        # 未到达门口的病人朝门口移动，同时避开本房间的病床
+        if to_door.size:
+            d = distance_to_door[to_door]
+            s = speed[to_door]
+            vx[to_door] = dx[to_door] / d * s
+            vy[to_door] = dy[to_door] / d * s
+            if prof is not None:
+                t = prof.lap('door_steering', t)
+
+            points, beds, bx, by, bd = self.obstacles.near(px[to_door], py[to_door], self.bed_radius,
+                                                           kind=KIND_BED, to_center=True)
+            own = (self.obstacles.owners[beds] == room[to_door[points]]) & (bd > 0)
+            points, bx, by, bd = points[own], bx[own], by[own], bd[own]
+            vx[to_door] += np.bincount(points, bx / bd, to_door.size) * s
+            vy[to_door] += np.bincount(points, by / bd, to_door.size) * s
+            if prof is not None:
+                t = prof.lap('bed_avoidance', t)
+
+        # 到达门口的病人沿走廊朝最近的楼梯间移动
+        arrived = to_stair[:0]
+        if to_stair.size:
+            sx = px[to_stair]
+            sy = py[to_stair]
+            s = speed[to_stair]
+            if self.navigation is not None:
+                closest, heading_x, heading_y, arrived_mask = self._navigate(sx, sy, s * dt)
+            else:
+                closest, heading_x, heading_y, arrived_mask = self._straight_line(sx, sy, s * dt)
+            vx[to_stair] = heading_x * s
+            vy[to_stair] = heading_y * s
+            self.target[to_stair] = closest
+            # 到达楼梯间门口：有楼梯间出口时进入楼梯间，否则疏散完成
+            if self.stair_exits is None:
+                arrived = to_stair[arrived_mask]
+            else:
+                phase[to_stair[arrived_mask]] = PHASE_IN_STAIR
+            if prof is not None:
+                t = prof.lap('stair_search', t)
+
+        # 楼梯间内的病人朝所在楼梯间的出口移动，与楼梯门口相同，进入门宽一半的范围内（或一步之内）即疏散完成
+        if in_stair.size:
+            exits = self.stair_exits[self.target[in_stair]]
+            s = speed[in_stair]
+            dx = exits[:, 0] - px[in_stair]
+            dy = exits[:, 1] - py[in_stair]
+            d = np.hypot(dx, dy)
+            safe = np.where(d > 0, d, 1.0)
+            vx[in_stair] = np.where(d > 0, dx / safe, 0.0) * s
+            vy[in_stair] = np.where(d > 0, dy / safe, 0.0) * s
+            arrived = np.union1d(arrived, in_stair[d <= np.maximum(s * dt, self.stair_radius[self.target[in_stair]])])
+            if prof is not None:
+                t = prof.lap('stair_exit', t)
+
+        # 门口以外（走廊和楼梯间）的病人与附近的病人保持间距
+        walking = to_stair if not in_stair.size else np.union1d(to_stair, in_stair)
+        if walking.size:
+            ax_, ay_ = self._avoidance(px, py, walking)
+            vx[walking] += ax_
+            vy[walking] += ay_
+            if prof is not None:
+                t = prof.lap('patient_avoidance', t)
+
+        # 更新病人位置
+        px += vx * dt
+        py += vy * dt
+        self.step_count += 1
+        if prof is not None:
+            t = prof.lap('integrate', t)
+        if self.regions is not None:
+            self.region[:n] = self.regions.locate(px, py)
+            if prof is not None:
+                t = prof.lap('regions', t)
+
+        # 疏散完成的病人本步之后退出
+        for observer in self.observers:
+            observer.observe(self, arrived)
+        if prof is not None:
+            t = prof.lap('observers', t)
+        if arrived.size:
+            self._retire(arrived)
+        if prof is not None:
+            prof.lap('retire', t)
+
+    def _retire(self, slots):
+        # 移出已疏散的病人：slots 为升序的槽位，用活动段末尾的病人填补前面的空位
+        ids = self.ids[slots]
+        self.exit_step[ids] = self.step_count
+        self.exit_stair[ids] = self.target[slots]
+        self.phase[slots] = PHASE_DONE
+        n = self.n_active
+        new_n = n - slots.size
+        holes = slots[slots < new_n]
+        tail = np.arange(new_n, n)
+        movers = tail[~np.isin(tail, slots)]
+        for array in self._slot_arrays:
+            array[holes] = array[movers]
+        self.n_active = new_n
+
+    def _straight_line(self, sx, sy, reach, chunk_size=1 << 22):
+        # 不考虑墙壁：按直线距离选择最近的楼梯间并直奔其门口。reach 为每个病人一步能走的距离（m）
+        # 病人 x 楼梯间的距离矩阵按块计算，楼梯间很多时也不会占满内存
+        closest = np.empty(sx.size, dtype=np.intp)
+        step = max(chunk_size // max(self.stairs.shape[0], 1), 1)
+        for start in range(0, sx.size, step):
+            block = slice(start, start + step)
+            stair_distance = np.hypot(self.stairs[None, :, 0] - sx[block, None], self.stairs[None, :, 1] - sy[block, None])
+            closest[block] = stair_distance.argmin(axis=1)
+        dx = self.stairs[closest, 0] - sx
+        dy = self.stairs[closest, 1] - sy
+        d = np.hypot(dx, dy)
+        moving = d > 0
+        safe = np.where(moving, d, 1.0)
+        heading_x = np.where(moving, dx / safe, 0.0)
+        heading_y = np.where(moving, dy / safe, 0.0)
+        return closest, heading_x, heading_y, d <= np.maximum(reach, self.stair_radius[closest])
+
+    def _navigate(self, sx, sy, reach):
+        # 查导航距离场：测地距离最近的楼梯间、沿距离场下降的方向，进入门口一步之内即到达
+        distance, closest, heading_x, heading_y = self.navigation.lookup(sx, sy)
+        # 距离场无法到达的位置退回直线走法
+        lost = closest < 0
+        if np.any(lost):
+            fallback = self._straight_line(sx[lost], sy[lost], reach[lost])
+            closest = closest.copy()
+            closest[lost] = fallback[0]
+            heading_x = np.where(lost, 0.0, heading_x)
+            heading_y = np.where(lost, 0.0, heading_y)
+            heading_x[lost] = fallback[1]
+            heading_y[lost] = fallback[2]
+        arrived = distance <= np.maximum(reach, self.navigation.cell_size)
+        if np.any(lost):
+            arrived[lost] = fallback[3]
+        return closest, heading_x, heading_y, arrived
+
+    def _avoidance(self, px, py, subset):
+        # 返回 subset 中每个病人因附近病人产生的避让速度
+        if self.neighbor_search == 'dense':
+            return self._avoidance_dense(px, py, subset)
+        i, j, dx, dy, d = self.grid.build(px, py).pairs(self.avoid_radius)
+        moving = d > 0
+        i, j = i[moving], j[moving]
+        ux = dx[moving] / d[moving]
+        uy = dy[moving] / d[moving]
+        # 每一对病人互相推开：i 受 +u，j 受 -u
+        n = px.size
+        avoid_x = np.bincount(i, ux, n) - np.bincount(j, ux, n)
+        avoid_y = np.bincount(i, uy, n) - np.bincount(j, uy, n)
+        return avoid_x[subset] * self.avoid_gain, avoid_y[subset] * self.avoid_gain
+
+    def _avoidance_dense(self, px, py, subset):
+        # 与所有在场病人两两比较（O(n^2)，用于校验空间哈希的结果）。
+        # 按行分块计算，每块的两两矩阵不超过 DENSE_BLOCK 个元素，人数很多时内存仍然有上限
+        subset = np.arange(px.size)[subset]
+        avoid_x = np.empty(subset.size)
+        avoid_y = np.empty(subset.size)
+        rows = max(DENSE_BLOCK // max(px.size, 1), 1)
+        for start in range(0, subset.size, rows):
+            block = subset[start:start + rows]
+            ox = px[block, None] - px[None, :]
+            oy = py[block, None] - py[None, :]
+            od = np.hypot(ox, oy)
+            near = (od < self.avoid_radius) & (od > 0)
+            safe = np.where(near, od, 1.0)
+            avoid_x[start:start + rows] = np.where(near, ox / safe, 0.0).sum(axis=1)
+            avoid_y[start:start + rows] = np.where(near, oy / safe, 0.0).sum(axis=1)
+        return avoid_x * self.avoid_gain, avoid_y * self.avoid_gain
@@ -0,0 +1,264 @@
+import contextlib
+import functools
+import itertools
+import os
+import sys
+import warnings
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from density import DensityAccumulator
+from engine import AVOID_GAIN, DEFAULT_DT, SPEED_CLASSES, PatientEngine, bed_speeds
+from layout import CompiledLayout, load_layout
+from navigation import NavigationField
+from obstacles import ObstacleIndex
+from runner import run
+from shared import SharedArrays, attach, pack, unpack
+
+# 抽样参数和引擎参数的默认值
+DEFAULT_PARAMS = {
+    'speed_classes': SPEED_CLASSES,  # 按床号分配的平均速度（m/s）
+    'speed_spread': 0.2,  # 速度的相对标准差（正态分布）
+    'min_speed_fraction': 0.25,  # 速度下限，相对于平均速度
+    'delay_mean': 2.5,  # 开始移动前的平均等待时间（秒，指数分布）
+    'occupancy': 0.9,  # 每张病床有人的概率
+    'door_radius': 0.5,  # 到达房间门口的判定距离
+    'bed_radius': 1.5,  # 避开病床的范围
+    'avoid_radius': 1.0,  # 病人之间的避让范围
+    'avoid_gain': AVOID_GAIN,  # 每个相邻病人产生的避让速度（m/s）
+    'dt': DEFAULT_DT,  # 每步的物理时间（秒）
+}
+# 直接传给 PatientEngine 的参数
+ENGINE_PARAMS = ('door_radius', 'bed_radius', 'avoid_radius', 'avoid_gain', 'dt')
+# practice.py / re-update.py 中的参数名。那里的 avoidance_coefficient 是乘在病人自身速度上的无量纲系数，
+# 与引擎中每个相邻病人的避让速度 avoid_gain（m/s）含义不同，不作为别名，按未知参数报错
+PARAM_ALIASES = {
+    'avoidance_distance': 'avoid_radius',
+}
+
+
+def normalize_params(params=None):
+    # 补全默认值并统一参数名；未知参数直接报错，避免拼错的参数被悄悄忽略
+    normalized = dict(DEFAULT_PARAMS)
+    for name, value in (params or {}).items():
+        name = PARAM_ALIASES.get(name, name)
+        if name not in DEFAULT_PARAMS:
+            raise ValueError("unknown parameter %r" % name)
+        normalized[name] = tuple(value) if isinstance(value, list) else value
+    return normalized
+
+
+def sample_scenario(layout, rng, params):
+    # 抽样一个场景：哪些病床有人、每个病人的速度以及开始移动的步数（等待时间按 dt 换算为步数）
+    occupied = rng.random(layout.beds.shape[0]) < params['occupancy']
+    mean_speed = bed_speeds(layout.bed_index[occupied], params['speed_classes'])
+    factor = np.maximum(rng.normal(1.0, params['speed_spread'], mean_speed.size), params['min_speed_fraction'])
+    if params['delay_mean'] > 0:
+        delay = rng.exponential(params['delay_mean'], mean_speed.size)
+        start_step = np.round(delay / params['dt']).astype(np.int64)
+    else:
+        start_step = np.zeros(mean_speed.size, dtype=np.int64)
+    return occupied, mean_speed * factor, start_step
+
+
+def replicate_streams(seed, replicates):
+    # 由一个主种子派生出每次重复各自独立的随机数流（SeedSequence.spawn）。
+    # 第 i 个子流只取决于 (seed, i)，与重复总数、由哪个线程/进程运行、运行顺序都无关
+    return np.random.SeedSequence(seed).spawn(replicates)
+
+
+def run_replicate(layout, stream, params, max_steps=100000, navigation=None, obstacles=None, density_cell_size=None):
+    # 用随机数流 stream（SeedSequence）运行一次抽样场景，返回 (病人所在房间, 疏散步数, 到达的楼梯间, 推进的步数)；
+    # 给出 density_cell_size 时末尾再加上这次运行的 DensityAccumulator
+    rng = np.random.default_rng(stream)
+    occupied, speed, start_step = sample_scenario(layout, rng, params)
+    engine = PatientEngine.from_layout(layout, navigation=navigation if navigation is not None else False,
+                                       occupied=occupied, speed=speed, obstacles=obstacles, start_step=start_step,
+                                       **{name: params[name] for name in ENGINE_PARAMS})
+    density = None
+    if density_cell_size is not None:
+        density = DensityAccumulator.attach(engine, layout.walls, density_cell_size)
+    result = run(engine, max_steps)
+    outcome = (engine.home_room, result.exit_step, engine.exit_stair, result.steps)
+    return outcome if density is None else outcome + (density,)
+
+
+def share_layout(layout, navigation=True):
+    # 主进程中建立一次障碍物索引和导航距离场，连同布局数组一起放进共享内存
+    groups = {
+        'layout': layout.arrays,
+        'obstacles': ObstacleIndex.from_arrays(layout.bed_bounds, layout.bed_space, layout.walls).to_arrays(),
+    }
+    if navigation:
+        groups['navigation'] = NavigationField(layout.walls, layout.exit_stair_doors).to_arrays()
+    return SharedArrays(pack(groups))
+
+
+def attach_layout(manifest):
+    # 在 worker 中映射共享内存，得到 (SharedMemory, 布局, 障碍物索引, 导航距离场)，数组均为只读视图
+    shm, arrays = attach(manifest)
+    groups = unpack(arrays)
+    navigation = NavigationField.restore(groups['navigation']) if 'navigation' in groups else None
+    return shm, CompiledLayout(groups['layout']), ObstacleIndex.restore(groups['obstacles']), navigation
+
+
+# 每个 worker 进程启动时映射一次共享的布局，之后的任务直接复用，不再各自读取、重建或反序列化
+_worker = {}
+
+
+def _init_worker(manifest):
+    _worker['shm'], _worker['layout'], _worker['obstacles'], _worker['navigation'] = attach_layout(manifest)
+
+
+def run_shared_replicate(stream, params, max_steps, density_cell_size=None):
+    # 在 worker_pool 的进程中运行一次抽样场景
+    return run_replicate(_worker['layout'], stream, params, max_steps, _worker['navigation'], _worker['obstacles'],
+                         density_cell_size)
+
+
+# 与 concurrent.futures 接口一致的串行执行器：在当前线程中依次运行，便于调试和对照
+class SerialExecutor(Executor):
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as exc:
+            future.set_exception(exc)
+        return future
+
+
+def percentile(values, q):
+    # 一维数组的百分位数（线性插值）。未疏散记为 inf：插值用到 inf 时结果为 inf，
+    # 而 np.percentile 在插值时计算 inf - inf 得到 NaN
+    values = np.sort(np.asarray(values, dtype=float))
+    if values.size == 0:
+        return np.nan
+    upper = values[int(np.ceil(q / 100.0 * (values.size - 1)))]
+    return upper if np.isinf(upper) else float(np.percentile(values, q))
+
+
+def _stats(times):
+    # 按列统计均值、P95 和最大值；全部为 NaN 的列（该房间/楼梯间从未有人）结果为 NaN
+    times = np.asarray(times, dtype=float)
+    present = ~np.isnan(times)
+    count = np.sum(present, axis=0)
+    p95 = np.full(times.shape[1], np.nan)
+    for column in np.flatnonzero(count):
+        p95[column] = percentile(times[present[:, column], column], 95)
+    with warnings.catch_warnings():
+        # 只屏蔽全部为 NaN 的列产生的 "Mean of empty slice" / "All-NaN slice" 警告
+        warnings.filterwarnings('ignore', 'Mean of empty slice', RuntimeWarning)
+        warnings.filterwarnings('ignore', 'All-NaN slice encountered', RuntimeWarning)
+        return {
+            'count': count,
+            'mean': np.nanmean(times, axis=0),
+            'p95': p95,
+            'max': np.nanmax(times, axis=0),
+        }
+
+
+# 多次重复的疏散时间分布（单位：秒，由步数乘以 dt 得到）。未疏散的病人记为 inf，因此相应的统计值也是 inf
+class EnsembleResult:
+    def __init__(self, room_times, stair_times, evacuation_times, stair_ids=None, density=None):
+        self.room_times = room_times  # (重复次数, 空间数) 每个房间/办公室最后一个病人疏散的时间，无人时为 NaN
+        self.stair_times = stair_times  # (重复次数, 出口楼梯间数) 每个楼梯间最后一个病人到达的时间，无人使用时为 NaN
+        self.evacuation_times = evacuation_times  # (重复次数,) 全部疏散的时间
+        self.stair_ids = stair_ids  # 出口楼梯间在布局中的编号
+        self.density = density  # 所有重复合并后的 DensityAccumulator（未开启时为 None）
+
+    @classmethod
+    def collect(cls, layout, outcomes, dt=DEFAULT_DT):
+        n_spaces = layout.space_doors.shape[0]
+        stair_ids = np.flatnonzero(layout.stair_exit)
+        room_times = np.full((len(outcomes), n_spaces), np.nan)
+        stair_times = np.full((len(outcomes), stair_ids.size), np.nan)
+        evacuation_times = np.zeros(len(outcomes))
+        density = None
+        for row, outcome in enumerate(outcomes):
+            room, exit_step, exit_stair, steps = outcome[:4]
+            if len(outcome) > 4:
+                density = outcome[4] if density is None else density.merge(outcome[4])
+            evacuated = exit_step >= 0
+            times = np.where(evacuated, exit_step * dt, np.inf)
+            np.fmax.at(room_times[row], room, times)
+            np.fmax.at(stair_times[row], exit_stair[evacuated], times[evacuated])
+            evacuation_times[row] = times.max() if times.size else 0
+        return cls(room_times, stair_times, evacuation_times, stair_ids, density)
+
+    def room_stats(self):
+        return _stats(self.room_times)
+
+    def stair_stats(self):
+        return _stats(self.stair_times)
+
+    def summary(self):
+        total = _stats(self.evacuation_times[:, None])
+        lines = [
+            "replicates:      %d" % self.evacuation_times.size,
+            "evacuation time: mean %.1f s  p95 %.1f s  max %.1f s" % (total['mean'][0], total['p95'][0],
+                                                                      total['max'][0]),
+            "",
+            "%-10s %6s %9s %9s %9s" % ('space', 'runs', 'mean', 'p95', 'max'),
+        ]
+        for label, ids, stats in (('space', np.arange(self.room_times.shape[1]), self.room_stats()),
+                                  ('stair', self.stair_ids, self.stair_stats())):
+            for column, index in enumerate(ids):
+                if stats['count'][column]:
+                    lines.append("%-10s %6d %9.1f %9.1f %9.1f" % ('%s %d' % (label, index), stats['count'][column],
+                                                                  stats['mean'][column], stats['p95'][column],
+                                                                  stats['max'][column]))
+        return "\n".join(lines)
+
+
+EXECUTORS = ('process', 'thread', 'serial')
+
+
+@contextlib.contextmanager
+def worker_pool(layout, navigation=True, max_workers=None, executor='process'):
+    # 返回 (执行器, 任务函数)，任务函数的参数为 (随机数流, 参数, 最大步数)。
+    # 进程池：布局、障碍物索引和导航距离场在共享内存中，进程池关闭后释放；
+    # 线程池和串行执行直接使用当前进程中建立的对象。三种方式的结果逐位相同
+    if executor not in EXECUTORS:
+        raise ValueError("executor must be one of %s" % ', '.join(EXECUTORS))
+    if executor == 'process':
+        with share_layout(layout, navigation) as shared:
+            with ProcessPoolExecutor(max_workers, initializer=_init_worker, initargs=(shared.manifest,)) as pool:
+                yield pool, run_shared_replicate
+        return
+    obstacles = ObstacleIndex.from_arrays(layout.bed_bounds, layout.bed_space, layout.walls)
+    field = NavigationField(layout.walls, layout.exit_stair_doors) if navigation else None
+    task = functools.partial(_run_local, layout, field, obstacles)
+    with (ThreadPoolExecutor(max_workers) if executor == 'thread' else SerialExecutor()) as pool:
+        yield pool, task
+
+
+def _run_local(layout, navigation, obstacles, stream, params, max_steps, density_cell_size=None):
+    return run_replicate(layout, stream, params, max_steps, navigation, obstacles, density_cell_size)
+
+
+# 蒙特卡洛集合：在进程池中独立运行 replicates 次随机场景，汇总各房间、各楼梯间的疏散时间分布
+def run_ensemble(layout_path, replicates=100, seed=0, params=None, max_steps=100000, max_workers=None,
+                 navigation=True, chunksize=None, executor='process', density_cell_size=None):
+    params = normalize_params(params)
+    layout = load_layout(layout_path)
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    if chunksize is None:
+        chunksize = max(1, replicates // (max_workers * 4))
+    with worker_pool(layout, navigation, max_workers, executor) as (pool, task):
+        outcomes = list(pool.map(task, replicate_streams(seed, replicates), itertools.repeat(params),
+                                 itertools.repeat(max_steps), itertools.repeat(density_cell_size),
+                                 chunksize=chunksize))
+    return EnsembleResult.collect(layout, outcomes, params['dt'])
+
+
+if __name__ == "__main__":
+    # 用法：python ensemble.py 布局文件 [重复次数] [随机种子] [process/thread/serial]
+    args = sys.argv[1:]
+    if not args:
+        sys.exit("usage: python ensemble.py LAYOUT [REPLICATES] [SEED] [EXECUTOR]")
+    replicates = int(args[1]) if len(args) > 1 else 100
+    seed = int(args[2]) if len(args) > 2 else 0
+    executor = args[3] if len(args) > 3 else 'process'
+    print(run_ensemble(args[0], replicates, seed, executor=executor).summary())
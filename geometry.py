@@ -0,0 +1,129 @@
+import numpy as np
+
+WALL_THICKNESS = 0.37
+
+
+# 计算一个带门的矩形隔间（房间/办公室/楼梯间）的墙壁和门，画法与 draw() 中一致
+# door_side: 门所在的边 'top' / 'bottom'；door_align: 门在该边上的位置 'left' / 'center' / 'right'
+# 返回 (墙壁矩形列表, 门矩形)，矩形均为 (x, y, width, height)
+def shell_walls(x, y, width, height, door_width, door_side='top', door_align='right', wall_thickness=WALL_THICKNESS):
+    wt = wall_thickness
+    walls = [
+        (x, y, wt, height + wt * 2),  # 左侧
+        (x + width + wt, y, wt, height + wt * 2),  # 右侧
+    ]
+    if door_side == 'top':
+        door_line_y, solid_line_y = y + height + wt, y
+    elif door_side == 'bottom':
+        door_line_y, solid_line_y = y, y + height + wt
+    else:
+        raise ValueError("door_side must be 'top' or 'bottom'")
+    walls.append((x + wt, solid_line_y, width, wt))  # 没有门的一侧
+
+    if door_align == 'left':
+        walls.append((x + wt + door_width, door_line_y, width - door_width, wt))
+        door = (x + wt, door_line_y, door_width, wt)
+    elif door_align == 'right':
+        walls.append((x + wt, door_line_y, width - door_width, wt))
+        door = (x + wt + width - door_width, door_line_y, door_width, wt)
+    elif door_align == 'center':
+        half = width / 2 - door_width / 2
+        walls.append((x + wt, door_line_y, half, wt))
+        walls.append((x + wt + width / 2 + door_width / 2, door_line_y, half, wt))
+        door = (x + wt + half, door_line_y, door_width, wt)
+    else:
+        raise ValueError("door_align must be 'left', 'center' or 'right'")
+    return walls, door
+
+
+# 根据分组 [(对象列表, door_side, door_align), ...] 计算整个平面的墙壁和门
+# 返回两个 (n, 4) 数组，每行为 (x0, y0, x1, y1)
+def layout_walls(groups, extra_walls=(), wall_thickness=WALL_THICKNESS):
+    walls, doors = [], []
+    for objects, door_side, door_align in groups:
+        for obj in objects:
+            shell, door = shell_walls(obj.x, obj.y, obj.width, obj.height, obj.door_width,
+                                      door_side, door_align, wall_thickness)
+            walls.extend(shell)
+            doors.append(door)
+    walls.extend(extra_walls)
+    return rects_to_bounds(walls), rects_to_bounds(doors)
+
+
+# 整个平面的墙壁几何：由建筑对象的定义计算一次，之后只读。
+# 与绘图无关，墙壁矩形、门矩形和墙壁的边线段都存为连续的 (n, 4) 数组，每行为 (x0, y0, x1, y1)
+class WallGeometry:
+    def __init__(self, walls, doors):
+        self.walls = np.ascontiguousarray(np.asarray(walls, dtype=float).reshape(-1, 4))
+        self.doors = np.ascontiguousarray(np.asarray(doors, dtype=float).reshape(-1, 4))
+        self.segments = rect_segments(self.walls)
+        for array in (self.walls, self.doors, self.segments):
+            array.flags.writeable = False
+
+    @classmethod
+    def from_groups(cls, groups, extra_walls=(), wall_thickness=WALL_THICKNESS):
+        # groups 与 layout_walls 相同：[(对象列表, door_side, door_align), ...]
+        return cls(*layout_walls(groups, extra_walls, wall_thickness))
+
+    @property
+    def centers(self):
+        # 每面墙的中心点，(n, 2)
+        return np.column_stack([(self.walls[:, 0] + self.walls[:, 2]) / 2, (self.walls[:, 1] + self.walls[:, 3]) / 2])
+
+    def __len__(self):
+        return self.walls.shape[0]
+
+
+def door_bounds(objects, door_side, door_align, wall_thickness=WALL_THICKNESS):
+    # 一组对象各自的门矩形，(n, 4) 的 (x0, y0, x1, y1) 数组
+    doors = [shell_walls(obj.x, obj.y, obj.width, obj.height, obj.door_width, door_side, door_align, wall_thickness)[1]
+             for obj in objects]
+    return rects_to_bounds(doors)
+
+
+def interior_bounds(objects, wall_thickness=WALL_THICKNESS):
+    # 墙壁以内的空间
+    return rects_to_bounds([(obj.x + wall_thickness, obj.y + wall_thickness, obj.width, obj.height) for obj in objects])
+
+
+def bed_bounds(rooms):
+    return rects_to_bounds([(bed.x, bed.y, bed.width, bed.height) for room in rooms for bed in room.beds])
+
+
+def rects_to_bounds(rects):
+    # (x, y, width, height) -> (x0, y0, x1, y1)
+    rects = np.asarray(rects, dtype=float).reshape(-1, 4)
+    return np.column_stack([rects[:, 0], rects[:, 1], rects[:, 0] + rects[:, 2], rects[:, 1] + rects[:, 3]])
+
+
+def rect_segments(bounds):
+    # (x0, y0, x1, y1) 矩形 -> 四条边的线段 (x0, y0, x1, y1)，每个矩形依次为下、右、上、左，(4n, 4) 的连续数组
+    b = np.asarray(bounds, dtype=float).reshape(-1, 4)
+    x0, y0, x1, y1 = b[:, 0], b[:, 1], b[:, 2], b[:, 3]
+    segments = np.stack([
+        np.column_stack([x0, y0, x1, y0]),
+        np.column_stack([x1, y0, x1, y1]),
+        np.column_stack([x1, y1, x0, y1]),
+        np.column_stack([x0, y1, x0, y0]),
+    ], axis=1)
+    return np.ascontiguousarray(segments.reshape(-1, 4))
+
+
+def locate_in_rects(x, y, rects, chunk_size=1 << 22):
+    # 点 -> 包含它的第一个矩形编号（边界算在内），不在任何矩形内为 -1
+    # rects 为 (x, y, width, height)；按块广播比较，避免点数 x 矩形数过大时占满内存
+    x = np.asarray(x, dtype=float).ravel()
+    y = np.asarray(y, dtype=float).ravel()
+    rects = np.asarray(rects, dtype=float).reshape(-1, 4)
+    result = np.full(x.size, -1, dtype=np.intp)
+    if rects.shape[0] == 0:
+        return result
+    x0, y0 = rects[:, 0], rects[:, 1]
+    x1, y1 = x0 + rects[:, 2], y0 + rects[:, 3]
+    step = max(chunk_size // rects.shape[0], 1)
+    for start in range(0, x.size, step):
+        px = x[start:start + step, None]
+        py = y[start:start + step, None]
+        inside = (px >= x0) & (px <= x1) & (py >= y0) & (py <= y1)
+        result[start:start + step] = np.where(inside.any(axis=1), inside.argmax(axis=1), -1)
+    return result
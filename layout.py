@@ -0,0 +1,303 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from geometry import WALL_THICKNESS, locate_in_rects, rects_to_bounds, shell_walls
+
+# 编译格式的版本号，修改编译逻辑时递增，旧缓存随之失效
+LAYOUT_VERSION = 2
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.layout_cache')
+
+DOOR_SIDES = ('top', 'bottom')
+DOOR_ALIGNS = ('left', 'center', 'right')
+SHELL_FIELDS = ('x', 'y', 'width', 'height', 'door_x', 'door_y', 'door_width')
+BED_FIELDS = ('x', 'y', 'width', 'height')
+
+
+# 编译后的平面布局：全部几何信息都是 NumPy 数组，可以直接写入/读取 .npz
+class CompiledLayout:
+    def __init__(self, arrays, key=None):
+        self.arrays = arrays
+        self.key = key
+
+    def __getattr__(self, name):
+        arrays = self.__dict__.get('arrays', {})
+        if name in arrays:
+            return arrays[name]
+        raise AttributeError(name)
+
+    @property
+    def exit_stair_doors(self):
+        # 作为出口的楼梯间门矩形
+        return self.stair_doors[self.stair_exit]
+
+    @property
+    def exit_stair_points(self):
+        return self.staircases[self.stair_exit][:, 4:6]
+
+    @property
+    def exit_stair_widths(self):
+        return self.staircases[self.stair_exit][:, 6]
+
+    @property
+    def exit_stair_centers(self):
+        # 作为出口的楼梯间内部空间的中心
+        stairs = self.staircases[self.stair_exit]
+        return stairs[:, :2] + self.wall_thickness + stairs[:, 2:4] / 2
+
+    @property
+    def bed_bounds(self):
+        return rects_to_bounds(self.beds)
+
+    def save(self, path):
+        np.savez(path, **self.arrays)
+
+    @classmethod
+    def load(cls, path, key=None):
+        with np.load(path) as data:
+            return cls({name: data[name] for name in data.files}, key)
+
+
+class LayoutError(ValueError):
+    pass
+
+
+def _infer_door(entry):
+    # 表格中没有写门的位置时，根据门坐标推断门在哪条边以及在边上的位置
+    side = entry.get('door_side')
+    if side is None:
+        side = 'top' if entry['door_y'] >= entry['y'] + entry['height'] / 2 else 'bottom'
+    align = entry.get('door_align')
+    if align is None:
+        relative = (entry['door_x'] - entry['x']) / entry['width']
+        align = 'left' if relative < 1 / 3 else 'right' if relative > 2 / 3 else 'center'
+    return side, align
+
+
+def _check_shell(kind, index, entry):
+    for field in SHELL_FIELDS:
+        if field not in entry:
+            raise LayoutError("%s %d is missing '%s'" % (kind, index, field))
+        if not np.isfinite(float(entry[field])):
+            raise LayoutError("%s %d has a non-finite '%s'" % (kind, index, field))
+    if entry['width'] <= 0 or entry['height'] <= 0:
+        raise LayoutError("%s %d must have a positive width and height" % (kind, index))
+    if not 0 < entry['door_width'] <= entry['width']:
+        raise LayoutError("%s %d has a door wider than the %s" % (kind, index, kind))
+    side, align = _infer_door(entry)
+    if side not in DOOR_SIDES:
+        raise LayoutError("%s %d has an unknown door_side %r" % (kind, index, side))
+    if align not in DOOR_ALIGNS:
+        raise LayoutError("%s %d has an unknown door_align %r" % (kind, index, align))
+    return side, align
+
+
+def validate(spec):
+    # 检查布局描述是否完整、合理，出错时抛出 LayoutError
+    if not isinstance(spec, dict):
+        raise LayoutError("layout must be a JSON object")
+    for kind in ('staircases', 'rooms'):
+        if not spec.get(kind):
+            raise LayoutError("layout has no %s" % kind)
+    for kind, entries in (('staircase', spec['staircases']), ('office', spec.get('offices', [])),
+                          ('room', spec['rooms'])):
+        for index, entry in enumerate(entries):
+            _check_shell(kind, index, entry)
+    if not any(staircase.get('exit', True) for staircase in spec['staircases']):
+        raise LayoutError("layout has no exit staircase")
+    spaces = list(spec['rooms']) + list(spec.get('offices', []))
+    for index, bed in enumerate(spec.get('beds', [])):
+        for field in BED_FIELDS:
+            if field not in bed:
+                raise LayoutError("bed %d is missing '%s'" % (index, field))
+        space = bed.get('space')
+        if space is not None and not 0 <= space < len(spaces):
+            raise LayoutError("bed %d refers to unknown space %r" % (index, space))
+    for index, wall in enumerate(spec.get('walls', [])):
+        if len(wall) != 4:
+            raise LayoutError("wall %d must be [x, y, width, height]" % index)
+    for index, corridor in enumerate(spec.get('corridors', [])):
+        if len(corridor) != 4:
+            raise LayoutError("corridor %d must be [x, y, width, height]" % index)
+    return spec
+
+
+def _assign_beds(beds, rooms, offices):
+    # 病床左下角坐标与房间、办公室矩形一次性比较得到所属空间（办公室优先，与 1.1-patient.py 一致）
+    # 空间编号：房间在前，办公室在后；找不到时为 -1
+    space = locate_in_rects(beds[:, 0], beds[:, 1], rooms)
+    in_office = locate_in_rects(beds[:, 0], beds[:, 1], offices)
+    return np.where(in_office >= 0, rooms.shape[0] + in_office, space)
+
+
+def compile_layout(spec):
+    # 把布局描述编译成几何数组：房间/办公室/楼梯间参数、病床、墙壁和门的边界
+    validate(spec)
+    wall_thickness = float(spec.get('wall_thickness', WALL_THICKNESS))
+    door_offset = np.asarray(spec.get('door_offset', (0.6, 1.0)), dtype=float)
+
+    # 房间内嵌的病床展开到统一的病床列表中
+    beds = [dict(bed) for bed in spec.get('beds', [])]
+    for index, room in enumerate(spec['rooms']):
+        for bed in room.get('beds', []):
+            beds.append(dict(bed, space=index))
+
+    arrays = {
+        'wall_thickness': np.float64(wall_thickness),
+        'door_offset': door_offset,
+    }
+    walls, doors = [], []
+    for kind, entries in (('staircases', spec['staircases']), ('offices', spec.get('offices', [])),
+                          ('rooms', spec['rooms'])):
+        table = np.array([[float(entry[field]) for field in SHELL_FIELDS] for entry in entries],
+                         dtype=float).reshape(-1, len(SHELL_FIELDS))
+        sides = np.zeros(len(entries), dtype=np.int8)
+        aligns = np.zeros(len(entries), dtype=np.int8)
+        kind_doors = []
+        for index, entry in enumerate(entries):
+            side, align = _infer_door(entry)
+            sides[index] = DOOR_SIDES.index(side)
+            aligns[index] = DOOR_ALIGNS.index(align)
+            shell, door = shell_walls(entry['x'], entry['y'], entry['width'], entry['height'], entry['door_width'],
+                                      side, align, wall_thickness)
+            walls.extend(shell)
+            kind_doors.append(door)
+        doors.extend(kind_doors)
+        arrays[kind] = table  # 每行为 x, y, width, height, door_x, door_y, door_width
+        arrays[kind[:-1] + '_door_side'] = sides
+        arrays[kind[:-1] + '_door_align'] = aligns
+        arrays[kind[:-1] + '_doors'] = rects_to_bounds(kind_doors)
+    walls.extend(tuple(wall) for wall in spec.get('walls', []))
+    arrays['stair_doors'] = arrays.pop('staircase_doors')
+    arrays['stair_exit'] = np.array([bool(entry.get('exit', True)) for entry in spec['staircases']])
+    arrays['walls'] = rects_to_bounds(walls)
+    # 可选的走廊矩形，只用于区域划分（regions.RegionMap），不产生墙壁
+    arrays['corridors'] = rects_to_bounds([tuple(corridor) for corridor in spec.get('corridors', [])])
+    arrays['doors'] = rects_to_bounds(doors)
+    arrays['interiors'] = rects_to_bounds([(room[0] + wall_thickness, room[1] + wall_thickness, room[2], room[3])
+                                           for room in arrays['rooms']])
+
+    bed_table = np.array([[float(bed[field]) for field in BED_FIELDS] for bed in beds],
+                         dtype=float).reshape(-1, len(BED_FIELDS))
+    bed_space = np.array([bed.get('space', -1) for bed in beds], dtype=np.intp)
+    unassigned = bed_space < 0
+    if np.any(unassigned):
+        bed_space[unassigned] = _assign_beds(bed_table[unassigned], arrays['rooms'][:, :4], arrays['offices'][:, :4])
+    if np.any(bed_space < 0):
+        raise LayoutError("bed %d is not inside any room or office" % np.flatnonzero(bed_space < 0)[0])
+    arrays['beds'] = bed_table
+    arrays['bed_space'] = bed_space
+    # 病床在所属空间中的序号（与 Room.initialize_patients 中 enumerate 的下标一致）
+    order = np.argsort(bed_space, kind='stable')
+    rank = np.empty_like(bed_space)
+    counts = np.bincount(bed_space, minlength=1)
+    rank[order] = np.arange(bed_space.size) - np.repeat(np.cumsum(counts) - counts, counts)
+    arrays['bed_index'] = rank
+    # 空间（房间在前、办公室在后）的门口中心，病人先走到这里
+    spaces = np.vstack([arrays['rooms'], arrays['offices']])
+    arrays['space_doors'] = spaces[:, 4:6] + door_offset
+    return CompiledLayout(arrays)
+
+
+def _spec_extent(spec):
+    # 布局描述的外接矩形 (x0, y0, x1, y1)，包括墙壁厚度
+    wall_thickness = float(spec.get('wall_thickness', WALL_THICKNESS))
+    rects = [(entry['x'], entry['y'], entry['width'] + 2 * wall_thickness, entry['height'] + 2 * wall_thickness)
+             for kind in ('staircases', 'offices', 'rooms') for entry in spec.get(kind, [])]
+    bounds = rects_to_bounds(rects + [tuple(wall) for wall in spec.get('walls', [])])
+    return bounds[:, 0].min(), bounds[:, 1].min(), bounds[:, 2].max(), bounds[:, 3].max()
+
+
+def stamp_layout(spec, copies, per_row=None, spacing=(2.0, 4.0), all_exits=False):
+    # 把一个布局描述复制 copies 份，按行排成一栋更大的楼（每行 per_row 份），用于生成大规模的测试布局。
+    # 每份保持原有的房间、病床、墙壁和出口；all_exits=True 时所有楼梯间都作为出口
+    x0, y0, x1, y1 = _spec_extent(spec)
+    if per_row is None:
+        # 单份病区又长又窄，每行放的份数少一些，整体接近方形
+        per_row = max(int(np.ceil(np.sqrt(copies * (y1 - y0 + spacing[1]) / (x1 - x0 + spacing[0])))), 1)
+    stamped = {key: value for key, value in spec.items() if key not in ('staircases', 'offices', 'rooms', 'beds',
+                                                                          'walls', 'corridors')}
+    for key in ('staircases', 'offices', 'rooms', 'beds', 'walls', 'corridors'):
+        stamped[key] = []
+
+    def shift(entry, dx, dy):
+        moved = dict(entry, x=entry['x'] + dx, y=entry['y'] + dy)
+        if 'door_x' in entry:
+            moved['door_x'] = entry['door_x'] + dx
+            moved['door_y'] = entry['door_y'] + dy
+        return moved
+
+    room_count = len(spec['rooms'])
+    for copy in range(copies):
+        dx = (copy % per_row) * (x1 - x0 + spacing[0])
+        dy = (copy // per_row) * (y1 - y0 + spacing[1])
+        for entry in spec['staircases']:
+            stamped['staircases'].append(dict(shift(entry, dx, dy), exit=True) if all_exits else shift(entry, dx, dy))
+        stamped['offices'].extend(shift(entry, dx, dy) for entry in spec.get('offices', []))
+        for entry in spec['rooms']:
+            room = shift(entry, dx, dy)
+            room['beds'] = [shift(bed, dx, dy) for bed in entry.get('beds', [])]
+            stamped['rooms'].append(room)
+        for bed in spec.get('beds', []):
+            bed = shift(bed, dx, dy)
+            # 直接指定所属空间的病床换算到这一份的编号（房间在前、办公室在后）
+            if bed.get('space') is not None:
+                space = bed['space']
+                if space < room_count:
+                    bed['space'] = copy * room_count + space
+                else:
+                    bed['space'] = copies * room_count + copy * len(spec.get('offices', [])) + space - room_count
+            stamped['beds'].append(bed)
+        for key in ('walls', 'corridors'):
+            stamped[key].extend([rect[0] + dx, rect[1] + dy, rect[2], rect[3]] for rect in spec.get(key, []))
+    return stamped
+
+
+def read_excel_layout(path):
+    # 读取与 1.1-patient.py 相同格式的 Excel 工作簿（staircase/room/bed/office 四张表）
+    import pandas as pd
+    excel_file = pd.ExcelFile(path)
+    spec = {}
+    for sheet, kind in (('staircase', 'staircases'), ('room', 'rooms'), ('office', 'offices'), ('bed', 'beds')):
+        table = excel_file.parse(sheet)
+        spec[kind] = [{key: (value.item() if hasattr(value, 'item') else value) for key, value in row.items()}
+                      for row in table.to_dict('records')]
+    return spec
+
+
+def read_layout(path):
+    if path.lower().endswith(('.xlsx', '.xls')):
+        return read_excel_layout(path)
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def layout_key(path):
+    # 缓存键：文件内容的哈希加上编译格式版本
+    digest = hashlib.sha256()
+    digest.update(b'layout-v%d\0' % LAYOUT_VERSION)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_layout(path, cache_dir=DEFAULT_CACHE_DIR):
+    # 读取布局文件（JSON 或 Excel）并编译；相同内容的文件直接读取缓存的 .npz
+    key = layout_key(path)
+    cache_path = None
+    if cache_dir is not None:
+        cache_path = os.path.join(cache_dir, key + '.npz')
+        if os.path.exists(cache_path):
+            return CompiledLayout.load(cache_path, key)
+    layout = compile_layout(read_layout(path))
+    layout.key = key
+    if cache_path is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        # 先写临时文件再改名，避免并行进程读到写了一半的缓存
+        temporary = '%s.%d.tmp.npz' % (cache_path[:-4], os.getpid())
+        layout.save(temporary)
+        os.replace(temporary, cache_path)
+    return layout
@@ -0,0 +1,167 @@
+import numpy as np
+
+from engine import DEFAULT_DT
+from regions import KIND_NAMES, KIND_OFFICE, KIND_ROOM
+
+
+# 疏散指标：作为观察者挂在引擎上，每一步由 PatientEngine.step 调用 observe，只对活动段和本步到达的病人做向量化累计，
+# 不依赖记录的轨迹。结果用 tables() 导出为按列存放的表（列名 -> 数组），步数之外同时给出以秒为单位的时间
+class EvacuationMetrics:
+    def __init__(self, home_room, n_rooms, n_stairs, start_step=None, flow_window=20, dt=DEFAULT_DT):
+        home_room = np.asarray(home_room, dtype=np.intp)
+        n_patients = home_room.size
+        self.home_room = home_room
+        self.n_stairs = n_stairs
+        self.flow_window = flow_window  # 计算楼梯间流量的滑动窗口（步）
+        self.dt = dt  # 每步的物理时间（秒）
+        self.start_step = np.zeros(n_patients, dtype=np.int64) if start_step is None else np.asarray(start_step)
+
+        # 按房间
+        self.room_initial = np.bincount(home_room, minlength=n_rooms)
+        self.room_remaining = self.room_initial.copy()
+        self.room_clear_step = np.where(self.room_initial > 0, -1, 0)  # 最后一个病人离开的步数，未清空为 -1
+        # 引擎有区域划分（engine.regions）时，记录房间内部最后一次有人的步数，-1 表示从未有人
+        self.room_last_occupied = np.full(n_rooms, -1, dtype=np.int64)
+
+        # 按病人编号
+        self.exit_step = np.full(n_patients, -1, dtype=np.int64)
+        self.exit_stair = np.full(n_patients, -1, dtype=np.intp)
+        self.distance = np.zeros(n_patients)  # 累计行走距离
+
+        # 按步（每步追加一行）
+        self.step_remaining = []
+        self.step_mean_speed = []
+        self.step_arrivals = []  # 每个楼梯间本步到达的人数
+        self.step_occupancy = []  # 有区域划分时，本步各类区域中的人数（第 0 列为不在任何区域内）
+
+    @classmethod
+    def attach(cls, engine, **kwargs):
+        # 为引擎建立指标并加入 engine.observers
+        start_step = np.zeros(len(engine), dtype=np.int64)
+        start_step[engine.active_indices()] = engine.start_step[:engine.n_active]
+        kwargs.setdefault('dt', engine.dt)
+        metrics = cls(engine.home_room, engine.doors.shape[0], engine.stairs.shape[0], start_step, **kwargs)
+        engine.observers.append(metrics)
+        return metrics
+
+    def observe(self, engine, arrived):
+        # 在引擎移动病人之后、移除到达者之前调用；arrived 为本步到达楼梯间的槽位
+        n = engine.n_active
+        ids = engine.ids[:n]
+        speed = np.hypot(engine.vx[:n], engine.vy[:n])
+        self.distance[ids] += speed * self.dt
+        # 本步开始时已经出发的病人的平均速度
+        moving = engine.start_step[:n] < engine.step_count
+        self.step_mean_speed.append(speed[moving].mean() if np.any(moving) else 0.0)
+
+        step = engine.step_count
+        if engine.regions is not None:
+            # 区域编号由引擎在本步积分后统一计算，这里只查类型
+            kind, owner = engine.regions.describe(engine.region[:n])
+            self.step_occupancy.append(np.bincount(kind + 1, minlength=len(KIND_NAMES) + 1))
+            in_space = (kind == KIND_ROOM) | (kind == KIND_OFFICE)
+            occupied = np.bincount(owner[in_space], minlength=self.room_last_occupied.size) > 0
+            self.room_last_occupied[occupied] = step
+        arrived_ids = engine.ids[arrived]
+        stairs = engine.target[arrived]
+        self.exit_step[arrived_ids] = step
+        self.exit_stair[arrived_ids] = stairs
+        self.step_arrivals.append(np.bincount(stairs, minlength=self.n_stairs))
+        self.step_remaining.append(n - arrived.size)
+        if arrived.size:
+            self.room_remaining -= np.bincount(self.home_room[arrived_ids], minlength=self.room_remaining.size)
+            cleared = (self.room_remaining == 0) & (self.room_clear_step < 0)
+            self.room_clear_step[cleared] = step
+
+    @property
+    def steps(self):
+        return len(self.step_remaining)
+
+    def flow(self):
+        # 各楼梯间每步的流量（人/秒）：flow_window 步内到达人数的滑动平均，(步数, 楼梯间数)
+        arrivals = self.arrivals()
+        cumulative = np.vstack([np.zeros((1, self.n_stairs)), np.cumsum(arrivals, axis=0)])
+        window = min(self.flow_window, max(self.steps, 1))
+        lagged = cumulative[np.maximum(np.arange(1, self.steps + 1) - window, 0)]
+        return (cumulative[1:] - lagged) / (window * self.dt)
+
+    def arrivals(self):
+        if not self.step_arrivals:
+            return np.zeros((0, self.n_stairs), dtype=np.intp)
+        return np.vstack(self.step_arrivals)
+
+    def occupancy(self):
+        # 每步各类区域中的人数，(步数, 1 + 区域类型数)，列依次为不在区域内、KIND_NAMES；没有区域划分时为空
+        if not self.step_occupancy:
+            return np.zeros((0, len(KIND_NAMES) + 1), dtype=np.intp)
+        return np.vstack(self.step_occupancy)
+
+    def tables(self):
+        # 四张列式表：每步、每个房间、每个楼梯间、每个病人
+        arrivals = self.arrivals()
+        flow = self.flow()
+        evacuated = self.exit_step >= 0
+        total = arrivals.sum(axis=0)
+        stair_steps = np.arange(1, self.steps + 1)[:, None]
+        used = arrivals > 0
+        walking = np.where(evacuated, self.exit_step, self.steps) - self.start_step
+        return {
+            'steps': {
+                'step': np.arange(1, self.steps + 1),
+                'time': np.arange(1, self.steps + 1) * self.dt,
+                'remaining': np.asarray(self.step_remaining, dtype=np.intp),
+                'mean_speed': np.asarray(self.step_mean_speed),
+                'arrivals': arrivals,
+                'flow': flow,
+                'occupancy': self.occupancy(),
+            },
+            'rooms': {
+                'room': np.arange(self.room_initial.size),
+                'patients': self.room_initial,
+                'remaining': self.room_remaining,
+                'clear_step': self.room_clear_step,
+                'clear_time': np.where(self.room_clear_step >= 0, self.room_clear_step * self.dt, np.nan),
+                'last_occupied_step': self.room_last_occupied,
+            },
+            'stairs': {
+                'stair': np.arange(self.n_stairs),
+                'arrivals': total,
+                'first_step': np.where(total > 0, np.where(used, stair_steps, np.iinfo(np.int64).max).min(axis=0), -1),
+                'last_step': np.where(total > 0, np.where(used, stair_steps, -1).max(axis=0), -1),
+                'peak_flow': flow.max(axis=0) if self.steps else np.zeros(self.n_stairs),
+            },
+            'patients': {
+                'patient': np.arange(self.exit_step.size),
+                'room': self.home_room,
+                'exit_step': self.exit_step,
+                'exit_time': np.where(evacuated, self.exit_step * self.dt, np.nan),
+                'exit_stair': self.exit_stair,
+                'distance': self.distance,
+                'mean_speed': self.distance / (np.maximum(walking, 1) * self.dt),
+            },
+        }
+
+    def save(self, path):
+        # 所有表写入一个 .npz，键为 "表名/列名"
+        np.savez(path, **{'%s/%s' % (table, column): values
+                          for table, columns in self.tables().items() for column, values in columns.items()})
+
+    def summary(self):
+        tables = self.tables()
+        rooms = tables['rooms']
+        stairs = tables['stairs']
+        patients = tables['patients']
+        lines = ["%-8s %8s %10s %12s" % ('room', 'patients', 'clear step', 'clear time s')]
+        for room in np.flatnonzero(rooms['patients']):
+            lines.append("%-8d %8d %10d %12.2f" % (room, rooms['patients'][room], rooms['clear_step'][room],
+                                                   rooms['clear_time'][room]))
+        lines.append("%-8s %8s %10s %10s %10s" % ('stair', 'arrivals', 'first s', 'last s', 'peak /s'))
+        first = np.where(stairs['first_step'] >= 0, stairs['first_step'] * self.dt, np.nan)
+        last = np.where(stairs['last_step'] >= 0, stairs['last_step'] * self.dt, np.nan)
+        for stair in range(self.n_stairs):
+            lines.append("%-8d %8d %10.2f %10.2f %10.3f" % (stair, stairs['arrivals'][stair], first[stair], last[stair],
+                                                            stairs['peak_flow'][stair]))
+        evacuated = patients['exit_step'] >= 0
+        if np.any(evacuated):
+            lines.append("mean patient speed: %.4f m/s" % patients['mean_speed'][evacuated].mean())
+        return "\n".join(lines)
@@ -0,0 +1,240 @@
+import heapq
+import time
+
+import numpy as np
+
+# 8 邻域偏移 (dy, dx)
+NEIGHBORS = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+
+
+# 把平面栅格化，墙壁所在的格子不可通行
+def rasterize(walls, origin, shape, cell_size):
+    blocked = np.zeros(shape, dtype=bool)
+    eps = 1e-9
+    for x0, y0, x1, y1 in np.asarray(walls, dtype=float).reshape(-1, 4):
+        # 与墙壁有重叠的格子都视为不可通行，保证墙壁在栅格上是连续的
+        i0 = max(int(np.floor((y0 - origin[1]) / cell_size + eps)), 0)
+        i1 = min(int(np.ceil((y1 - origin[1]) / cell_size - eps)), shape[0])
+        j0 = max(int(np.floor((x0 - origin[0]) / cell_size + eps)), 0)
+        j1 = min(int(np.ceil((x1 - origin[0]) / cell_size - eps)), shape[1])
+        blocked[i0:i1, j0:j1] = True
+    return blocked
+
+
+# 在栅格上计算 8 邻域最短路：从若干源格子出发计算测地距离，并记录每个格子最近的源编号。
+# 按波前整批松弛（Bellman-Ford）：每一轮只从上一轮距离变小的格子出发，用数组一次松弛 8 个方向，
+# 直到没有格子再变小。每条路径的距离都按从源出发的顺序逐段相加，与 Dijkstra 的结果逐位相同；
+# 只有到两个源的距离完全相等时，最近源编号可能不同。
+# deadline（time.perf_counter() 的时刻）可选，超过后抛出 TimeoutError，避免超大平面上的计算没有上限
+def flood_fill(blocked, sources, cell_size, deadline=None):
+    ny, nx = blocked.shape
+    # 四周补一圈不可通行的格子，邻格下标不会越界
+    width = nx + 2
+    free = np.zeros((ny + 2, width), dtype=bool)
+    free[1:-1, 1:-1] = ~blocked
+    free = free.ravel()
+    distance = np.full(free.size, np.inf)
+    label = np.full(free.size, -1, dtype=np.intp)
+    for source_id, cells in enumerate(sources):
+        i, j = np.divmod(np.asarray(cells, dtype=np.intp), nx)
+        cells = (i + 1) * width + j + 1
+        # 同一个格子属于多个源时归第一个源
+        cells = cells[distance[cells] > 0]
+        distance[cells] = 0.0
+        label[cells] = source_id
+    # 每个方向：(下标偏移, 代价, 可以从哪些格子出发)。斜向移动时不允许穿过墙角
+    moves = []
+    for dy, dx in NEIGHBORS:
+        offset = dy * width + dx
+        allowed = np.roll(free, -offset)
+        if dy and dx:
+            allowed &= np.roll(free, -dy * width) & np.roll(free, -dx)
+        moves.append((offset, cell_size * np.hypot(dy, dx), allowed))
+    frontier = np.flatnonzero(distance == 0)
+    while frontier.size:
+        if deadline is not None and time.perf_counter() > deadline:
+            raise TimeoutError("navigation field flood fill did not finish in time")
+        targets, candidates, labels = [], [], []
+        for offset, cost, allowed in moves:
+            start = frontier[allowed[frontier]]
+            target = start + offset
+            candidate = distance[start] + cost
+            better = candidate < distance[target]
+            targets.append(target[better])
+            candidates.append(candidate[better])
+            labels.append(label[start[better]])
+        target = np.concatenate(targets)
+        candidate = np.concatenate(candidates)
+        # 同一格子有多个候选时取最小的一个
+        order = np.lexsort((candidate, target))
+        target, candidate, source = target[order], candidate[order], np.concatenate(labels)[order]
+        first = np.ones(target.size, dtype=bool)
+        first[1:] = target[1:] != target[:-1]
+        frontier = target[first]
+        distance[frontier] = candidate[first]
+        label[frontier] = source[first]
+    shape = (ny + 2, width)
+    return distance.reshape(shape)[1:-1, 1:-1].copy(), label.reshape(shape)[1:-1, 1:-1].copy()
+
+
+# 逐格的 8 邻域 Dijkstra（纯 Python 的堆），作为 flood_fill 的参考实现，用于校验结果。
+# deadline（time.perf_counter() 的时刻）可选，超过后抛出 TimeoutError
+def dijkstra_fill(blocked, sources, cell_size, deadline=None):
+    ny, nx = blocked.shape
+    distance = np.full(blocked.size, np.inf)
+    label = np.full(blocked.size, -1, dtype=np.intp)
+    free = ~blocked.ravel()
+    heap = []
+    for source_id, cells in enumerate(sources):
+        for cell in cells:
+            if distance[cell] > 0:
+                distance[cell] = 0.0
+                label[cell] = source_id
+                heap.append((0.0, cell))
+    heapq.heapify(heap)
+    steps = [(dy, dx, cell_size * np.hypot(dy, dx)) for dy, dx in NEIGHBORS]
+    popped = 0
+    while heap:
+        d, cell = heapq.heappop(heap)
+        popped += 1
+        # 每处理 4096 个格子看一次时钟，检查本身的开销可以忽略
+        if deadline is not None and not popped & 4095 and time.perf_counter() > deadline:
+            raise TimeoutError("navigation field flood fill did not finish in time")
+        if d > distance[cell]:
+            continue
+        i, j = divmod(cell, nx)
+        for dy, dx, cost in steps:
+            ni, nj = i + dy, j + dx
+            if ni < 0 or ni >= ny or nj < 0 or nj >= nx:
+                continue
+            neighbor = ni * nx + nj
+            if not free[neighbor]:
+                continue
+            # 斜向移动时不允许穿过墙角
+            if dy and dx and not (free[ni * nx + j] and free[i * nx + nj]):
+                continue
+            nd = d + cost
+            if nd < distance[neighbor]:
+                distance[neighbor] = nd
+                label[neighbor] = label[cell]
+                heapq.heappush(heap, (nd, neighbor))
+    return distance.reshape(blocked.shape), label.reshape(blocked.shape)
+
+
+# 导航距离场：平面栅格化一次后，计算到各楼梯间门口的测地距离（考虑墙壁），
+# 之后病人的出口选择和行进方向都只需按坐标查表
+class NavigationField:
+    def __init__(self, walls, targets, cell_size=0.2, margin=1.0, time_limit=None):
+        # walls / targets 为 (n, 4) 的 (x0, y0, x1, y1) 数组，targets 为各楼梯间门的矩形；
+        # time_limit（秒）可选，计算距离场超过这个时间时抛出 TimeoutError
+        deadline = None if time_limit is None else time.perf_counter() + time_limit
+        walls = np.asarray(walls, dtype=float).reshape(-1, 4)
+        self.targets = np.asarray(targets, dtype=float).reshape(-1, 4)
+        extent = np.vstack([walls, self.targets])
+        self.cell_size = float(cell_size)
+        self.origin = (extent[:, 0].min() - margin, extent[:, 1].min() - margin)
+        self.shape = (int(np.ceil((extent[:, 3].max() + margin - self.origin[1]) / cell_size)),
+                      int(np.ceil((extent[:, 2].max() + margin - self.origin[0]) / cell_size)))
+        self.blocked = rasterize(walls, self.origin, self.shape, self.cell_size)
+        # 门所在的格子一定可以通行
+        self.sources = [self._cells_in(bounds) for bounds in self.targets]
+        for cells in self.sources:
+            self.blocked.ravel()[cells] = False
+        self.distance, self.nearest = flood_fill(self.blocked, self.sources, self.cell_size, deadline)
+        self._fields = {}
+        self.direction_x, self.direction_y = self._descent_directions()
+        self._fill_blocked()
+
+    def to_arrays(self):
+        # 距离场的全部状态（只含数组），可以放进共享内存后用 restore 还原
+        return {
+            'targets': self.targets, 'cell_size': np.float64(self.cell_size), 'origin': np.asarray(self.origin),
+            'blocked': self.blocked, 'distance': self.distance, 'nearest': self.nearest,
+            'direction_x': self.direction_x, 'direction_y': self.direction_y,
+            'source_cells': np.concatenate(self.sources),
+            'source_counts': np.array([cells.size for cells in self.sources], dtype=np.intp),
+        }
+
+    @classmethod
+    def restore(cls, arrays):
+        # 直接使用 to_arrays 导出的数组，不重新计算距离场
+        field = cls.__new__(cls)
+        field.targets = arrays['targets']
+        field.cell_size = float(arrays['cell_size'])
+        field.origin = tuple(float(value) for value in arrays['origin'])
+        field.blocked = arrays['blocked']
+        field.shape = field.blocked.shape
+        field.distance = arrays['distance']
+        field.nearest = arrays['nearest']
+        field.direction_x = arrays['direction_x']
+        field.direction_y = arrays['direction_y']
+        field.sources = np.split(arrays['source_cells'], np.cumsum(arrays['source_counts'])[:-1])
+        field._fields = {}
+        return field
+
+    def _cells_in(self, bounds):
+        x0, y0, x1, y1 = bounds
+        i0 = max(int(np.floor((y0 - self.origin[1]) / self.cell_size)), 0)
+        i1 = min(max(int(np.ceil((y1 - self.origin[1]) / self.cell_size)), i0 + 1), self.shape[0])
+        j0 = max(int(np.floor((x0 - self.origin[0]) / self.cell_size)), 0)
+        j1 = min(max(int(np.ceil((x1 - self.origin[0]) / self.cell_size)), j0 + 1), self.shape[1])
+        rows, cols = np.mgrid[i0:i1, j0:j1]
+        return (rows * self.shape[1] + cols).ravel()
+
+    def _shifted(self, array, dy, dx, fill):
+        # 返回 out[i, j] = array[i + dy, j + dx]，越界处填 fill
+        out = np.full_like(array, fill)
+        ny, nx = array.shape
+        out[max(-dy, 0):ny - max(dy, 0), max(-dx, 0):nx - max(dx, 0)] = \
+            array[max(dy, 0):ny - max(-dy, 0), max(dx, 0):nx - max(-dx, 0)]
+        return out
+
+    def _fill_blocked(self):
+        # 贴着墙的病人可能落在被栅格化为墙的格子里：用相邻格子的值补齐两圈，方向指向该邻格
+        for _ in range(2):
+            best = self.distance.copy()
+            best_label = self.nearest.copy()
+            unknown = ~np.isfinite(self.distance)
+            for dy, dx in NEIGHBORS:
+                length = np.hypot(dy, dx)
+                candidate = self._shifted(self.distance, dy, dx, np.inf) + self.cell_size * length
+                better = unknown & (candidate < best)
+                best[better] = candidate[better]
+                best_label[better] = self._shifted(self.nearest, dy, dx, -1)[better]
+                self.direction_x[better] = dx / length
+                self.direction_y[better] = dy / length
+            self.distance, self.nearest = best, best_label
+
+    def _descent_directions(self):
+        # 每个可通行格子的行进方向：对所有距离更小的邻格按下降速率加权求和后归一化
+        gx = np.zeros(self.shape)
+        gy = np.zeros(self.shape)
+        finite = np.isfinite(self.distance)
+        for dy, dx in NEIGHBORS:
+            length = np.hypot(dy, dx)
+            neighbor = self._shifted(self.distance, dy, dx, np.inf)
+            with np.errstate(invalid='ignore'):
+                drop = np.where(finite & np.isfinite(neighbor), self.distance - neighbor, 0.0)
+            drop = np.maximum(drop, 0.0) / (length * self.cell_size)
+            gx += drop * dx / length
+            gy += drop * dy / length
+        norm = np.hypot(gx, gy)
+        safe = np.where(norm > 0, norm, 1.0)
+        return np.where(norm > 0, gx / safe, 0.0), np.where(norm > 0, gy / safe, 0.0)
+
+    def cell_of(self, x, y):
+        # 坐标 -> (行, 列)，超出栅格的坐标夹到边界上
+        j = np.clip(np.floor((np.asarray(x) - self.origin[0]) / self.cell_size).astype(np.intp), 0, self.shape[1] - 1)
+        i = np.clip(np.floor((np.asarray(y) - self.origin[1]) / self.cell_size).astype(np.intp), 0, self.shape[0] - 1)
+        return i, j
+
+    def lookup(self, x, y):
+        # 一次查表得到 (到最近楼梯间的测地距离, 最近楼梯间编号, 方向 x, 方向 y)
+        i, j = self.cell_of(x, y)
+        return self.distance[i, j], self.nearest[i, j], self.direction_x[i, j], self.direction_y[i, j]
+
+    def field(self, target):
+        # 单个楼梯间门口的测地距离场，第一次使用时计算
+        if target not in self._fields:
+            self._fields[target], _ = flood_fill(self.blocked, [self.sources[target]], self.cell_size)
+        return self._fields[target]
@@ -0,0 +1,154 @@
+import numpy as np
+
+from spatial_hash import cell_key
+
+# 障碍物类型
+KIND_BED = 0
+KIND_WALL = 1
+
+
+# 静态障碍物索引：病床、墙壁等轴对齐矩形按格子分桶，每个布局只建立一次，
+# 之后对整批坐标做“附近障碍物”和“是否在障碍物内”的查询
+class ObstacleIndex:
+    def __init__(self, bounds, kinds=None, owners=None, cell_size=1.0):
+        self.bounds = np.asarray(bounds, dtype=float).reshape(-1, 4)  # (x0, y0, x1, y1)
+        count = self.bounds.shape[0]
+        self.kinds = np.zeros(count, dtype=np.int8) if kinds is None else np.asarray(kinds, dtype=np.int8)
+        self.owners = np.full(count, -1, dtype=np.intp) if owners is None else np.asarray(owners, dtype=np.intp)
+        self.centers = np.column_stack([(self.bounds[:, 0] + self.bounds[:, 2]) / 2,
+                                        (self.bounds[:, 1] + self.bounds[:, 3]) / 2])
+        self.cell_size = float(cell_size)
+        self._build_buckets()
+        # 建好后只读，防止运行中被意外修改
+        for array in (self.bounds, self.kinds, self.owners, self.centers, self.bucket_keys,
+                      self.bucket_start, self.bucket_end, self.bucket_items):
+            array.setflags(write=False)
+
+    @classmethod
+    def from_layout(cls, rooms, walls=(), cell_size=1.0):
+        # 由房间中的病床（记录所属房间编号）和墙壁边界数组构建索引
+        beds, bed_rooms = [], []
+        for index, room in enumerate(rooms):
+            for bed in room.beds:
+                beds.append((bed.x, bed.y, bed.x + bed.width, bed.y + bed.height))
+                bed_rooms.append(index)
+        return cls.from_arrays(beds, bed_rooms, walls, cell_size)
+
+    @classmethod
+    def from_arrays(cls, beds, bed_rooms, walls=(), cell_size=1.0):
+        # beds / walls 为 (n, 4) 的 (x0, y0, x1, y1) 数组，bed_rooms 为每张病床所属的房间编号
+        beds = np.asarray(beds, dtype=float).reshape(-1, 4)
+        walls = np.asarray(walls, dtype=float).reshape(-1, 4)
+        bounds = np.vstack([beds, walls])
+        kinds = np.concatenate([np.full(beds.shape[0], KIND_BED), np.full(walls.shape[0], KIND_WALL)])
+        owners = np.concatenate([np.asarray(bed_rooms, dtype=np.intp).reshape(-1), np.full(walls.shape[0], -1)])
+        return cls(bounds, kinds, owners, cell_size)
+
+    def __len__(self):
+        return self.bounds.shape[0]
+
+    def to_arrays(self):
+        # 索引的全部状态（只含数组），可以放进共享内存后用 restore 还原
+        return {
+            'bounds': self.bounds, 'kinds': self.kinds, 'owners': self.owners, 'centers': self.centers,
+            'cell_size': np.float64(self.cell_size), 'bucket_keys': self.bucket_keys,
+            'bucket_start': self.bucket_start, 'bucket_end': self.bucket_end, 'bucket_items': self.bucket_items,
+        }
+
+    @classmethod
+    def restore(cls, arrays):
+        # 直接使用 to_arrays 导出的数组（不复制、不重新分桶）
+        index = cls.__new__(cls)
+        for name, array in arrays.items():
+            setattr(index, name, array)
+        index.cell_size = float(arrays['cell_size'])
+        return index
+
+    def _build_buckets(self):
+        # 每个矩形登记到它覆盖的所有格子中，按格子键排序后形成 CSR 结构
+        c0 = np.floor(self.bounds[:, :2] / self.cell_size).astype(np.int64)
+        c1 = np.floor(self.bounds[:, 2:] / self.cell_size).astype(np.int64)
+        nx = c1[:, 0] - c0[:, 0] + 1
+        ny = c1[:, 1] - c0[:, 1] + 1
+        counts = nx * ny
+        items = np.repeat(np.arange(len(self)), counts)
+        local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        cx = c0[items, 0] + local // ny[items]
+        cy = c0[items, 1] + local % ny[items]
+        keys = cell_key(cx, cy)
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        self.bucket_items = items[order]
+        self.bucket_keys, self.bucket_start = np.unique(keys, return_index=True)
+        self.bucket_end = np.append(self.bucket_start[1:], keys.size)
+        self.bucket_start = np.asarray(self.bucket_start, dtype=np.intp)
+        self.bucket_end = np.asarray(self.bucket_end, dtype=np.intp)
+
+    def _candidates(self, cx, cy):
+        # 返回 (点编号, 障碍物编号) 候选对：障碍物登记在点所在的格子中
+        keys = cell_key(cx, cy)
+        pos = np.searchsorted(self.bucket_keys, keys)
+        pos_clipped = np.minimum(pos, max(self.bucket_keys.size - 1, 0))
+        found = (pos < self.bucket_keys.size) & (self.bucket_keys[pos_clipped] == keys)
+        start = np.where(found, self.bucket_start[pos_clipped], 0)
+        counts = np.where(found, self.bucket_end[pos_clipped] - start, 0)
+        points = np.repeat(np.arange(cx.size), counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        return points, self.bucket_items[np.repeat(start, counts) + offsets]
+
+    def contains(self, x, y, kind=None):
+        # 判断每个点是否严格位于某个障碍物内部，返回障碍物编号（编号最小者），不在任何障碍物内为 -1
+        x = np.atleast_1d(np.asarray(x, dtype=float))
+        y = np.atleast_1d(np.asarray(y, dtype=float))
+        result = np.full(x.size, len(self), dtype=np.intp)
+        if len(self) == 0 or x.size == 0:
+            return np.full(x.size, -1, dtype=np.intp)
+        cx = np.floor(x / self.cell_size).astype(np.int64)
+        cy = np.floor(y / self.cell_size).astype(np.int64)
+        points, items = self._candidates(cx, cy)
+        b = self.bounds[items]
+        inside = (b[:, 0] < x[points]) & (x[points] < b[:, 2]) & (b[:, 1] < y[points]) & (y[points] < b[:, 3])
+        if kind is not None:
+            inside &= self.kinds[items] == kind
+        np.minimum.at(result, points[inside], items[inside])
+        result[result == len(self)] = -1
+        return result
+
+    def near(self, x, y, radius, kind=None, to_center=False):
+        # 查找每个点 radius 范围内的障碍物，返回 (点编号, 障碍物编号, dx, dy, 距离)
+        # 默认距离为点到矩形的最近距离，to_center=True 时为点到矩形中心的距离；dx, dy 为由障碍物指向点的向量
+        x = np.atleast_1d(np.asarray(x, dtype=float))
+        y = np.atleast_1d(np.asarray(y, dtype=float))
+        if len(self) == 0 or x.size == 0:
+            empty = np.empty(0, dtype=np.intp)
+            return empty, empty, np.empty(0), np.empty(0), np.empty(0)
+        # 矩形中心或最近点在 radius 内时，矩形必然登记在 radius 范围内的某个格子中
+        span = int(np.ceil(radius / self.cell_size))
+        cx = np.floor(x / self.cell_size).astype(np.int64)
+        cy = np.floor(y / self.cell_size).astype(np.int64)
+        all_points, all_items = [], []
+        for ox in range(-span, span + 1):
+            for oy in range(-span, span + 1):
+                points, items = self._candidates(cx + ox, cy + oy)
+                all_points.append(points)
+                all_items.append(items)
+        points = np.concatenate(all_points)
+        items = np.concatenate(all_items)
+        if kind is not None:
+            keep = self.kinds[items] == kind
+            points, items = points[keep], items[keep]
+        # 同一障碍物可能跨多个格子，去掉重复的 (点, 障碍物) 对
+        pair = np.unique(points.astype(np.int64) * len(self) + items)
+        points = (pair // len(self)).astype(np.intp)
+        items = (pair % len(self)).astype(np.intp)
+
+        if to_center:
+            dx = x[points] - self.centers[items, 0]
+            dy = y[points] - self.centers[items, 1]
+        else:
+            b = self.bounds[items]
+            dx = x[points] - np.clip(x[points], b[:, 0], b[:, 2])
+            dy = y[points] - np.clip(y[points], b[:, 1], b[:, 3])
+        d = np.hypot(dx, dy)
+        close = d < radius
+        return points[close], items[close], dx[close], dy[close], d[close]
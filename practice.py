@@ -2,6 +2,9 @@ import numpy as np
 import random
 import matplotlib.pyplot as plt
 import matplotlib.animation as animation
+from geometry import WallGeometry, bed_bounds, interior_bounds
+from obstacles import ObstacleIndex
+from renderer import FloorPlanRenderer
 
 wall_thickness=0.37
 #楼梯类
@@ -70,21 +73,19 @@ class Room:
             obstacle_right = bed.x + bed.width
             obstacle_top = bed.y + bed.height
             obstacles.append((obstacle_x, obstacle_y, obstacle_right, obstacle_top))
-        for wall in all_walls:
-            obstacle_x = wall.get_x()
-            obstacle_y = wall.get_y()
-            obstacle_right = wall.get_x() + wall.get_width()
-            obstacle_top = wall.get_y() + wall.get_height()
-            obstacles.append((obstacle_x, obstacle_y, obstacle_right, obstacle_top))
+        # 墙壁在布局确定时已经计算好，每行即为 (x0, y0, x1, y1)
+        obstacles.extend(tuple(wall) for wall in wall_geometry.walls)
+        # 障碍物索引只建立一次，房间内的病人共用
+        obstacle_index = ObstacleIndex(obstacles)
         for index, bed in enumerate(self.beds):  # 获取病床索引
-            patient = Patient(bed, index, obstacles=obstacles)
+            patient = Patient(bed, index, obstacles=obstacles, obstacle_index=obstacle_index)
             self.patients.append(patient)
             bed.has_patient = True
 
 
 # 病人类
 class Patient:
-    def __init__(self, bed, speed=0.05, avoidance_coefficient=0.5, avoidance_distance=1.5, obstacles=[]):
+    def __init__(self, bed, speed=0.05, avoidance_coefficient=0.5, avoidance_distance=1.5, obstacles=[], obstacle_index=None):
         self.x = bed.x + bed.width / 2
         self.y = bed.y + bed.height
         self.vx = 0
@@ -97,17 +98,17 @@ class Patient:
         self.avoidance_distance = avoidance_distance
         self.room = bed.bedroom
         self.obstacles = obstacles
+        if obstacle_index is None:
+            obstacle_index = ObstacleIndex(obstacles)
+        self.obstacle_index = obstacle_index
 
     def find_closest_staircase(self):
         closest_distance = float('inf')
         closest_staircase = None
+        # 病人是否在障碍物内只与自身位置有关，查询一次索引即可
+        is_blocked = self.obstacle_index.contains(self.x, self.y)[0] >= 0
         for staircase in staircases:
             distance = np.sqrt((self.x - staircase.door_x) ** 2 + (self.y - staircase.door_y) ** 2)
-            is_blocked = False
-            for obstacle_x, obstacle_y, obstacle_right, obstacle_top in self.obstacles:
-                if obstacle_x < self.x < obstacle_right and obstacle_y < self.y < obstacle_top:
-                    is_blocked = True
-                    break
             if not is_blocked and distance < closest_distance:
                 closest_distance = distance
                 closest_staircase = staircase
@@ -192,143 +193,48 @@ staircase1 = Staircase(0, 0, 3.01, 5.5,0.6,5.87,1.2)
 staircases=[staircase1]
 office1 = Office(16.315, 0, 6.13, 5.5, 19.75, 5.87, 1.2)
 offices=[office1]
-all_walls = []
 # 初始化房间和病床时，确保病床正确关联到房间
 room1 = Room(3.38, 0, 2.88, 5.5, 5.965, 5.87, 1.2,
              [Bed(3.75, 0.705, 2, 1), Bed(3.75, 2.328, 2, 1), Bed(3.75, 4.003, 2, 1)])
-room1.initialize_patients()
 
 room2 = Room(6.565, 0, 2.88, 5.5, 9.215, 5.87, 1.2,
              [Bed(6.935, 0.705, 2, 1), Bed(6.935, 2.328, 2, 1), Bed(6.935,4.003, 2, 1)])
-room2.initialize_patients()
 
 room3 = Room(9.815, 0, 6.13, 5.5, 13.25, 5.87, 1.2,
              [Bed(10.185, 0.705, 2, 1), Bed(10.185, 2.328, 2, 1), Bed(10.185,4.003, 2, 1), Bed(14.315, 0.705, 2, 1), Bed(14.315, 2.328, 2, 1), Bed(14.315,4.003, 2, 1)])
-room3.initialize_patients()
 
 rooms_one = [room1, room2]
 rooms_two=[room3]
+rooms=[room1, room2, room3]
+# 墙壁和门由各组建筑的定义计算一次（门所在的边和位置：楼梯间在左侧、办公室和 rooms_two 在中间、rooms_one 在右侧），
+# 之后碰撞检测和绘图都使用这份数据，不再从每帧画出的矩形中收集
+wall_groups=[(staircases,'top','left'),(offices,'top','center'),(rooms_one,'top','right'),(rooms_two,'top','center')]
+wall_geometry = WallGeometry.from_groups(wall_groups)
+for room in rooms:
+    room.initialize_patients()
 some_interaction_distance = 1.0  # 行人之间相互作用距离阈值
 some_interaction_coefficient = 0.3  # 行人之间相互作用系数
 
 # 创建图形窗口
 fig, ax = plt.subplots()
 
-def draw():
-    ax.set_xlim(0, 20)
-    ax.set_ylim(-2, 20)
-    ax.set_aspect('equal', adjustable='box')
-    ax.cla()
-
-    def draw_rect(ax, x, y, width, height, color, lw, ec, fill=False):
-        rect = plt.Rectangle((x, y), width, height, color=color, lw=lw, ec=ec, fill=fill)
-        ax.add_patch(rect)
-        return rect
-    for staircase in staircases:
-        # 绘制楼梯的墙壁
-        #左侧
-        staircase_left_wall=draw_rect(ax, staircase.x, staircase.y, wall_thickness, staircase.height + wall_thickness * 2, 'black', 2, "black", fill=True)
-        all_walls.append(staircase_left_wall)
-        #右侧
-        staircase_right_wall=draw_rect(ax, staircase.x + staircase.width + wall_thickness, staircase.y, wall_thickness, staircase.height + wall_thickness * 2, 'black', 2, "black", fill=True)
-        all_walls.append(staircase_right_wall)
-        #下侧
-        staircase_bottom_wall=draw_rect(ax, staircase.x + wall_thickness, staircase.y, staircase.width, wall_thickness, 'black', 2, "black",fill=True)
-        all_walls.append(staircase_bottom_wall)
-        #上侧
-        staircase_top_wall=draw_rect(ax, staircase.x + wall_thickness + staircase.door_width,staircase.y + staircase.height + wall_thickness, staircase.width - staircase.door_width, wall_thickness,'black', 2, "black", fill=True)
-        all_walls.append(staircase_top_wall)
-        #楼梯门
-        draw_rect(ax, staircase.x+wall_thickness, staircase.door_y, staircase.door_width, wall_thickness, 'brown', 2, "brown",fill=True)
-
-
-
-    for office in offices:
-        # 绘制办公室的墙壁
-        #左侧
-        office_left_wall = draw_rect(ax,office.x,office.y, wall_thickness, office.height+wall_thickness*2 , color='black', lw=2, ec="black", fill=True)
-        all_walls.append(office_left_wall)
-        #右侧
-        office_right_wall = draw_rect(ax,office.x + office.width + wall_thickness, office.y, wall_thickness, office.height+wall_thickness*2, color='black', lw=2, ec="black", fill=True)
-        all_walls.append(office_right_wall)
-        #下侧
-        office_bottom_wall = draw_rect(ax,office.x + wall_thickness, office.y, office.width, wall_thickness, color='black', lw=2, ec="black", fill=True)
-        all_walls.append(office_bottom_wall)
-        #上侧（左半部分）
-        office_top_left_wall = draw_rect(ax,office.x + wall_thickness, office.y + office.height + wall_thickness, office.width/2 - office.door_width/2, wall_thickness, color='black', lw=2, ec="black", fill=True)
-        all_walls.append(office_top_left_wall)
-        #上侧（右半部分）
-        office_top_right_wall = draw_rect(ax, office.x + wall_thickness+ office.width/2 + office.door_width/2, office.y+ office.height + wall_thickness, office.width / 2 - office.door_width / 2, wall_thickness, color='black', lw=2, ec="black", fill=True)
-        all_walls.append(office_top_right_wall)
-        #门
-        draw_rect(ax,office.x+wall_thickness+office.width/2 -office.door_width/2 , office.door_y, office.door_width, wall_thickness, color='brown', lw=2, ec="brown",fill=True)
-
-    for room in rooms_one:
-        # 绘制房间的墙壁(门在右侧)
-        # 左侧
-        rooms_one_left_wall = draw_rect(ax, room.x, room.y, wall_thickness, room.height + wall_thickness * 2, color='black', lw=2,ec="black", fill=True)
-        all_walls.append(rooms_one_left_wall)
-        # 右侧
-        rooms_one_right_wall = draw_rect(ax, room.x + room.width + wall_thickness, room.y, wall_thickness,room.height + wall_thickness * 2, color='black', lw=2, ec="black", fill=True)
-        all_walls.append(rooms_one_right_wall)
-        # 下侧
-        rooms_one_bottom_wall = draw_rect(ax, room.x + wall_thickness, room.y, room.width, wall_thickness, color='black', lw=2,ec="black", fill=True)
-        all_walls.append(rooms_one_bottom_wall)
-        #上侧
-        rooms_one_top_wall = draw_rect(ax, room.x + wall_thickness ,room.y + room.height + wall_thickness, room.width - room.door_width,wall_thickness, 'black', 2, "black", fill=True)
-        all_walls.append(rooms_one_top_wall)
-        # 门
-        draw_rect(ax, room.x + wall_thickness + room.width - room.door_width , room.door_y,room.door_width, wall_thickness, color='brown', lw=2, ec="brown", fill=True)
-        # 房间内部空间
-        draw_rect(ax,room.x + wall_thickness, room.y + wall_thickness,room.width, room.height, color='lightblue', lw=1,ec='lightblue', fill=True)
-
-
-    for bed in room1.beds + room2.beds  :
-        ax.add_patch(plt.Rectangle((bed.x, bed.y), bed.width, bed.height, color='brown', lw=1, ec="black"))
-
-    for room in rooms_two:
-        # 绘制房间的墙壁(门在中间)
-        # 左侧
-        rooms_two_left_wall = draw_rect(ax, room.x, room.y, wall_thickness, room.height + wall_thickness * 2, color='black', lw=2, ec="black",fill=True)
-        all_walls.append(rooms_two_left_wall)
-        # 右侧
-        rooms_two_right_wall = draw_rect(ax, room.x + room.width + wall_thickness, room.y, wall_thickness, room.height + wall_thickness * 2, color='black', lw=2, ec="black", fill=True)
-        all_walls.append(rooms_two_right_wall)
-        # 下侧
-        rooms_two_bottom_wall = draw_rect(ax, room.x + wall_thickness, room.y, room.width, wall_thickness, color='black', lw=2, ec="black", fill=True)
-        all_walls.append(rooms_two_bottom_wall)
-        # 上侧（左半部分）
-        rooms_two_top_left_wall = draw_rect(ax, room.x + wall_thickness, room.y + room.height + wall_thickness, room.width / 2 - room.door_width / 2, wall_thickness, color='black', lw=2, ec="black", fill=True)
-        all_walls.append(rooms_two_top_left_wall)
-        # 上侧（右半部分）
-        rooms_two_top_right_wall = draw_rect(ax, room.x + wall_thickness + room.width / 2 + room.door_width / 2, room.y + room.height + wall_thickness, room.width / 2 - room.door_width / 2, wall_thickness,color='black', lw=2, ec="black", fill=True)
-        all_walls.append(rooms_two_top_right_wall)
-        # 门
-        draw_rect(ax, room.x + wall_thickness + room.width / 2 - room.door_width / 2, room.door_y,room.door_width, wall_thickness, color='brown', lw=2, ec="brown", fill=True)
-        # 房间内部空间
-        draw_rect(ax, room.x + wall_thickness, room.y + wall_thickness, room.width, room.height, color='lightblue', lw=1, ec='lightblue', fill=True)
-
-
-    # 绘制房间的病床
-    for bed in  room3.beds :
-        ax.add_patch(plt.Rectangle((bed.x, bed.y), bed.width, bed.height, color='brown', lw=1, ec="black"))
-
+# 静态的平面图只绘制一次，之后每帧只更新病人位置
+renderer = FloorPlanRenderer(ax, wall_geometry.walls, wall_geometry.doors, interior_bounds(rooms), bed_bounds(rooms), 2)
 
+def draw():
     # 绘制病人（遍历所有房间的病人列表合并后的数据）
     all_patients = []
-    for room in rooms_one :
+    for room in rooms:
         all_patients.extend(room.patients)
-    for room in rooms_two :
-        all_patients.extend(room.patients)
-    for patient in all_patients:
-        ax.plot(patient.x, patient.y, 'ro', markersize=2)
+    return renderer.update([patient.x for patient in all_patients], [patient.y for patient in all_patients])
 
 # 动画函数
 def animate(i):
     if update_patients():
         ani.event_source.stop()
-    draw()
+    return draw()
 
 
-ani = animation.FuncAnimation(fig, animate, frames=200, interval=50, repeat=False)
+# 病人散点是 animated 对象，只在 blit 时绘制，因此 animate 返回它并打开 blit
+ani = animation.FuncAnimation(fig, animate, init_func=renderer.init, frames=200, interval=50, repeat=False, blit=True)
 plt.show()
@@ -0,0 +1,80 @@
+import time
+
+import numpy as np
+
+# 直方图按 2 的幂分桶：第 b 个桶统计耗时在 [2^(b-1), 2^b) 纳秒之间的次数
+BUCKETS = 64
+
+
+# 分阶段计时器：被测代码用 lap 记录从 start 到现在的耗时并返回当前时间，作为下一阶段的起点：
+#
+#     prof = self.profiler
+#     if prof is not None:
+#         t = prof.clock()
+#     ...  # 阶段 A
+#     if prof is not None:
+#         t = prof.lap('a', t)
+#
+# 不需要计时时 profiler 为 None，只多一次 is None 判断
+class PhaseProfiler:
+    def __init__(self):
+        self.clock = time.perf_counter_ns
+        # 阶段名 -> [次数, 总耗时, 最大耗时, 直方图]，按第一次出现的顺序排列
+        self._phases = {}
+
+    def lap(self, name, start):
+        now = self.clock()
+        self.add(name, now - start)
+        return now
+
+    def add(self, name, ns):
+        phase = self._phases.get(name)
+        if phase is None:
+            phase = self._phases[name] = [0, 0, 0, [0] * BUCKETS]
+        phase[0] += 1
+        phase[1] += ns
+        if ns > phase[2]:
+            phase[2] = ns
+        phase[3][min(ns.bit_length(), BUCKETS - 1)] += 1
+
+    def reset(self):
+        self._phases.clear()
+
+    def merge(self, other):
+        # 合并另一个计时器（例如另一个进程中的运行）的结果
+        for name, (count, total, longest, histogram) in other._phases.items():
+            phase = self._phases.setdefault(name, [0, 0, 0, [0] * BUCKETS])
+            phase[0] += count
+            phase[1] += total
+            phase[2] = max(phase[2], longest)
+            phase[3] = [a + b for a, b in zip(phase[3], histogram)]
+        return self
+
+    def phases(self):
+        # 各阶段的统计：次数、总耗时、平均、最大，以及由直方图估计的 P50/P95（取所在桶的上界）
+        stats = {}
+        for name, (count, total, longest, histogram) in self._phases.items():
+            histogram = np.asarray(histogram, dtype=np.int64)
+            cumulative = np.cumsum(histogram)
+            upper = 2.0 ** np.arange(BUCKETS)
+            stats[name] = {
+                'count': count,
+                'total_ns': total,
+                'mean_ns': total / count if count else 0.0,
+                'max_ns': longest,
+                'p50_ns': min(float(upper[np.searchsorted(cumulative, 0.5 * count)]), longest) if count else 0.0,
+                'p95_ns': min(float(upper[np.searchsorted(cumulative, 0.95 * count)]), longest) if count else 0.0,
+                'histogram': histogram,
+            }
+        return stats
+
+    def report(self):
+        stats = self.phases()
+        grand_total = sum(phase['total_ns'] for phase in stats.values()) or 1
+        lines = ["%-20s %8s %10s %6s %10s %10s %10s" % ('phase', 'calls', 'total ms', '%', 'mean us', 'p95 us',
+                                                         'max us')]
+        for name, phase in sorted(stats.items(), key=lambda item: -item[1]['total_ns']):
+            lines.append("%-20s %8d %10.2f %6.1f %10.2f %10.2f %10.2f" % (
+                name, phase['count'], phase['total_ns'] / 1e6, 100.0 * phase['total_ns'] / grand_total,
+                phase['mean_ns'] / 1e3, phase['p95_ns'] / 1e3, phase['max_ns'] / 1e3))
+        return "\n".join(lines)
@@ -2,6 +2,8 @@ import numpy as np
 import random
 import matplotlib.pyplot as plt
 import matplotlib.animation as animation
+from geometry import WallGeometry, bed_bounds, interior_bounds
+from renderer import FloorPlanRenderer
 
 # 病床类
 class Bed:
@@ -15,7 +17,7 @@ class Bed:
 
 # 病人类
 class Patient:
-    def __init__(self, bed, bed_index, speed=0.05, avoidance_coefficient=0.5, door_offset=2, avoidance_distance=1.5, obstacles=[]):
+    def __init__(self, bed, bed_index, speed=0.05, avoidance_coefficient=0.5, door_offset=2, avoidance_distance=1.5, obstacles=[], walls=None):
         self.x = bed.x + bed.width / 2
         self.y = bed.y + bed.height
         self.vx = 0
@@ -37,7 +39,9 @@ class Patient:
             self.staircase_target_x, self.staircase_target_y = self.staircase.get_entry_coordinates()
         else:
             self.staircase_target_x, self.staircase_target_y = self.corridor_target_x, self.corridor_target_y  # 如果没有楼梯间，目标就是走廊出口
-        self.obstacles = obstacles  # 接收包含病床和墙壁的 obstacles 列表
+        self.obstacles = obstacles  # 接收包含病床的 obstacles 列表
+        # 墙壁为 WallGeometry，中心点只在建立时计算一次
+        self.wall_centers = walls.centers if walls is not None else np.empty((0, 2))
 
     def update_position(self, all_patients):  # 添加 all_patients 参数
 
@@ -49,18 +53,7 @@ class Patient:
             self.move_towards_staircase_exit()
 
         self.apply_avoidance_force()  # 将 all_patients 传递给 apply_avoidance_force 方法
-        self.x += self.vx
-        self.y += self.vy
-
-        if not self.at_corridor and self.corridor.is_within_bounds(self.x, self.y):
-            self.at_corridor = True
-        elif not self.at_staircase and self.staircase is not None and self.staircase.is_within_bounds(self.x, self.y):
-            self.at_staircase = True
-        elif self.at_staircase and self.staircase.get_exit_coordinates()[0] <= self.x:
-            self.room.patients.remove(self)
-
-        all_patients_list = all_patients  # 获取到 all_patients 列表
-        self.apply_avoidance_force()  # 传递提取出来的 all_patients 列表给 apply_avoidance_force 方法
+        # 每步只积分一次
         self.x += self.vx
         self.y += self.vy
 
@@ -124,9 +117,6 @@ class Patient:
             elif isinstance(obstacle, Staircase):
                 center_x = obstacle.door_x + obstacle.door_width / 2
                 center_y = obstacle.door_y
-            elif isinstance(obstacle, plt.Rectangle):  # 假设墙壁对象是 matplotlib 的矩形对象，根据实际调整类型判断
-                center_x = obstacle.get_x() + obstacle.get_width() / 2
-                center_y = obstacle.get_y() + obstacle.get_height() / 2
 
             distance_to_obstacle = np.sqrt((self.x - center_x) ** 2 + (self.y - center_y) ** 2)
 
@@ -139,6 +129,14 @@ class Patient:
                     self.vx += (avoid_x / avoidance_distance) * self.avoidance_coefficient * self.speed
                     self.vy += (avoid_y / avoidance_distance) * self.avoidance_coefficient * self.speed
 
+        # 考虑避让墙壁的力：对所有墙壁的中心点一次向量化计算
+        avoid_x = self.x - self.wall_centers[:, 0]
+        avoid_y = self.y - self.wall_centers[:, 1]
+        distance_to_wall = np.sqrt(avoid_x ** 2 + avoid_y ** 2)
+        near = (distance_to_wall < self.avoidance_distance) & (distance_to_wall > 0)
+        self.vx += np.sum(avoid_x[near] / distance_to_wall[near]) * self.avoidance_coefficient * self.speed
+        self.vy += np.sum(avoid_y[near] / distance_to_wall[near]) * self.avoidance_coefficient * self.speed
+
 
 class Staircase:
     def __init__(self, x, y, width, height, door_x, door_y, door_width):
@@ -214,14 +212,13 @@ class Room:
         for bed in self.beds:
             bed.bedroom = self  # 每个病床都知道自己所在的房间
 
-    def initialize_patients(self, all_walls):  # 修改方法定义，添加 all_walls 参数
+    def initialize_patients(self, walls):  # walls 为整个平面的 WallGeometry
         obstacles = []
         obstacles.extend(self.beds)
-        obstacles.extend(all_walls)
 
         for index, bed in enumerate(self.beds):  # 获取病床索引
             if not bed.has_patient:
-                patient = Patient(bed, index, obstacles=obstacles)  # 将包含病床和墙壁的 obstacles 列表传递给 Patient 类构造函数
+                patient = Patient(bed, index, obstacles=obstacles, walls=walls)  # 病床和墙壁分别传递给 Patient 类构造函数
                 self.patients.append(patient)
                 bed.has_patient = True
 
@@ -240,147 +237,53 @@ staircases=[staircase1]
 office1 = Office(16.315, 0, 6.13, 5.5, 19.75, 5.87, 1.2)
 offices=[office1]
 corridor1=Corridor(0.37,6.24,16.315,2.25)
-all_walls = []
 # 初始化房间和病床时，确保病床正确关联到房间
 room1 = Room(3.38, 0, 2.88, 5.5, 5.965, 5.87, 1.2,
              [Bed(3.75, 0.705, 2, 1), Bed(3.75, 2.328, 2, 1), Bed(3.75, 4.003, 2, 1)],staircase1)
-room1.initialize_patients(all_walls)
 
 room2 = Room(6.565, 0, 2.88, 5.5, 9.215, 5.87, 1.2,
              [Bed(6.935, 0.705, 2, 1), Bed(6.935, 2.328, 2, 1), Bed(6.935,4.003, 2, 1)],staircase1)
-room2.initialize_patients(all_walls)
 
 room3 = Room(9.815, 0, 6.13, 5.5, 13.25, 5.87, 1.2,
              [Bed(10.185, 0.705, 2, 1), Bed(10.185, 2.328, 2, 1), Bed(10.185,4.003, 2, 1), Bed(14.315, 0.705, 2, 1), Bed(14.315, 2.328, 2, 1), Bed(14.315,4.003, 2, 1)],staircase1)
-room3.initialize_patients(all_walls)
 
 rooms_one = [room1, room2]
 rooms_two=[room3]
+rooms=[room1, room2, room3]
+# 墙壁和门由各组建筑的定义计算一次（门所在的边和位置：楼梯间在左侧、办公室和 rooms_two 在中间、rooms_one 在右侧），
+# 之后避障和绘图都使用这份数据，不再从每帧画出的矩形中收集
+wall_groups=[(staircases,'top','left'),(offices,'top','center'),(rooms_one,'top','right'),(rooms_two,'top','center')]
+wall_geometry = WallGeometry.from_groups(wall_groups)
+for room in rooms:
+    room.initialize_patients(wall_geometry)
 some_interaction_distance = 1.0  # 行人之间相互作用距离阈值
 some_interaction_coefficient = 0.3  # 行人之间相互作用系数
 
 # 创建图形窗口
 fig, ax = plt.subplots()
 
-def draw():
-    ax.set_xlim(0, 20)
-    ax.set_ylim(-2, 20)
-    ax.set_aspect('equal', adjustable='box')
-    ax.cla()
-    wall_thickness = 0.37
-    #绘制走廊
-    corridor = plt.Rectangle((staircase1.x + wall_thickness, staircase1.y+wall_thickness*2+staircase1.height), staircase1.width+room1.width+room2.width+room3.width+office1.width+wall_thickness*5, 2.25, color='gray', lw=2, ec="black")  # 走廊颜色设为灰色示例
-    ax.add_patch(corridor)
-
-    def draw_rect(ax, x, y, width, height, color, lw, ec, fill=False):
-        rect = plt.Rectangle((x, y), width, height, color=color, lw=lw, ec=ec, fill=fill)
-        ax.add_patch(rect)
-        return rect
-    for staircase in staircases:
-        # 绘制楼梯的墙壁
-        #左侧
-        staircase_left_wall=draw_rect(ax, staircase.x, staircase.y, wall_thickness, staircase.height + wall_thickness * 2, 'black', 2, "black", fill=True)
-        all_walls.append(staircase_left_wall)
-        #右侧
-        staircase_right_wall=draw_rect(ax, staircase.x + staircase.width + wall_thickness, staircase.y, wall_thickness, staircase.height + wall_thickness * 2, 'black', 2, "black", fill=True)
-        all_walls.append(staircase_right_wall)
-        #下侧
-        staircase_bottom_wall=draw_rect(ax, staircase.x + wall_thickness, staircase.y, staircase.width, wall_thickness, 'black', 2, "black",fill=True)
-        all_walls.append(staircase_bottom_wall)
-        #上侧
-        staircase_top_wall=draw_rect(ax, staircase.x + wall_thickness + staircase.door_width,staircase.y + staircase.height + wall_thickness, staircase.width - staircase.door_width, wall_thickness,'black', 2, "black", fill=True)
-        all_walls.append(staircase_top_wall)
-        #楼梯门
-        draw_rect(ax, staircase.x+wall_thickness, staircase.door_y, staircase.door_width, wall_thickness, 'brown', 2, "brown",fill=True)
-
-
-
-    for office in offices:
-        # 绘制办公室的墙壁
-        #左侧
-        office_left_wall = draw_rect(ax,office.x,office.y, wall_thickness, office.height+wall_thickness*2 , color='black', lw=2, ec="black", fill=True)
-        all_walls.append(office_left_wall)
-        #右侧
-        office_right_wall = draw_rect(ax,office.x + office.width + wall_thickness, office.y, wall_thickness, office.height+wall_thickness*2, color='black', lw=2, ec="black", fill=True)
-        all_walls.append(office_right_wall)
-        #下侧
-        office_bottom_wall = draw_rect(ax,office.x + wall_thickness, office.y, office.width, wall_thickness, color='black', lw=2, ec="black", fill=True)
-        all_walls.append(office_bottom_wall)
-        #上侧（左半部分）
-        office_top_left_wall = draw_rect(ax,office.x + wall_thickness, office.y + office.height + wall_thickness, office.width/2 - office.door_width/2, wall_thickness, color='black', lw=2, ec="black", fill=True)
-        all_walls.append(office_top_left_wall)
-        #上侧（右半部分）
-        office_top_right_wall = draw_rect(ax, office.x + wall_thickness+ office.width/2 + office.door_width/2, office.y+ office.height + wall_thickness, office.width / 2 - office.door_width / 2, wall_thickness, color='black', lw=2, ec="black", fill=True)
-        all_walls.append(office_top_right_wall)
-        #门
-        draw_rect(ax,office.x+wall_thickness+office.width/2 -office.door_width/2 , office.door_y, office.door_width, wall_thickness, color='brown', lw=2, ec="brown",fill=True)
-
-    for room in rooms_one:
-        # 绘制房间的墙壁(门在右侧)
-        # 左侧
-        rooms_one_left_wall = draw_rect(ax, room.x, room.y, wall_thickness, room.height + wall_thickness * 2, color='black', lw=2,ec="black", fill=True)
-        all_walls.append(rooms_one_left_wall)
-        # 右侧
-        rooms_one_right_wall = draw_rect(ax, room.x + room.width + wall_thickness, room.y, wall_thickness,room.height + wall_thickness * 2, color='black', lw=2, ec="black", fill=True)
-        all_walls.append(rooms_one_right_wall)
-        # 下侧
-        rooms_one_bottom_wall = draw_rect(ax, room.x + wall_thickness, room.y, room.width, wall_thickness, color='black', lw=2,ec="black", fill=True)
-        all_walls.append(rooms_one_bottom_wall)
-        #上侧
-        rooms_one_top_wall = draw_rect(ax, room.x + wall_thickness ,room.y + room.height + wall_thickness, room.width - room.door_width,wall_thickness, 'black', 2, "black", fill=True)
-        all_walls.append(rooms_one_top_wall)
-        # 门
-        draw_rect(ax, room.x + wall_thickness + room.width - room.door_width , room.door_y,room.door_width, wall_thickness, color='brown', lw=2, ec="brown", fill=True)
-        # 房间内部空间
-        draw_rect(ax,room.x + wall_thickness, room.y + wall_thickness,room.width, room.height, color='lightblue', lw=1,ec='lightblue', fill=True)
-
-
-    for bed in room1.beds + room2.beds  :
-        ax.add_patch(plt.Rectangle((bed.x, bed.y), bed.width, bed.height, color='brown', lw=1, ec="black"))
-
-    for room in rooms_two:
-        # 绘制房间的墙壁(门在中间)
-        # 左侧
-        rooms_two_left_wall = draw_rect(ax, room.x, room.y, wall_thickness, room.height + wall_thickness * 2, color='black', lw=2, ec="black",fill=True)
-        all_walls.append(rooms_two_left_wall)
-        # 右侧
-        rooms_two_right_wall = draw_rect(ax, room.x + room.width + wall_thickness, room.y, wall_thickness, room.height + wall_thickness * 2, color='black', lw=2, ec="black", fill=True)
-        all_walls.append(rooms_two_right_wall)
-        # 下侧
-        rooms_two_bottom_wall = draw_rect(ax, room.x + wall_thickness, room.y, room.width, wall_thickness, color='black', lw=2, ec="black", fill=True)
-        all_walls.append(rooms_two_bottom_wall)
-        # 上侧（左半部分）
-        rooms_two_top_left_wall = draw_rect(ax, room.x + wall_thickness, room.y + room.height + wall_thickness, room.width / 2 - room.door_width / 2, wall_thickness, color='black', lw=2, ec="black", fill=True)
-        all_walls.append(rooms_two_top_left_wall)
-        # 上侧（右半部分）
-        rooms_two_top_right_wall = draw_rect(ax, room.x + wall_thickness + room.width / 2 + room.door_width / 2, room.y + room.height + wall_thickness, room.width / 2 - room.door_width / 2, wall_thickness,color='black', lw=2, ec="black", fill=True)
-        all_walls.append(rooms_two_top_right_wall)
-        # 门
-        draw_rect(ax, room.x + wall_thickness + room.width / 2 - room.door_width / 2, room.door_y,room.door_width, wall_thickness, color='brown', lw=2, ec="brown", fill=True)
-        # 房间内部空间
-        draw_rect(ax, room.x + wall_thickness, room.y + wall_thickness, room.width, room.height, color='lightblue', lw=1, ec='lightblue', fill=True)
-
-
-    # 绘制房间的病床
-    for bed in  room3.beds :
-        ax.add_patch(plt.Rectangle((bed.x, bed.y), bed.width, bed.height, color='brown', lw=1, ec="black"))
-
+# 静态的平面图只绘制一次，之后每帧只更新病人位置
+renderer = FloorPlanRenderer(ax, wall_geometry.walls, wall_geometry.doors, interior_bounds(rooms), bed_bounds(rooms), 2)
+#绘制走廊
+wall_thickness = 0.37
+corridor = plt.Rectangle((staircase1.x + wall_thickness, staircase1.y+wall_thickness*2+staircase1.height), staircase1.width+room1.width+room2.width+room3.width+office1.width+wall_thickness*5, 2.25, color='gray', lw=2, ec="black", zorder=0)  # 走廊颜色设为灰色示例
+ax.add_patch(corridor)
+ax.autoscale_view()
 
+def draw():
     # 绘制病人（遍历所有房间的病人列表合并后的数据）
     all_patients = []
-    for room in rooms_one :
+    for room in rooms:
         all_patients.extend(room.patients)
-    for room in rooms_two :
-        all_patients.extend(room.patients)
-    for patient in all_patients:
-        ax.plot(patient.x, patient.y, 'ro', markersize=2)
+    return renderer.update([patient.x for patient in all_patients], [patient.y for patient in all_patients])
 
 # 动画函数
 def animate(i):
     if update_patients():
         ani.event_source.stop()
-    draw()
+    return draw()
 
 
-ani = animation.FuncAnimation(fig, animate, frames=200, interval=50, repeat=False)
+# 病人散点是 animated 对象，只在 blit 时绘制，因此 animate 返回它并打开 blit
+ani = animation.FuncAnimation(fig, animate, init_func=renderer.init, frames=200, interval=50, repeat=False, blit=True)
 plt.show()
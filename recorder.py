@@ -0,0 +1,141 @@
+import json
+import os
+
+import numpy as np
+
+# 每步记录的字段：(名称, dtype)。数组按病人编号排列，已疏散或尚未记录的病人位置为 NaN
+FIELDS = (
+    ('x', np.float32),
+    ('y', np.float32),
+    ('vx', np.float32),
+    ('vy', np.float32),
+    ('phase', np.int8),
+    ('active', np.bool_),
+)
+META_FILE = 'meta.json'
+
+
+# 轨迹记录器：每步的状态先写入固定大小的内存缓冲区（chunk_steps 步），写满后追加到每个字段各自的
+# 二进制文件中。占用的内存只取决于 chunk_steps x 病人数，与运行多长时间无关；读取时用 Trajectory 映射文件
+class TrajectoryRecorder:
+    def __init__(self, directory, n_patients, chunk_steps=256, every=1, metadata=None):
+        self.directory = directory
+        self.n_patients = n_patients
+        self.chunk_steps = chunk_steps
+        self.every = every  # 每隔几步记录一帧
+        self.metadata = dict(metadata or {})  # 附加信息，例如布局文件路径
+        self.frames = 0  # 已写入文件的帧数
+        self.fill = 0  # 缓冲区中的帧数
+        self.buffers = {name: np.empty((chunk_steps, n_patients), dtype=dtype) for name, dtype in FIELDS}
+        self.step_buffer = np.empty(chunk_steps, dtype=np.int64)
+        os.makedirs(directory, exist_ok=True)
+        # 新的记录覆盖目录中已有的文件
+        for name in [name for name, _ in FIELDS] + ['step']:
+            open(self._path(name), 'wb').close()
+        self._write_meta()
+
+    @classmethod
+    def for_engine(cls, engine, directory, **kwargs):
+        return cls(directory, len(engine), **kwargs)
+
+    def _path(self, name):
+        return os.path.join(self.directory, name + '.bin')
+
+    def _write_meta(self):
+        meta = {
+            'n_patients': self.n_patients,
+            'frames': self.frames,
+            'every': self.every,
+            'fields': {name: np.dtype(dtype).str for name, dtype in FIELDS},
+            'metadata': self.metadata,
+        }
+        temporary = os.path.join(self.directory, META_FILE + '.tmp')
+        with open(temporary, 'w') as f:
+            json.dump(meta, f)
+        os.replace(temporary, os.path.join(self.directory, META_FILE))
+
+    def record(self, engine):
+        # 记录引擎当前的状态；不在记录间隔上的步直接跳过
+        if engine.step_count % self.every:
+            return
+        row = self.fill
+        n = engine.n_active
+        ids = engine.ids[:n]
+        for name in ('x', 'y', 'vx', 'vy'):
+            buffer = self.buffers[name][row]
+            buffer.fill(np.nan)
+            buffer[ids] = getattr(engine, name)[:n]
+        self.buffers['phase'][row].fill(-1)
+        self.buffers['phase'][row][ids] = engine.phase[:n]
+        self.buffers['active'][row].fill(False)
+        self.buffers['active'][row][ids] = True
+        self.step_buffer[row] = engine.step_count
+        self.fill += 1
+        if self.fill == self.chunk_steps:
+            self.flush()
+
+    def flush(self):
+        # 缓冲区中的帧追加到文件，并更新 meta.json，因此中途停止的记录也可以读取
+        if self.fill == 0:
+            return
+        for name, _ in FIELDS:
+            with open(self._path(name), 'ab') as f:
+                self.buffers[name][:self.fill].tofile(f)
+        with open(self._path('step'), 'ab') as f:
+            self.step_buffer[:self.fill].tofile(f)
+        self.frames += self.fill
+        self.fill = 0
+        self._write_meta()
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# 读取记录的轨迹：各字段按需映射为 (帧数, 病人数) 的只读 memmap，不会把整个文件读入内存
+class Trajectory:
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, META_FILE)) as f:
+            meta = json.load(f)
+        self.n_patients = meta['n_patients']
+        self.frames = meta['frames']
+        self.every = meta['every']
+        self.dtypes = meta['fields']
+        self.metadata = meta.get('metadata', {})
+        self._maps = {}
+
+    def __len__(self):
+        return self.frames
+
+    def field(self, name):
+        if name not in self._maps:
+            if name == 'step':
+                dtype, shape = np.int64, (self.frames,)
+            else:
+                dtype, shape = np.dtype(self.dtypes[name]), (self.frames, self.n_patients)
+            if self.frames == 0:
+                self._maps[name] = np.empty(shape, dtype=dtype)
+            else:
+                self._maps[name] = np.memmap(os.path.join(self.directory, name + '.bin'), dtype=dtype, mode='r',
+                                             shape=shape)
+        return self._maps[name]
+
+    def __getattr__(self, name):
+        if name == 'step' or name in self.__dict__.get('dtypes', {}):
+            return self.field(name)
+        raise AttributeError(name)
+
+    def frame(self, index):
+        # 第 index 帧中仍在疏散的病人坐标
+        active = self.field('active')[index]
+        return self.field('x')[index][active], self.field('y')[index][active]
+
+    def frame_of_step(self, step):
+        # 不晚于 step 的最后一帧
+        return max(int(np.searchsorted(self.field('step'), step, side='right')) - 1, 0)
@@ -0,0 +1,164 @@
+import numpy as np
+
+# 区域类型
+KIND_WALL = 0
+KIND_ROOM = 1
+KIND_OFFICE = 2
+KIND_CORRIDOR = 3
+KIND_STAIR = 4
+KIND_NAMES = ('wall', 'room', 'office', 'corridor', 'staircase')
+
+OUTSIDE = -1  # 不在任何区域内
+BOUNDARY = -2  # 栅格中跨区域边界的格子，需要逐个矩形精确判断
+TOLERANCE = 1e-6  # 以格子边长为单位的容差，浮点误差不会让边界附近的点落进“完全覆盖”的格子
+
+
+# 区域标号栅格：把平面划分为固定网格，每个格子预先记录它完全落在哪个区域（墙壁、房间、办公室、走廊、楼梯间）中，
+# 一批坐标只需一次整数下标查表即可得到所在区域。跨越区域边界的格子登记了与它相交的矩形，
+# 落在这些格子中的点再逐个矩形精确比较，结果与按顺序检查矩形（边界算在内，取第一个包含点的矩形）完全一致
+class RegionMap:
+    def __init__(self, bounds, kinds, owners=None, cell_size=0.25):
+        # bounds 为 (n, 4) 的 (x0, y0, x1, y1) 矩形，排在前面的区域优先；
+        # kinds 为每个区域的类型，owners 为区域在所属类型中的编号（房间号、楼梯间号等）
+        self.bounds = np.asarray(bounds, dtype=float).reshape(-1, 4)
+        count = self.bounds.shape[0]
+        self.kinds = np.asarray(kinds, dtype=np.int8).reshape(count)
+        self.owners = np.full(count, -1, dtype=np.intp) if owners is None else np.asarray(owners, dtype=np.intp)
+        self.cell_size = float(cell_size)
+        if count:
+            # 四周留一格，所有矩形以外的格子都是 OUTSIDE
+            x0, y0 = self.bounds[:, 0].min() - cell_size, self.bounds[:, 1].min() - cell_size
+            x1, y1 = self.bounds[:, 2].max() + cell_size, self.bounds[:, 3].max() + cell_size
+        else:
+            x0 = y0 = x1 = y1 = 0.0
+        self.origin = np.array([x0, y0])
+        self.shape = (max(int(np.ceil((y1 - y0) / cell_size)), 1), max(int(np.ceil((x1 - x0) / cell_size)), 1))
+        self._build()
+        for array in (self.bounds, self.kinds, self.owners, self.origin, self.labels, self.cell_start,
+                      self.cell_end, self.cell_items):
+            array.setflags(write=False)
+
+    @classmethod
+    def from_layout(cls, layout, cell_size=0.25):
+        # 由编译后的布局建立：墙壁、楼梯间、房间、办公室内部空间和走廊。
+        # 房间和办公室的编号与 bed_space 一致（房间在前、办公室在后）；
+        # 楼梯间的编号与 exit_stair_points 一致，不作为出口的楼梯间为 -1
+        wall_thickness = float(layout.wall_thickness)
+
+        def interiors(table):
+            return np.column_stack([table[:, 0] + wall_thickness, table[:, 1] + wall_thickness,
+                                    table[:, 0] + wall_thickness + table[:, 2],
+                                    table[:, 1] + wall_thickness + table[:, 3]]).reshape(-1, 4)
+
+        n_rooms = layout.rooms.shape[0]
+        stair_owners = np.where(layout.stair_exit, np.cumsum(layout.stair_exit) - 1, -1)
+        groups = [
+            (layout.walls, KIND_WALL, np.full(layout.walls.shape[0], -1)),
+            (interiors(layout.staircases), KIND_STAIR, stair_owners),
+            (interiors(layout.rooms), KIND_ROOM, np.arange(n_rooms)),
+            (interiors(layout.offices), KIND_OFFICE, n_rooms + np.arange(layout.offices.shape[0])),
+            (layout.corridors, KIND_CORRIDOR, np.arange(layout.corridors.shape[0])),
+        ]
+        bounds = np.vstack([np.asarray(rects, dtype=float).reshape(-1, 4) for rects, _, _ in groups])
+        kinds = np.concatenate([np.full(len(owners), kind) for _, kind, owners in groups])
+        owners = np.concatenate([owners for _, _, owners in groups])
+        return cls(bounds, kinds, owners, cell_size)
+
+    def __len__(self):
+        return self.bounds.shape[0]
+
+    @property
+    def areas(self):
+        return (self.bounds[:, 2] - self.bounds[:, 0]) * (self.bounds[:, 3] - self.bounds[:, 1])
+
+    def _cell_ranges(self):
+        # 每个矩形接触的格子范围和完全覆盖的格子范围（行、列的 [起点, 终点)），以格子为单位
+        rows, cols = self.shape
+        g = (self.bounds - np.tile(self.origin, 2)) / self.cell_size
+        touch_start = np.ceil(g[:, :2] - TOLERANCE).astype(np.intp) - 1
+        touch_end = np.floor(g[:, 2:] + TOLERANCE).astype(np.intp) + 1
+        cover_start = np.ceil(g[:, :2] + TOLERANCE).astype(np.intp)
+        cover_end = np.floor(g[:, 2:] - TOLERANCE).astype(np.intp)
+        limit = np.array([cols, rows])
+        clip = lambda values: np.clip(values, 0, limit)
+        return clip(touch_start), clip(touch_end), clip(cover_start), clip(cover_end)
+
+    def _build(self):
+        count = len(self)
+        rows, cols = self.shape
+        touch_start, touch_end, cover_start, cover_end = self._cell_ranges()
+        # 从后往前写入，最终每个格子保留编号最小（优先级最高）的接触区域和覆盖区域
+        first = np.full(self.shape, count, dtype=np.int64)
+        covered = np.full(self.shape, count, dtype=np.int64)
+        for index in range(count - 1, -1, -1):
+            (tx0, ty0), (tx1, ty1) = touch_start[index], touch_end[index]
+            (cx0, cy0), (cx1, cy1) = cover_start[index], cover_end[index]
+            first[ty0:ty1, tx0:tx1] = index
+            covered[cy0:cy1, cx0:cx1] = index
+        # 最先接触格子的区域如果完全覆盖了格子，格子中每个点都属于它；否则格子跨越边界
+        labels = np.where(first == count, OUTSIDE, np.where(covered == first, first, BOUNDARY))
+
+        # 边界格子按出现顺序编号为 0, 1, ...，标号写成 BOUNDARY - 编号，查表时直接得到候选矩形的区间
+        flat = labels.ravel()
+        boundary_cells = np.flatnonzero(flat == BOUNDARY)
+        flat[boundary_cells] = BOUNDARY - np.arange(boundary_cells.size)
+        cell_rows, cell_items = [], []
+        for index in range(count):
+            (tx0, ty0), (tx1, ty1) = touch_start[index], touch_end[index]
+            block = labels[ty0:ty1, tx0:tx1]
+            hit = block <= BOUNDARY
+            if np.any(hit):
+                cell_rows.append(BOUNDARY - block[hit])
+                cell_items.append(np.full(np.count_nonzero(hit), index, dtype=np.intp))
+        cell_rows = np.concatenate(cell_rows) if cell_rows else np.empty(0, dtype=np.intp)
+        cell_items = np.concatenate(cell_items) if cell_items else np.empty(0, dtype=np.intp)
+        # 稳定排序后每个边界格子内的候选矩形按编号升序排列
+        order = np.argsort(cell_rows, kind='stable')
+        self.cell_items = cell_items[order]
+        counts = np.bincount(cell_rows, minlength=boundary_cells.size)
+        self.cell_end = np.cumsum(counts).astype(np.intp)
+        self.cell_start = (self.cell_end - counts).astype(np.intp)
+        self.labels = labels.astype(np.int32)
+
+    def locate(self, x, y):
+        # 每个点所在的区域编号，不在任何区域内为 -1
+        x = np.atleast_1d(np.asarray(x, dtype=float))
+        y = np.atleast_1d(np.asarray(y, dtype=float))
+        j = np.floor((x - self.origin[0]) / self.cell_size).astype(np.intp)
+        i = np.floor((y - self.origin[1]) / self.cell_size).astype(np.intp)
+        inside = (i >= 0) & (i < self.shape[0]) & (j >= 0) & (j < self.shape[1])
+        result = np.full(x.size, OUTSIDE, dtype=np.intp)
+        result[inside] = self.labels[i[inside], j[inside]]
+        boundary = np.flatnonzero(result <= BOUNDARY)
+        if boundary.size:
+            result[boundary] = self._exact(x[boundary], y[boundary], BOUNDARY - result[boundary])
+        return result
+
+    def _exact(self, x, y, cells):
+        # 边界格子中的点与格子登记的矩形逐个比较，取编号最小的包含点的矩形
+        start = self.cell_start[cells]
+        counts = self.cell_end[cells] - start
+        points = np.repeat(np.arange(x.size), counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        items = self.cell_items[np.repeat(start, counts) + offsets]
+        b = self.bounds[items]
+        px, py = x[points], y[points]
+        hit = (b[:, 0] <= px) & (px <= b[:, 2]) & (b[:, 1] <= py) & (py <= b[:, 3])
+        # 每个点的候选按编号升序排列，第一个命中的即为结果
+        hit_points, first = np.unique(points[hit], return_index=True)
+        result = np.full(x.size, OUTSIDE, dtype=np.intp)
+        result[hit_points] = items[hit][first]
+        return result
+
+    def classify(self, x, y):
+        # 每个点所在区域的 (类型, 编号)，不在任何区域内均为 -1
+        return self.describe(self.locate(x, y))
+
+    def describe(self, regions):
+        # 区域编号 -> (类型, 编号)
+        regions = np.asarray(regions)
+        if len(self) == 0:
+            return np.full(regions.shape, -1, dtype=np.int8), np.full(regions.shape, -1, dtype=np.intp)
+        known = regions >= 0
+        safe = np.where(known, regions, 0)
+        return np.where(known, self.kinds[safe], -1), np.where(known, self.owners[safe], -1)
@@ -0,0 +1,120 @@
+import time
+
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.collections import PatchCollection
+
+
+def _collection(bounds, facecolor, edgecolor, linewidth, zorder):
+    # 把一组 (x0, y0, x1, y1) 矩形合并成一个 PatchCollection
+    bounds = np.asarray(bounds, dtype=float).reshape(-1, 4)
+    patches = [plt.Rectangle((x0, y0), x1 - x0, y1 - y0) for x0, y0, x1, y1 in bounds]
+    return PatchCollection(patches, facecolor=facecolor, edgecolor=edgecolor, linewidth=linewidth, zorder=zorder)
+
+
+# 保留模式的平面图绘制：墙壁、门、房间内部和病床只在创建时画一次，
+# 每一帧只更新病人散点的位置（配合 blit 只重绘这一个对象）
+class FloorPlanRenderer:
+    def __init__(self, ax, walls, doors, interiors=(), beds=(), marker_size=1):
+        self.ax = ax
+        self.static = [
+            ax.add_collection(_collection(interiors, 'lightblue', 'lightblue', 1, 1)),
+            ax.add_collection(_collection(walls, 'black', 'black', 2, 2)),
+            ax.add_collection(_collection(doors, 'brown', 'brown', 2, 2)),
+            ax.add_collection(_collection(beds, 'brown', 'black', 1, 3)),
+        ]
+        self.patients = ax.scatter([], [], s=marker_size ** 2, c='red', marker='o', zorder=4, animated=True)
+        ax.set_aspect('equal', adjustable='box')
+        ax.autoscale_view()
+
+    def init(self):
+        # FuncAnimation 的 init_func：返回需要逐帧重绘的对象
+        self.patients.set_offsets(np.empty((0, 2)))
+        return (self.patients,)
+
+    def update(self, x, y):
+        self.patients.set_offsets(np.column_stack([x, y]))
+        return (self.patients,)
+
+
+# 每帧新建的绘图对象计数：比较前后两帧 Axes 上的对象，统计新出现的数量。
+# 设置 budget 后超出预算会直接报错，避免“每个房间都重画一遍”这类问题悄悄回归
+class FrameCost:
+    def __init__(self, ax, budget=None):
+        self.ax = ax
+        self.budget = budget
+        self.per_frame = []
+        self._previous = self._artists()
+
+    def _artists(self):
+        # 只统计添加到 Axes 上的数据对象，不包括 cla() 时重建的坐标轴、标题等
+        ax = self.ax
+        return [artist for group in (ax.patches, ax.lines, ax.collections, ax.images, ax.texts) for artist in group]
+
+    def record(self):
+        # 上一帧的对象在比较完之前一直被引用，因此新对象不会复用它们的 id
+        current = self._artists()
+        seen = {id(artist) for artist in self._previous}
+        created = sum(1 for artist in current if id(artist) not in seen)
+        self._previous = current
+        self.per_frame.append(created)
+        if self.budget is not None and created > self.budget:
+            raise RuntimeError("frame %d created %d artists, budget is %d"
+                               % (len(self.per_frame) - 1, created, self.budget))
+        return created
+
+    @property
+    def last(self):
+        return self.per_frame[-1] if self.per_frame else 0
+
+    @property
+    def max(self):
+        return max(self.per_frame) if self.per_frame else 0
+
+
+# 固定步长的物理推进与绘图解耦：引擎每步推进固定的 engine.dt 秒，绘图按自己的帧率取样。
+# 每一帧把经过的时间（乘以 time_scale）累计为应当推进的物理时间，推进其中整数个 dt（K 个子步），余数留到下一帧；
+# 绘图跟不上时下一帧自动多推进几步，中间的状态不再画出（跳帧）。每帧最多 max_substeps 步，
+# 超出的积压直接丢弃（记入 dropped），此时模拟慢于设定的倍速，但不会越积越多。
+# realtime=False 时不看时钟，每帧固定推进 frame_interval * time_scale 秒，画面与运行快慢无关
+class FixedStepDriver:
+    def __init__(self, engine, frame_interval=0.05, time_scale=1.0, max_substeps=None, realtime=True,
+                 clock=time.perf_counter):
+        self.engine = engine
+        self.frame_interval = frame_interval  # 期望的帧间隔（秒）
+        self.time_scale = time_scale  # 每秒真实时间对应的模拟时间（秒）
+        self.max_substeps = max_substeps
+        self.realtime = realtime
+        self.clock = clock
+        self.accumulator = 0.0  # 尚未推进的模拟时间（秒）
+        self.dropped = 0.0  # 因超过 max_substeps 而丢弃的模拟时间（秒）
+        self.substeps = []  # 每帧推进的步数
+        self._last = None
+
+    def advance(self):
+        # 在每帧绘图之前调用，返回本帧推进的步数
+        engine = self.engine
+        now = self.clock()
+        if self.realtime and self._last is not None:
+            elapsed = now - self._last
+        else:
+            elapsed = self.frame_interval
+        self._last = now
+        self.accumulator += elapsed * self.time_scale
+        # 加一个很小的容差，避免 0.1 / 0.05 这类浮点误差少走一步
+        due = int(self.accumulator / engine.dt + 1e-9)
+        if self.max_substeps is not None and due > self.max_substeps:
+            self.dropped += (due - self.max_substeps) * engine.dt
+            self.accumulator -= (due - self.max_substeps) * engine.dt
+            due = self.max_substeps
+        steps = 0
+        while steps < due and not engine.all_evacuated():
+            engine.step()
+            steps += 1
+        self.accumulator = max(self.accumulator - due * engine.dt, 0.0)
+        self.substeps.append(steps)
+        return steps
+
+    @property
+    def time(self):
+        return self.engine.time
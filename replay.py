@@ -0,0 +1,148 @@
+import os
+import sys
+
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.widgets import Slider, TextBox
+
+from layout import load_layout
+from recorder import Trajectory
+from renderer import FloorPlanRenderer
+
+# 记录中没有布局路径时使用的布局（与 simulation.py 相同的病区）
+DEFAULT_LAYOUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'layouts', 'ward.json')
+
+
+# 回放记录的轨迹：平面图由 FloorPlanRenderer 只画一次，每帧只从 memmap 读取这一帧的坐标并 blit 病人散点。
+# 时间滑块和“跳到第几步”输入框可以任意定位；播放时按 speed（步/秒）前进，
+# 速度超过帧率时跳过中间的帧（抽帧），而不是把每一帧都画出来
+class ReplayViewer:
+    def __init__(self, trajectory, layout, fps=25, speed=None, marker_size=3):
+        self.trajectory = trajectory
+        self.steps = np.asarray(trajectory.step)
+        self.fps = fps
+        # 默认每个画面前进一帧记录
+        self.speed = speed if speed is not None else fps * trajectory.every
+        self.frame = 0
+        self.playing = False
+
+        self.fig = plt.figure(figsize=(12, 4))
+        self.ax = self.fig.add_axes([0.04, 0.25, 0.92, 0.68])
+        self.renderer = FloorPlanRenderer(self.ax, layout.walls, layout.doors, layout.interiors, layout.bed_bounds,
+                                          marker_size)
+        self.label = self.ax.text(0.01, 0.98, '', transform=self.ax.transAxes, va='top', animated=True)
+        last = int(self.steps[-1]) if self.steps.size else 0
+        self.slider = Slider(self.fig.add_axes([0.08, 0.1, 0.6, 0.04]), 'step', 0, max(last, 1),
+                             valinit=0, valstep=self.steps if self.steps.size else None, valfmt='%d')
+        self.slider.drawon = False
+        self.slider.on_changed(self._on_slider)
+        # 滑块上随帧变化的部分与病人散点一样逐帧 blit，不重画整张图
+        self.animated = [self.renderer.patients, self.label, self.slider.poly, self.slider.valtext]
+        if hasattr(self.slider, '_handle'):
+            self.animated.append(self.slider._handle)
+        for artist in self.animated:
+            artist.set_animated(True)
+        self.jump = TextBox(self.fig.add_axes([0.8, 0.1, 0.12, 0.05]), 'go to step ')
+        self.jump.on_submit(self._on_jump)
+
+        self.background = None
+        self.fig.canvas.mpl_connect('draw_event', self._on_draw)
+        self.fig.canvas.mpl_connect('key_press_event', self._on_key)
+        self.timer = self.fig.canvas.new_timer(interval=max(int(1000 / fps), 1))
+        self.timer.add_callback(self._tick)
+        self.show_frame(0)
+
+    @property
+    def stride(self):
+        # 每个画面前进的记录帧数
+        return max(int(round(self.speed / self.fps / self.trajectory.every)), 1)
+
+    def _on_draw(self, event):
+        # 整张图重绘后（首次显示、缩放窗口等）保存不含逐帧对象的背景，再画上当前帧
+        if self.fig.canvas.supports_blit:
+            self.background = self.fig.canvas.copy_from_bbox(self.fig.bbox)
+        for artist in self.animated:
+            self.fig.draw_artist(artist)
+
+    def show_frame(self, index):
+        if len(self.trajectory) == 0:
+            return
+        self.frame = int(np.clip(index, 0, len(self.trajectory) - 1))
+        x, y = self.trajectory.frame(self.frame)
+        self.renderer.update(x, y)
+        step = int(self.steps[self.frame])
+        self.label.set_text('step %d   remaining %d' % (step, x.size))
+        eventson, self.slider.eventson = self.slider.eventson, False
+        self.slider.set_val(step)
+        self.slider.eventson = eventson
+        self._blit()
+
+    def _blit(self):
+        canvas = self.fig.canvas
+        if self.background is None:
+            canvas.draw_idle()
+            return
+        canvas.restore_region(self.background)
+        for artist in self.animated:
+            self.fig.draw_artist(artist)
+        canvas.blit(self.fig.bbox)
+
+    def seek_step(self, step):
+        self.show_frame(self.trajectory.frame_of_step(step))
+
+    def play(self):
+        self.playing = True
+        self.timer.start()
+
+    def pause(self):
+        self.playing = False
+        self.timer.stop()
+
+    def _tick(self):
+        if self.frame >= len(self.trajectory) - 1:
+            self.pause()
+            return
+        self.show_frame(self.frame + self.stride)
+
+    def _on_slider(self, value):
+        self.seek_step(value)
+
+    def _on_jump(self, text):
+        try:
+            self.seek_step(int(float(text)))
+        except ValueError:
+            pass
+
+    def _on_key(self, event):
+        # 空格 播放/暂停，左右方向键 后退/前进，+/- 加快/减慢，Home/End 跳到开头/结尾
+        if event.key == ' ':
+            self.pause() if self.playing else self.play()
+        elif event.key == 'right':
+            self.show_frame(self.frame + self.stride)
+        elif event.key == 'left':
+            self.show_frame(self.frame - self.stride)
+        elif event.key in ('+', '='):
+            self.speed *= 2
+        elif event.key == '-':
+            self.speed = max(self.speed / 2, 1)
+        elif event.key == 'home':
+            self.show_frame(0)
+        elif event.key == 'end':
+            self.show_frame(len(self.trajectory) - 1)
+
+
+def open_replay(directory, layout_path=None, **kwargs):
+    trajectory = Trajectory(directory)
+    layout_path = layout_path or trajectory.metadata.get('layout') or DEFAULT_LAYOUT
+    return ReplayViewer(trajectory, load_layout(layout_path), **kwargs)
+
+
+if __name__ == "__main__":
+    # 用法：python replay.py 记录目录 [布局文件] [起始步数]
+    args = sys.argv[1:]
+    if not args:
+        sys.exit("usage: python replay.py RECORDING [LAYOUT] [STEP]")
+    viewer = open_replay(args[0], args[1] if len(args) > 1 else None)
+    if len(args) > 2:
+        viewer.seek_step(int(args[2]))
+    plt.show()
@@ -0,0 +1,133 @@
+import os
+import sys
+import time
+
+import numpy as np
+
+
+# 一次无界面运行的结果
+class RunResult:
+    def __init__(self, steps, evacuated, exit_step, step_ns, dt=None, legacy_speeds=False):
+        self.steps = steps  # 实际推进的步数
+        self.dt = dt  # 每步的物理时间（秒），未知时为 None
+        self.legacy_speeds = legacy_speeds  # 速度按原脚本每帧的距离换算时，时间不是真实的疏散时间
+        self.evacuated = evacuated  # 是否全部疏散
+        self.exit_step = exit_step  # 每个病人到达楼梯间的步数，未疏散为 -1
+        self.step_ns = step_ns  # 每一步的耗时（纳秒）
+
+    @property
+    def evacuation_step(self):
+        # 全部病人疏散完毕所用的步数，未全部疏散时为 None
+        if not self.evacuated:
+            return None
+        return int(self.exit_step.max()) if self.exit_step.size else 0
+
+    @property
+    def evacuation_time(self):
+        # 全部病人疏散完毕所用的物理时间（秒）
+        step = self.evacuation_step
+        if step is None or self.dt is None:
+            return None
+        return step * self.dt
+
+    def summary(self):
+        step_ms = self.step_ns / 1e6
+        lines = [
+            "patients:        %d" % self.exit_step.size,
+            "steps:           %d" % self.steps,
+            "evacuated:       %s" % self.evacuated,
+            "evacuation step: %s" % self.evacuation_step,
+        ]
+        if self.evacuation_time is not None:
+            note = "; legacy per-frame speeds of 2-6 m/s, not a realistic walking time" if self.legacy_speeds else ""
+            lines.append("evacuation time: %.2f s (dt %g s%s)" % (self.evacuation_time, self.dt, note))
+        if step_ms.size:
+            lines.append("step time (ms):  mean %.3f  p95 %.3f  max %.3f"
+                         % (step_ms.mean(), np.percentile(step_ms, 95), step_ms.max()))
+            lines.append("steps/sec:       %.1f" % (step_ms.size / (step_ms.sum() / 1e3)))
+        return "\n".join(lines)
+
+
+# 不经过 FuncAnimation，直接在循环中推进引擎，直到全部疏散或达到步数上限
+# recorder（recorder.TrajectoryRecorder）可选，记录初始状态和之后每一步的状态，不计入每步耗时；
+# time_limit（秒）可选，超过后提前停止
+def run(engine, max_steps=100000, recorder=None, time_limit=None):
+    step_ns = np.zeros(max_steps, dtype=np.int64)
+    clock = time.perf_counter_ns
+    deadline = None if time_limit is None else clock() + int(time_limit * 1e9)
+    steps = 0
+    evacuated = engine.all_evacuated()
+    if recorder is not None:
+        recorder.record(engine)
+    while not evacuated and steps < max_steps:
+        start = clock()
+        engine.step()
+        step_ns[steps] = clock() - start
+        steps += 1
+        evacuated = engine.all_evacuated()
+        if recorder is not None:
+            recorder.record(engine)
+        if deadline is not None and clock() > deadline:
+            break
+    if recorder is not None:
+        recorder.flush()
+    return RunResult(steps, evacuated, engine.exit_step.copy(), step_ns[:steps], engine.dt, engine.legacy_speeds)
+
+
+if __name__ == "__main__":
+    # 用法：python runner.py [布局文件.json/.xlsx] [最大步数] [--record 目录] [--metrics 指标.npz] [--profile] [--stair-exits] [--legacy-speeds] [--dt 秒]
+    # --stair-exits：病人进入楼梯间门后还要走到楼梯间中心才算疏散完成（只对布局文件有效）
+    # --legacy-speeds：使用原脚本每帧距离换算的速度（2~6 m/s），步数与原脚本一致（只对布局文件有效）
+    # 不给布局文件时运行 simulation.py 中的病区
+    args = sys.argv[1:]
+    options = {}
+    profile = '--profile' in args
+    if profile:
+        args.remove('--profile')
+    stair_exits = '--stair-exits' in args
+    if stair_exits:
+        args.remove('--stair-exits')
+    legacy_speeds = '--legacy-speeds' in args
+    if legacy_speeds:
+        args.remove('--legacy-speeds')
+    for option in ('--record', '--metrics', '--dt'):
+        if option in args:
+            position = args.index(option)
+            options[option] = args[position + 1]
+            del args[position:position + 2]
+    record_dir = options.get('--record')
+    metadata = {}
+    if args and not args[0].isdigit():
+        from engine import PatientEngine
+        from layout import load_layout
+        layout_path = args.pop(0)
+        metadata['layout'] = os.path.abspath(layout_path)
+        engine = PatientEngine.from_layout(load_layout(layout_path), stair_exits=stair_exits or None,
+                                           legacy_speeds=legacy_speeds)
+    else:
+        # 在服务器上运行时不需要显示器
+        import matplotlib
+        matplotlib.use('Agg')
+        import simulation
+        engine = simulation.engine
+    if '--dt' in options:
+        # 每步的物理时间；速度以 m/s 为单位，改变 dt 只改变时间离散的精度
+        engine.dt = float(options['--dt'])
+    max_steps = int(args[0]) if args else 100000
+    recorder = None
+    if record_dir is not None:
+        from recorder import TrajectoryRecorder
+        recorder = TrajectoryRecorder.for_engine(engine, record_dir, metadata=metadata)
+    metrics = None
+    if '--metrics' in options:
+        from metrics import EvacuationMetrics
+        metrics = EvacuationMetrics.attach(engine)
+    if profile:
+        from profiling import PhaseProfiler
+        engine.profiler = PhaseProfiler()
+    print(run(engine, max_steps, recorder).summary())
+    if profile:
+        print(engine.profiler.report())
+    if metrics is not None:
+        metrics.save(options['--metrics'])
+        print(metrics.summary())
@@ -0,0 +1,76 @@
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# 每个数组在共享内存块中的起始位置按 64 字节对齐
+ALIGN = 64
+
+
+# 把一组命名数组拷贝进一块共享内存。manifest 只包含块名和各数组的 dtype/shape/偏移，
+# 传给 worker 进程的开销与数组大小无关；worker 用 attach 映射同一块内存，得到只读视图
+class SharedArrays:
+    def __init__(self, arrays):
+        entries = {}
+        offset = 0
+        for name, array in arrays.items():
+            array = np.asarray(array)
+            if array.dtype.hasobject:
+                raise TypeError("array %r has dtype object and cannot be shared" % name)
+            offset = -(-offset // ALIGN) * ALIGN
+            entries[name] = (array.dtype.str, array.shape, offset)
+            offset += array.nbytes
+        self.shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        for name, array in arrays.items():
+            dtype, shape, start = entries[name]
+            view = np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=start)
+            view[...] = array
+            del view
+        self.manifest = {'name': self.shm.name, 'arrays': entries}
+
+    @property
+    def nbytes(self):
+        return self.shm.size
+
+    def close(self):
+        # 由创建者负责释放共享内存
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _open(name):
+    # 只映射不登记：共享内存由创建者释放。Python 3.13 之前没有 track 参数，
+    # 但由 multiprocessing 启动的 worker 与创建者共用同一个资源跟踪器，重复登记不会导致提前删除
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+def attach(manifest):
+    # 按 manifest 映射共享内存，返回 (SharedMemory, {名称: 只读数组})；使用数组期间必须保留 SharedMemory 的引用
+    shm = _open(manifest['name'])
+    arrays = {}
+    for name, (dtype, shape, offset) in manifest['arrays'].items():
+        array = np.ndarray(tuple(shape), dtype=dtype, buffer=shm.buf, offset=offset)
+        array.setflags(write=False)
+        arrays[name] = array
+    return shm, arrays
+
+
+def pack(groups):
+    # {'layout': {...}, 'obstacles': {...}} -> {'layout/walls': ..., 'obstacles/bounds': ...}
+    return {'%s/%s' % (group, name): array for group, arrays in groups.items() for name, array in arrays.items()}
+
+
+def unpack(arrays):
+    groups = {}
+    for key, array in arrays.items():
+        group, name = key.split('/', 1)
+        groups.setdefault(group, {})[name] = array
+    return groups
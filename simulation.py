@@ -1,7 +1,13 @@
+import os
 import numpy as np
 import random
 import matplotlib.pyplot as plt
 import matplotlib.animation as animation
+from engine import PatientEngine
+from geometry import bed_bounds, door_bounds, interior_bounds, layout_walls
+from navigation import NavigationField
+from profiling import PhaseProfiler
+from renderer import FixedStepDriver, FloorPlanRenderer, FrameCost
 
 # 病床类
 class Bed:
@@ -30,19 +36,12 @@ class Bed:
         return False  # 没有碰撞
 
 
-# 病人类
+# 病人类：只记录初始位置和速度（每帧移动的距离），逐步推进和路径选择都由 engine.PatientEngine 完成
 class Patient:
-    def distance_to_staircase(self, staircase):
-        return np.sqrt((self.x - staircase.door_x) ** 2 + (self.y - staircase.door_y) ** 2)
-
     def __init__(self, bed, bed_index):
         self.x = bed.x + bed.width / 2
         self.y = bed.y + bed.height
-        self.vx = 0
-        self.vy = 0
         self.bed = bed
-        self.target_dx = 0
-        self.target_dy = 0
         if bed_index <= 2:
             self.speed = 0.1
         elif 3 <= bed_index < 5:
@@ -50,78 +49,6 @@ class Patient:
         else:
             self.speed = 0.3
 
-    def update_position(self):
-        room = self.bed.bedroom
-        if room is not None:
-            # 先判断是否已经在房间门口附近，如果不在则朝着房间门口移动
-            door_center_x = room.door_x+0.6
-            door_center_y = room.door_y+1
-            distance_to_door = np.sqrt((self.x - door_center_x) ** 2 + (self.y - door_center_y) ** 2)
-            if distance_to_door > 0.5:
-                direction_x = door_center_x - self.x
-                direction_y = door_center_y - self.y
-                self.vx = direction_x / distance_to_door * self.speed
-                self.vy = direction_y / distance_to_door * self.speed
-                # 避开病床
-                for bed in room.beds:
-                    bed_center_x = bed.x + bed.width / 2
-                    bed_center_y = bed.y + bed.height / 2
-                    distance_to_bed = np.sqrt((self.x - bed_center_x) ** 2 + (self.y - bed_center_y) ** 2)
-                    if distance_to_bed < 1.5:
-                        avoid_x = self.x - bed_center_x
-                        avoid_y = self.y - bed_center_y
-                        avoidance_distance = np.sqrt(avoid_x ** 2 + avoid_y ** 2)
-                        if avoidance_distance > 0:
-                            self.vx += (avoid_x / avoidance_distance) * self.speed
-                            self.vy += (avoid_y / avoidance_distance) * self.speed
-            else:
-                # 到达房间门口后，考虑与其他病人的间距避让
-                other_patients = [p for p in room.patients if p!= self]
-                for other_patient in other_patients:
-                    distance_to_other = np.sqrt((self.x - other_patient.x) ** 2 + (self.y - other_patient.y) ** 2)
-                    if distance_to_other < 1.0:
-                        avoid_x = self.x - other_patient.x
-                        avoid_y = self.y - other_patient.y
-                        avoidance_distance = np.sqrt(avoid_x ** 2 + avoid_y ** 2)
-                        if avoidance_distance > 0:
-                            self.vx += (avoid_x / avoidance_distance) * 0.1
-                            self.vy += (avoid_y / avoidance_distance) * 0.1
-
-                # 寻找距离病人最近的楼梯间并朝着其移动
-                closest_staircase = self.find_closest_staircase()
-                direction_x = closest_staircase.door_x - self.x
-                direction_y = closest_staircase.door_y - self.y
-                distance_to_stair_door = np.sqrt(direction_x ** 2 + direction_y ** 2)
-
-                if distance_to_stair_door > 0:
-                    self.vx = direction_x / distance_to_stair_door * self.speed
-                    self.vy = direction_y / distance_to_stair_door * self.speed
-
-
-
-                # 判断是否到达最近的楼梯间门口
-                if distance_to_stair_door <= self.speed:
-                    room.patients.remove(self)
-
-            # 更新病人位置
-            self.x += self.vx
-            self.y += self.vy
-        else:
-            print("Error: Patient's bed is not associated with a room!")
-
-    def find_closest_staircase(self):
-        # 考虑当前所在房间门口位置，筛选出合理的可到达的楼梯间
-        accessible_staircases = []
-        for staircase in staircases_one:
-
-            is_accessible = True
-            accessible_staircases.append(staircase)
-
-        if accessible_staircases:
-            return min(accessible_staircases, key=lambda s: self.distance_to_staircase(s))
-        else:
-            return None
-
 class Staircase:
     def __init__(self, x, y, width, height,door_x, door_y, door_width):
         self.x = x
@@ -318,187 +245,67 @@ room22.initialize_patients()
 rooms_one= [room1, room2,room6,room7,room12,room22]
 rooms_two= [room3,room4,room5,room8,room9,room10,room13,room14,room15,room18,room19,room20]
 rooms_three=[room11,room16,room17,room21]
+rooms=[room1,room2,room3,room4,room5,room6,room7,room8,room9,room10,room11,room12,room13,room14,room15,room16,room17,room18,room19,room20,room21,room22]
+# 各组建筑的门所在的边和位置，与 draw() 中的画法一致
+wall_groups=[(staircases_one,'top','left'),(staircases_two,'top','right'),(staircases_three,'bottom','right'),(staircases_four,'bottom','left'),
+             (office_one,'top','center'),(office_two,'bottom','center'),(office_three,'bottom','right'),
+             (rooms_one,'top','right'),(rooms_two,'top','center'),(rooms_three,'top','left')]
+# 走廊两端的墙
+corridor_end_walls=[(0, 6.24, 0.37, 2.25),(140.36, 6.24, 0.37, 2.25)]
+walls, doors = layout_walls(wall_groups, corridor_end_walls)
+# 导航距离场只在布局确定后计算一次，病人沿着绕开墙壁的最短路径走向楼梯间
+navigation = NavigationField(walls, door_bounds(staircases_one, 'top', 'left'))
+# 所有病人的状态交给批量引擎统一推进
+engine = PatientEngine.from_rooms(rooms, staircases_one, walls, navigation=navigation)
+# 设置环境变量 SIMULATION_PROFILE=1 时分别统计引擎每步各阶段的耗时和每帧动画各部分的耗时，结束后打印报告
+engine.profiler = PhaseProfiler() if os.environ.get('SIMULATION_PROFILE') else None
+profiler = PhaseProfiler() if engine.profiler is not None else None
+# 动画的帧间隔（毫秒）；SIMULATION_TIME_SCALE 为每秒真实时间对应的模拟时间，例如 4 表示四倍速
+FRAME_INTERVAL = 50
+TIME_SCALE = float(os.environ.get('SIMULATION_TIME_SCALE', 1.0))
+# 一帧最多追赶的真实时间（秒），窗口被拖动等长时间停顿后不会一次推进太多步
+MAX_LAG = 0.25
+# 物理按固定步长 engine.dt 推进，每帧推进的步数由经过的时间决定，绘图慢时自动跳帧
+driver = FixedStepDriver(engine, FRAME_INTERVAL / 1000.0, TIME_SCALE,
+                         max_substeps=max(int(np.ceil(MAX_LAG * TIME_SCALE / engine.dt)), 1))
 # 更新病人位置
 def update_patients():
-    all_patients = room1.patients + room2.patients+ room3.patients + room4.patients + room5.patients + room6.patients + room7.patients + room8.patients + room9.patients + room10.patients + room11.patients +room12.patients+ room13.patients + room14.patients + room15.patients + room16.patients + room17.patients + room18.patients + room19.patients + room20.patients + room21.patients+ room22.patients
-    all_evacuated = True
-    for patient in all_patients:
-        if patient in room1.patients or patient in room2.patients or patient in room3.patients or patient in room4.patients or patient in room5.patients or patient in room6.patients or patient in room7.patients or patient in room8.patients or patient in room9.patients or patient in room10.patients or patient in room11.patients or  patient in room12.patients or patient in room13.patients or patient in room14.patients or patient in room15.patients or patient in room16.patients or patient in room17.patients or patient in room18.patients or patient in room19.patients or patient in room20.patients or patient in room21.patients or patient in room22.patients:
-            all_evacuated = False
-            patient.update_position()
-    return all_evacuated
+    driver.advance()
+    return engine.all_evacuated()
 
 
 # 创建图形窗口
 fig, ax = plt.subplots()
+# 静态的平面图只绘制一次，之后每帧只更新病人位置
+renderer = FloorPlanRenderer(ax, walls, doors, interior_bounds(rooms), bed_bounds(rooms))
+# 保留模式下每帧不应新建任何绘图对象
+frame_cost = FrameCost(ax, budget=0)
 
 def draw():
-    ax.set_xlim(0, 20)  # 根据实际情况调整合适的坐标轴范围
-    ax.set_ylim(-2, 20)
-    ax.set_aspect('equal', adjustable='box')
-    ax.cla()
-    wall_thickness = 0.37
-    # 绘制楼梯间
-    def draw_rect(ax, x, y, width, height, color, lw, ec, fill=False):
-        rect = plt.Rectangle((x, y), width, height, color=color, lw=lw, ec=ec, fill=fill)
-        ax.add_patch(rect)
-        return rect
-
-    # 绘制楼梯的墙壁（左上）
-    for staircase in staircases_one:
-        # 左侧
-        draw_rect(ax, staircase.x, staircase.y, wall_thickness, staircase.height + wall_thickness * 2, 'black', 2, "black", fill=True)
-        # 右侧
-        draw_rect(ax, staircase.x + staircase.width + wall_thickness, staircase.y, wall_thickness,staircase.height + wall_thickness * 2, 'black', 2, "black", fill=True)
-        # 下侧
-        draw_rect(ax, staircase.x + wall_thickness, staircase.y, staircase.width, wall_thickness, 'black', 2, "black",fill=True)
-        # 上侧
-        draw_rect(ax, staircase.x + wall_thickness + staircase.door_width,staircase.y + staircase.height + wall_thickness, staircase.width - staircase.door_width, wall_thickness, 'black', 2, "black", fill=True)
-        # 楼梯门
-        draw_rect(ax, staircase.x + wall_thickness, staircase.door_y, staircase.door_width, wall_thickness, 'brown', 2,"brown", fill=True)
-    # 绘制楼梯的墙壁（右上）
-    for staircase in staircases_two:
-        # 左侧
-        draw_rect(ax, staircase.x, staircase.y, wall_thickness, staircase.height + wall_thickness * 2, 'black', 2, "black", fill=True)
-         # 右侧
-        draw_rect(ax, staircase.x + staircase.width + wall_thickness, staircase.y, wall_thickness, staircase.height + wall_thickness * 2, 'black', 2, "black", fill=True)
-        # 下侧
-        draw_rect(ax, staircase.x + wall_thickness, staircase.y, staircase.width, wall_thickness, 'black', 2, "black", fill=True)
-        # 上侧
-        draw_rect(ax, staircase.x + wall_thickness ,staircase.y + staircase.height + wall_thickness, staircase.width - staircase.door_width, wall_thickness, 'black', 2, "black", fill=True)
-        # 楼梯门
-        draw_rect(ax, staircase.x + wall_thickness+staircase.width-staircase.door_width, staircase.door_y, staircase.door_width, wall_thickness, 'brown',2, "brown", fill=True)
-    # 绘制楼梯的墙壁（右下）
-    for staircase in staircases_three:
-        # 左侧
-        draw_rect(ax, staircase.x, staircase.y, wall_thickness, staircase.height + wall_thickness * 2, 'black', 2,"black", fill=True)
-        # 右侧
-        draw_rect(ax, staircase.x + staircase.width + wall_thickness, staircase.y, wall_thickness, staircase.height + wall_thickness * 2, 'black', 2, "black", fill=True)
-        # 下侧
-        draw_rect(ax, staircase.x + wall_thickness, staircase.y, staircase.width-staircase.door_width, wall_thickness, 'black', 2, "black", fill=True)
-        # 上侧
-        draw_rect(ax, staircase.x + wall_thickness, staircase.y + staircase.height + wall_thickness, staircase.width , wall_thickness, 'black', 2, "black", fill=True)
-        # 楼梯门
-        draw_rect(ax, staircase.x + wall_thickness + staircase.width - staircase.door_width, staircase.door_y, staircase.door_width, wall_thickness, 'brown', 2, "brown", fill=True)
-    # 绘制楼梯的墙壁（左下）
-    for staircase in staircases_four:
-        # 左侧
-        draw_rect(ax, staircase.x, staircase.y, wall_thickness, staircase.height + wall_thickness * 2, 'black', 2,"black", fill=True)
-        # 右侧
-        draw_rect(ax, staircase.x + staircase.width + wall_thickness, staircase.y, wall_thickness,staircase.height + wall_thickness * 2, 'black', 2, "black", fill=True)
-        # 下侧
-        draw_rect(ax, staircase.x + wall_thickness+staircase.door_width, staircase.y, staircase.width - staircase.door_width,wall_thickness, 'black', 2, "black", fill=True)
-        # 上侧
-        draw_rect(ax, staircase.x + wall_thickness, staircase.y + staircase.height + wall_thickness,staircase.width, wall_thickness, 'black', 2, "black", fill=True)
-        # 楼梯门
-        draw_rect(ax, staircase.x + wall_thickness , staircase.door_y,staircase.door_width, wall_thickness, 'brown', 2, "brown", fill=True)
-    # 绘制办公室的墙壁（上部中间）
-    for office in office_one:
-        # 左侧
-        draw_rect(ax, office.x, office.y, wall_thickness, office.height + wall_thickness * 2, color='black', lw=2,  ec="black", fill=True)
-        # 右侧
-        draw_rect(ax, office.x + office.width + wall_thickness, office.y, wall_thickness, office.height + wall_thickness * 2, color='black', lw=2, ec="black", fill=True)
-        # 下侧
-        draw_rect(ax, office.x + wall_thickness, office.y, office.width, wall_thickness, color='black', lw=2,ec="black", fill=True)
-        # 上侧（左半部分）
-        draw_rect(ax, office.x + wall_thickness, office.y + office.height + wall_thickness,office.width / 2 - office.door_width / 2, wall_thickness, color='black', lw=2, ec="black", fill=True)
-        # 上侧（右半部分）
-        draw_rect(ax, office.x + wall_thickness + office.width / 2 + office.door_width / 2, office.y + office.height + wall_thickness, office.width / 2 - office.door_width / 2, wall_thickness,color='black', lw=2, ec="black", fill=True)
-        # 门
-        draw_rect(ax, office.x + wall_thickness + office.width / 2 - office.door_width / 2, office.door_y, office.door_width, wall_thickness, color='brown', lw=2, ec="brown", fill=True)
-    # 绘制办公室的墙壁（下部中间）
-    for office in office_two:
-        # 左侧
-        draw_rect(ax, office.x, office.y, wall_thickness, office.height + wall_thickness * 2, color='black', lw=2,ec="black", fill=True)
-        # 右侧
-        draw_rect(ax, office.x + office.width + wall_thickness, office.y, wall_thickness,office.height + wall_thickness * 2, color='black', lw=2, ec="black", fill=True)
-        # 下侧（左半部分）
-        draw_rect(ax, office.x + wall_thickness, office.y ,office.width / 2 - office.door_width / 2, wall_thickness, color='black', lw=2, ec="black", fill=True)
-        # 下侧（右半部分）
-        draw_rect(ax, office.x + wall_thickness + office.width / 2 + office.door_width / 2,office.y , office.width / 2 - office.door_width / 2, wall_thickness, color='black', lw=2, ec="black", fill=True)
-        # 上侧
-        draw_rect(ax, office.x + wall_thickness, office.y+wall_thickness+office.height, office.width, wall_thickness, color='black', lw=2,ec="black", fill=True)
-        # 门
-        draw_rect(ax, office.x + wall_thickness + office.width / 2 - office.door_width / 2, office.door_y, office.door_width, wall_thickness, color='brown', lw=2, ec="brown", fill=True)
-    # 绘制办公室的墙壁（右下）
-    for office in office_three:
-        # 左侧
-        draw_rect(ax, office.x, office.y, wall_thickness, office.height + wall_thickness * 2, 'black', 2,"black", fill=True)
-        # 右侧
-        draw_rect(ax, office.x + office.width + wall_thickness, office.y, wall_thickness, office.height + wall_thickness * 2, 'black', 2, "black", fill=True)
-        # 下侧
-        draw_rect(ax, office.x + wall_thickness, office.y, office.width-office.door_width, wall_thickness, 'black', 2, "black", fill=True)
-        # 上侧
-        draw_rect(ax, office.x + wall_thickness, office.y + office.height + wall_thickness, office.width , wall_thickness, 'black', 2, "black", fill=True)
-        # 楼梯门
-        draw_rect(ax, office.x + wall_thickness + office.width - office.door_width, office.door_y, office.door_width, wall_thickness, 'brown', 2, "brown", fill=True)
-
-    # 绘制房间的墙壁(右上)
-    for room in rooms_one:
-        # 左侧
-        draw_rect(ax, room.x, room.y, wall_thickness, room.height + wall_thickness * 2, color='black', lw=2, ec="black",fill=True)
-        # 右侧
-        draw_rect(ax, room.x + room.width + wall_thickness, room.y, wall_thickness, room.height + wall_thickness * 2, color='black', lw=2, ec="black", fill=True)
-        # 下侧
-        draw_rect(ax, room.x + wall_thickness, room.y, room.width, wall_thickness, color='black', lw=2, ec="black", fill=True)
-        # 上侧
-        draw_rect(ax, room.x + wall_thickness, room.y + room.height + wall_thickness, room.width - room.door_width, wall_thickness, 'black', 2, "black", fill=True)
-        # 门
-        draw_rect(ax, room.x + wall_thickness + room.width - room.door_width, room.door_y, room.door_width, wall_thickness, color='brown', lw=2, ec="brown", fill=True)
-        # 房间内部空间
-        draw_rect(ax, room.x + wall_thickness, room.y + wall_thickness, room.width, room.height, color='lightblue', lw=1, ec='lightblue', fill=True)
-
-    for bed in room1.beds + room2.beds + room6.beds + room7.beds + room12.beds +   room22.beds:
-            ax.add_patch(plt.Rectangle((bed.x, bed.y), bed.width, bed.height, color='brown', lw=1, ec="black"))
-    # 绘制房间的墙壁(中间)
-    for room in rooms_two:
-        # 左侧
-        draw_rect(ax, room.x, room.y, wall_thickness, room.height + wall_thickness * 2, color='black', lw=2, ec="black",fill=True)
-        # 右侧
-        draw_rect(ax, room.x + room.width + wall_thickness, room.y, wall_thickness, room.height + wall_thickness * 2,color='black', lw=2, ec="black", fill=True)
-        # 下侧
-        draw_rect(ax, room.x + wall_thickness, room.y, room.width, wall_thickness, color='black', lw=2, ec="black",fill=True)
-        # 上侧（左半部分）
-        draw_rect(ax, room.x + wall_thickness, room.y + room.height + wall_thickness,room.width / 2 - room.door_width / 2, wall_thickness, color='black', lw=2, ec="black", fill=True)
-        # 上侧（右半部分）
-        draw_rect(ax, room.x + wall_thickness + room.width / 2 + room.door_width / 2,room.y + room.height + wall_thickness, room.width / 2 - room.door_width / 2, wall_thickness, color='black', lw=2, ec="black", fill=True)
-        # 门
-        draw_rect(ax, room.x + wall_thickness + room.width / 2 - room.door_width / 2, room.door_y, room.door_width,wall_thickness, color='brown', lw=2, ec="brown", fill=True)
-        # 房间内部空间
-        draw_rect(ax, room.x + wall_thickness, room.y + wall_thickness, room.width, room.height, color='lightblue',lw=1, ec='lightblue', fill=True)
-
-    # 绘制房间的病床
-    for bed in  room3.beds + room4.beds + room5.beds + room8.beds+ room9.beds + room10.beds+room13.beds + room14.beds + room15.beds + room18.beds+ room19.beds + room20.beds:
-        ax.add_patch(plt.Rectangle((bed.x, bed.y), bed.width, bed.height, color='brown', lw=1, ec="black"))
-    # 绘制房间的墙壁(左上)
-    for room in rooms_three:
-        # 左侧
-        draw_rect(ax, room.x, room.y, wall_thickness, room.height + wall_thickness * 2, color='black', lw=2,ec="black", fill=True)
-        # 右侧
-        draw_rect(ax, room.x + room.width + wall_thickness, room.y, wall_thickness,room.height + wall_thickness * 2, color='black', lw=2, ec="black", fill=True)
-        # 下侧
-        draw_rect(ax, room.x + wall_thickness, room.y, room.width, wall_thickness, color='black', lw=2, ec="black", fill=True)
-        # 上侧
-        draw_rect(ax, room.x + wall_thickness+room.door_width, room.y + room.height + wall_thickness, room.width - room.door_width,wall_thickness, 'black', 2, "black", fill=True)
-        # 门
-        draw_rect(ax, room.x + wall_thickness , room.door_y, room.door_width,wall_thickness, color='brown', lw=2, ec="brown", fill=True)
-        # 房间内部空间
-        draw_rect(ax, room.x + wall_thickness, room.y + wall_thickness, room.width, room.height, color='lightblue',lw=1, ec='lightblue', fill=True)
-
-        for bed in room11.beds + room16.beds + room17.beds + room21.beds :
-            ax.add_patch(plt.Rectangle((bed.x, bed.y), bed.width, bed.height, color='brown', lw=1, ec="black"))
-        # 绘制病人（遍历所有房间的病人列表合并后的数据）
-        all_patients = []
-        for room in rooms_one+rooms_two+rooms_three:
-            all_patients.extend(room.patients)
-        for patient in all_patients:
-            ax.plot(patient.x, patient.y, 'ro', markersize=1)
-        draw_rect(ax, 0, 6.24, wall_thickness, 2.25, color='black', lw=2, ec="black", fill=True)
-        draw_rect(ax, 140.36, 6.24, wall_thickness, 2.25, color='black', lw=2, ec="black", fill=True)
+    patients_x, patients_y = engine.positions()
+    return renderer.update(patients_x, patients_y)
 # 动画函数
 def animate(i):
+    if profiler is not None:
+        t = profiler.clock()
     if update_patients():
         ani.event_source.stop()
-    draw()
-ani = animation.FuncAnimation(fig, animate, frames=200, interval=50, repeat=False)
-plt.show()
+    if profiler is not None:
+        t = profiler.lap('update_patients', t)
+    artists = draw()
+    if profiler is not None:
+        t = profiler.lap('draw', t)
+    frame_cost.record()
+    if profiler is not None:
+        profiler.lap('frame_cost', t)
+    return artists
+# 直接运行本文件时显示动画；无界面批量运行见 runner.py
+if __name__ == "__main__":
+    ani = animation.FuncAnimation(fig, animate, init_func=renderer.init, frames=None, interval=FRAME_INTERVAL,
+                                  repeat=False, blit=True, cache_frame_data=False)
+    plt.show()
+    if profiler is not None:
+        print(profiler.report())
+        print(engine.profiler.report())
+        print("simulated %.2f s in %d frames, %.1f steps per frame, %.2f s dropped" % (
+            driver.time, len(driver.substeps), np.mean(driver.substeps) if driver.substeps else 0.0, driver.dropped))
@@ -0,0 +1,176 @@
+import sys
+
+import numpy as np
+
+from geometry import rect_segments
+from obstacles import ObstacleIndex
+from spatial_hash import SpatialHash
+
+
+# Helbing 社会力模型（Helbing, Farkas & Vicsek 2000），对所有行人一次向量化计算：
+#
+#   dv/dt = (v0 * e - v) / tau + Σ_j f_ij / m + Σ_w f_iw / m
+#
+#   f_ij = (A exp((r_ij - d_ij) / B) + k g(r_ij - d_ij)) n_ij + kappa g(r_ij - d_ij) Δv_ji·t_ij t_ij
+#   f_iw = (A_w exp((r_i - d_iw) / B_w) + k g(r_i - d_iw)) n_iw - kappa g(r_i - d_iw) (v_i·t_iw) t_iw
+#
+# 其中 g(x) = max(x, 0) 只在身体接触时起作用。行人之间只比较 cutoff 范围内的候选对（空间哈希），
+# 墙壁为线段，按线段外接矩形分桶后只对 cutoff 范围内的候选线段计算点到线段的距离。
+# 单位为 m、s、kg；积分用显式的半隐式欧拉法（先更新速度再用新速度更新位置），步长 dt 可以设置
+class SocialForceModel:
+    def __init__(self, segments=(), dt=0.05, tau=0.5, mass=80.0, radius=0.3, a=2000.0, b=0.08, k=1.2e5,
+                 kappa=2.4e5, wall_a=None, wall_b=None, cutoff=1.0, max_speed_ratio=1.3):
+        # segments 为 (n, 4) 的墙壁线段 (x0, y0, x1, y1)
+        self.segments = np.ascontiguousarray(np.asarray(segments, dtype=float).reshape(-1, 4))
+        if dt <= 0:
+            raise ValueError("dt must be positive")
+        self.dt = dt
+        self.tau = tau  # 速度调整的弛豫时间
+        self.mass = mass
+        self.radius = radius  # 身体半径，可以是每个行人一个值的数组
+        self.a, self.b = a, b
+        self.wall_a = a if wall_a is None else wall_a
+        self.wall_b = b if wall_b is None else wall_b
+        self.k, self.kappa = k, kappa
+        self.cutoff = cutoff  # 超过这个距离的行人和墙壁不再计算作用力
+        self.max_speed_ratio = max_speed_ratio  # 速度上限为期望速度的倍数
+
+        s = self.segments
+        boxes = np.column_stack([np.minimum(s[:, 0], s[:, 2]), np.minimum(s[:, 1], s[:, 3]),
+                                 np.maximum(s[:, 0], s[:, 2]), np.maximum(s[:, 1], s[:, 3])])
+        # 点到线段外接矩形的距离不超过点到线段的距离，因此外接矩形的 near 查询不会漏掉候选线段
+        self.segment_index = ObstacleIndex(boxes, cell_size=cutoff)
+        self.grid = SpatialHash(cutoff)
+        # 可选的 profiling.PhaseProfiler；为 None 时不计时
+        self.profiler = None
+
+    @classmethod
+    def from_walls(cls, walls, **kwargs):
+        # walls 为 (n, 4) 的 (x0, y0, x1, y1) 墙壁矩形，每个矩形的四条边作为墙壁线段
+        return cls(rect_segments(walls), **kwargs)
+
+    def _radius(self, n):
+        return np.broadcast_to(np.asarray(self.radius, dtype=float), (n,))
+
+    def driving(self, vx, vy, ex, ey, desired_speed):
+        # 驱动力：在 tau 时间内把速度调整到期望方向上的期望速度
+        return (desired_speed * ex - vx) / self.tau, (desired_speed * ey - vy) / self.tau
+
+    def agent_forces(self, x, y, vx, vy):
+        # 行人之间的排斥力、身体挤压力和滑动摩擦力（已除以质量），每一对作用力大小相等、方向相反
+        n = x.size
+        fx, fy = np.zeros(n), np.zeros(n)
+        i, j, dx, dy, d = self.grid.build(x, y).pairs(self.cutoff)
+        keep = d > 0
+        if not np.any(keep):
+            return fx, fy
+        i, j, d = i[keep], j[keep], d[keep]
+        nx, ny = dx[keep] / d, dy[keep] / d  # 由 j 指向 i
+        radius = self._radius(n)
+        overlap = radius[i] + radius[j] - d
+        contact = np.maximum(overlap, 0.0)
+        normal = self.a * np.exp(overlap / self.b) + self.k * contact
+        tx, ty = -ny, nx
+        sliding = self.kappa * contact * ((vx[j] - vx[i]) * tx + (vy[j] - vy[i]) * ty)
+        pair_x = (normal * nx + sliding * tx) / self.mass
+        pair_y = (normal * ny + sliding * ty) / self.mass
+        fx += np.bincount(i, pair_x, n) - np.bincount(j, pair_x, n)
+        fy += np.bincount(i, pair_y, n) - np.bincount(j, pair_y, n)
+        return fx, fy
+
+    def wall_forces(self, x, y, vx, vy):
+        # 墙壁线段的排斥力、挤压力和摩擦力（已除以质量）
+        n = x.size
+        fx, fy = np.zeros(n), np.zeros(n)
+        points, items, _, _, _ = self.segment_index.near(x, y, self.cutoff)
+        if points.size == 0:
+            return fx, fy
+        s = self.segments[items]
+        px, py = x[points], y[points]
+        sx, sy = s[:, 2] - s[:, 0], s[:, 3] - s[:, 1]
+        length2 = np.maximum(sx * sx + sy * sy, 1e-12)
+        u = np.clip(((px - s[:, 0]) * sx + (py - s[:, 1]) * sy) / length2, 0.0, 1.0)
+        dx = px - (s[:, 0] + u * sx)
+        dy = py - (s[:, 1] + u * sy)
+        d = np.hypot(dx, dy)
+        keep = (d > 0) & (d < self.cutoff)
+        points, d = points[keep], d[keep]
+        nx, ny = dx[keep] / d, dy[keep] / d  # 由墙壁指向行人
+        overlap = self._radius(n)[points] - d
+        contact = np.maximum(overlap, 0.0)
+        normal = self.wall_a * np.exp(overlap / self.wall_b) + self.k * contact
+        tx, ty = -ny, nx
+        sliding = self.kappa * contact * (vx[points] * tx + vy[points] * ty)
+        fx += np.bincount(points, (normal * nx - sliding * tx) / self.mass, n)
+        fy += np.bincount(points, (normal * ny - sliding * ty) / self.mass, n)
+        return fx, fy
+
+    def acceleration(self, x, y, vx, vy, ex, ey, desired_speed):
+        # 合力产生的加速度；ex, ey 为期望方向（单位向量，到达目标时可以为 0）
+        prof = self.profiler
+        if prof is not None:
+            t = prof.clock()
+        ax, ay = self.driving(vx, vy, ex, ey, desired_speed)
+        if prof is not None:
+            t = prof.lap('driving', t)
+        fx, fy = self.agent_forces(x, y, vx, vy)
+        ax += fx
+        ay += fy
+        if prof is not None:
+            t = prof.lap('agent_forces', t)
+        fx, fy = self.wall_forces(x, y, vx, vy)
+        ax += fx
+        ay += fy
+        if prof is not None:
+            prof.lap('wall_forces', t)
+        return ax, ay
+
+    def step(self, x, y, vx, vy, ex, ey, desired_speed):
+        # 推进一个时间步 dt，原地更新 x, y, vx, vy（均为浮点数组）
+        ax, ay = self.acceleration(x, y, vx, vy, ex, ey, desired_speed)
+        prof = self.profiler
+        if prof is not None:
+            t = prof.clock()
+        vx += ax * self.dt
+        vy += ay * self.dt
+        # 速度不超过期望速度的 max_speed_ratio 倍
+        speed = np.hypot(vx, vy)
+        limit = self.max_speed_ratio * np.asarray(desired_speed, dtype=float)
+        scale = np.where(speed > limit, limit / np.maximum(speed, 1e-12), 1.0)
+        vx *= scale
+        vy *= scale
+        x += vx * self.dt
+        y += vy * self.dt
+        if prof is not None:
+            prof.lap('integrate', t)
+        return x, y, vx, vy
+
+
+if __name__ == "__main__":
+    # 用法：python social_force.py 布局文件 [dt 秒] [最长时间 秒]
+    # 每张病床一个病人，沿导航距离场的方向走向最近的楼梯间，用社会力模型推进，打印疏散用时
+    from layout import load_layout
+    from navigation import NavigationField
+
+    args = sys.argv[1:]
+    if not args:
+        sys.exit("usage: python social_force.py LAYOUT [DT] [MAX_SECONDS]")
+    layout = load_layout(args[0])
+    dt = float(args[1]) if len(args) > 1 else 0.05
+    max_seconds = float(args[2]) if len(args) > 2 else 600.0
+    model = SocialForceModel.from_walls(layout.walls, dt=dt)
+    navigation = NavigationField(layout.walls, layout.exit_stair_doors)
+    beds = layout.beds
+    x = beds[:, 0] + beds[:, 2] / 2
+    y = beds[:, 1] + beds[:, 3]
+    vx, vy = np.zeros_like(x), np.zeros_like(x)
+    desired_speed = np.full(x.size, 1.2)
+    total = x.size
+    steps = 0
+    while x.size and steps * dt < max_seconds:
+        distance, _, ex, ey = navigation.lookup(x, y)
+        model.step(x, y, vx, vy, ex, ey, desired_speed)
+        steps += 1
+        remaining = distance > 0.5
+        x, y, vx, vy, desired_speed = x[remaining], y[remaining], vx[remaining], vy[remaining], desired_speed[remaining]
+    print("%d of %d patients evacuated in %.1f s (%d steps of %.3f s)" % (total - x.size, total, steps * dt, steps, dt))
@@ -0,0 +1,89 @@
+import numpy as np
+
+# 只需检查本格以及右、上方向的相邻格，每一对病人只会出现一次
+HALF_SHELL = ((0, 0), (1, -1), (1, 0), (1, 1), (0, 1))
+
+
+def cell_key(cx, cy):
+    # 把二维格坐标压成一个整数键（坐标范围 ±2^31 以内）
+    return (np.asarray(cx, dtype=np.int64) << 32) + np.asarray(cy, dtype=np.int64)
+
+
+# 均匀网格空间哈希（cell list）：格子边长不小于相互作用半径，
+# 每个点只需与本格及相邻格中的点比较，代价与局部密度成正比
+class SpatialHash:
+    def __init__(self, cell_size=1.0):
+        self.cell_size = float(cell_size)
+        self.x = np.empty(0)
+        self.y = np.empty(0)
+        self.order = np.empty(0, dtype=np.intp)
+        self.keys = np.empty(0, dtype=np.int64)
+        self.cell_keys = np.empty(0, dtype=np.int64)
+        self.cell_start = np.empty(0, dtype=np.intp)
+        self.cell_end = np.empty(0, dtype=np.intp)
+
+    def build(self, x, y):
+        # 每一步重新建立索引：按格子键排序后记录每个格子在排序数组中的区间
+        self.x = np.asarray(x, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+        self.cx = np.floor(self.x / self.cell_size).astype(np.int64)
+        self.cy = np.floor(self.y / self.cell_size).astype(np.int64)
+        keys = cell_key(self.cx, self.cy)
+        self.order = np.argsort(keys, kind='stable')
+        self.keys = keys[self.order]
+        self.cell_keys, self.cell_start = np.unique(self.keys, return_index=True)
+        self.cell_end = np.append(self.cell_start[1:], self.keys.size)
+        return self
+
+    def _cell_range(self, keys):
+        # 查找若干格子键在排序数组中的 [start, end) 区间，不存在的格子区间为空
+        pos = np.searchsorted(self.cell_keys, keys)
+        pos_clipped = np.minimum(pos, max(self.cell_keys.size - 1, 0))
+        found = (pos < self.cell_keys.size) & (self.cell_keys[pos_clipped] == keys)
+        start = np.where(found, self.cell_start[pos_clipped], 0)
+        end = np.where(found, self.cell_end[pos_clipped], 0)
+        return start, end
+
+    def pairs(self, radius=None):
+        # 返回距离小于 radius 的所有点对 (i, j, dx, dy, d)，其中 dx = x[i] - x[j]
+        if radius is None:
+            radius = self.cell_size
+        if radius > self.cell_size:
+            raise ValueError("radius must not exceed the cell size")
+        n = self.x.size
+        empty = np.empty(0, dtype=np.intp)
+        if n < 2:
+            return empty, empty, np.empty(0), np.empty(0), np.empty(0)
+
+        rank = np.empty(n, dtype=np.intp)
+        rank[self.order] = np.arange(n)
+        all_i, all_j = [], []
+        for ox, oy in HALF_SHELL:
+            start, end = self._cell_range(cell_key(self.cx + ox, self.cy + oy))
+            if ox == 0 and oy == 0:
+                # 同一格内只取排序位置在自己之后的点，避免重复
+                start = np.maximum(start, rank + 1)
+            counts = np.maximum(end - start, 0)
+            total = counts.sum()
+            if total == 0:
+                continue
+            i = np.repeat(np.arange(n), counts)
+            offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+            j = self.order[np.repeat(start, counts) + offsets]
+            all_i.append(i)
+            all_j.append(j)
+        if not all_i:
+            return empty, empty, np.empty(0), np.empty(0), np.empty(0)
+
+        i = np.concatenate(all_i)
+        j = np.concatenate(all_j)
+        dx = self.x[i] - self.x[j]
+        dy = self.y[i] - self.y[j]
+        d = np.hypot(dx, dy)
+        close = d < radius
+        return i[close], j[close], dx[close], dy[close], d[close]
+
+
+def neighbor_pairs(x, y, radius):
+    # 便捷函数：以 radius 为格子边长建立索引并返回近邻点对
+    return SpatialHash(radius).build(x, y).pairs(radius)
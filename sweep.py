@@ -0,0 +1,142 @@
+import hashlib
+import itertools
+import json
+import os
+import sys
+from concurrent.futures import as_completed
+
+import numpy as np
+
+from ensemble import EnsembleResult, normalize_params, percentile, replicate_streams, worker_pool
+from layout import load_layout
+
+DEFAULT_STORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.sweep_cache')
+# 结果依赖的源文件（worker 运行一次时导入的全部本地模块），任何一个修改后旧结果自动失效
+CODE_FILES = ('density.py', 'engine.py', 'ensemble.py', 'geometry.py', 'layout.py', 'navigation.py', 'obstacles.py',
+              'regions.py', 'runner.py', 'shared.py', 'spatial_hash.py')
+
+
+def code_version():
+    digest = hashlib.sha256()
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for name in CODE_FILES:
+        with open(os.path.join(directory, name), 'rb') as f:
+            digest.update(name.encode() + b'\0' + f.read() + b'\0')
+    return digest.hexdigest()[:16]
+
+
+def grid(**axes):
+    # 参数网格：grid(avoid_gain=[0.3, 0.6], door_radius=[0.3, 0.5]) -> 4 个参数字典
+    names = list(axes)
+    return [dict(zip(names, values)) for values in itertools.product(*(axes[name] for name in names))]
+
+
+def _json_value(value):
+    # numpy 标量转成 Python 数值，保证同样的参数得到同样的 JSON
+    if hasattr(value, 'item'):
+        return value.item()
+    raise TypeError("cannot hash parameter value %r" % (value,))
+
+
+def result_key(layout_key, params, seed, replicate, version, options=None):
+    # 结果的键：布局内容、完整参数、随机种子、重复编号、代码版本，
+    # 以及其他影响单次运行结果的设置（options，例如最大步数、是否使用导航距离场）的哈希
+    text = json.dumps({'layout': layout_key, 'params': params, 'seed': seed, 'replicate': replicate,
+                       'code': version, 'options': options or {}}, sort_keys=True, default=_json_value)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+# 以结果键为文件名的 .npz 结果库
+class ResultStore:
+    FIELDS = ('room', 'exit_step', 'exit_stair', 'steps')
+
+    def __init__(self, directory=DEFAULT_STORE_DIR):
+        self.directory = directory
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key + '.npz')
+
+    def __contains__(self, key):
+        return os.path.exists(self.path(key))
+
+    def get(self, key):
+        with np.load(self.path(key)) as data:
+            return tuple(data[name] for name in self.FIELDS[:3]) + (int(data['steps']),)
+
+    def put(self, key, outcome, params):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 先写临时文件再改名，中断的写入不会留下损坏的结果
+        temporary = '%s.%d.tmp.npz' % (path[:-4], os.getpid())
+        np.savez(temporary, params=json.dumps(params, sort_keys=True, default=_json_value),
+                 **dict(zip(self.FIELDS, outcome)))
+        os.replace(temporary, path)
+
+
+# 一次扫描的结果：每组参数一个 EnsembleResult
+class SweepResult:
+    def __init__(self, points, results, computed, reused):
+        self.points = points  # 用户给出的参数字典
+        self.results = results
+        self.computed = computed  # 本次实际运行的次数
+        self.reused = reused  # 直接读取结果库的次数
+
+    def summary(self):
+        lines = ["runs: %d computed, %d reused" % (self.computed, self.reused),
+                 "%-48s %9s %9s %9s" % ('parameters', 'mean s', 'p95 s', 'max s')]
+        for point, result in zip(self.points, self.results):
+            times = result.evacuation_times
+            label = ', '.join('%s=%s' % item for item in sorted(point.items())) or '(defaults)'
+            lines.append("%-48s %9.1f %9.1f %9.1f" % (label, times.mean(), percentile(times, 95), times.max()))
+        return "\n".join(lines)
+
+
+# 参数扫描：每组参数运行 replicates 次随机场景，已经算过的 (布局, 参数, 种子, 重复编号, 代码版本) 直接复用
+def run_sweep(layout_path, points, replicates=10, seed=0, max_steps=100000, max_workers=None, navigation=True,
+              store=None, executor='process'):
+    store = ResultStore() if store is None else store
+    layout = load_layout(layout_path)
+    version = code_version()
+    full = [normalize_params(point) for point in points]
+    options = {'max_steps': int(max_steps), 'navigation': bool(navigation)}
+    keys = [[result_key(layout.key, params, seed, replicate, version, options) for replicate in range(replicates)]
+            for params in full]
+
+    outcomes = {}
+    missing = []
+    for params, point_keys in zip(full, keys):
+        for replicate, key in enumerate(point_keys):
+            if key in outcomes:
+                continue
+            if key in store:
+                outcomes[key] = store.get(key)
+            else:
+                outcomes[key] = None
+                missing.append((key, replicate, params))
+    reused = len(outcomes) - len(missing)
+
+    if missing:
+        # 各组参数的第 i 次重复使用同一个随机数流（公共随机数），参数之间的差异不会被抽样噪声掩盖
+        streams = replicate_streams(seed, replicates)
+        with worker_pool(layout, navigation, max_workers, executor) as (pool, task):
+            futures = {pool.submit(task, streams[replicate], params, max_steps): (key, params)
+                       for key, replicate, params in missing}
+            # 每完成一次就写入结果库，中断后重新运行只需补算剩下的部分
+            for future in as_completed(futures):
+                key, params = futures[future]
+                outcomes[key] = future.result()
+                store.put(key, outcomes[key], params)
+
+    results = [EnsembleResult.collect(layout, [outcomes[key] for key in point_keys], params['dt'])
+               for params, point_keys in zip(full, keys)]
+    return SweepResult(list(points), results, len(missing), reused)
+
+
+if __name__ == "__main__":
+    # 用法：python sweep.py 布局文件 '{"avoid_gain": [0.3, 0.6], "door_radius": [0.3, 0.5]}' [重复次数] [随机种子]
+    args = sys.argv[1:]
+    if len(args) < 2:
+        sys.exit("usage: python sweep.py LAYOUT GRID_JSON [REPLICATES] [SEED]")
+    replicates = int(args[2]) if len(args) > 2 else 10
+    seed = int(args[3]) if len(args) > 3 else 0
+    print(run_sweep(args[0], grid(**json.loads(args[1])), replicates, seed).summary())
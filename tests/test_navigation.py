@@ -0,0 +1,51 @@
+import os
+
+import numpy as np
+import pytest
+
+from layout import load_layout
+from navigation import NavigationField, dijkstra_fill, flood_fill
+
+WARD = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'layouts', 'ward.json')
+
+
+def ward_field():
+    layout = load_layout(WARD)
+    return NavigationField(layout.walls, layout.exit_stair_doors)
+
+
+def test_flood_fill_matches_dijkstra_on_ward():
+    # 按波前整批松弛的结果与逐格 Dijkstra 逐位相同；最近源编号只在到两个源的距离完全相等时允许不同
+    field = ward_field()
+    distance, nearest = flood_fill(field.blocked, field.sources, field.cell_size)
+    expected_distance, expected_nearest = dijkstra_fill(field.blocked, field.sources, field.cell_size)
+    assert np.isfinite(expected_distance).any()
+    np.testing.assert_array_equal(distance, expected_distance)
+    differ = nearest != expected_nearest
+    if np.any(differ):
+        single = [dijkstra_fill(field.blocked, [cells], field.cell_size)[0] for cells in field.sources]
+        assert np.all(np.take_along_axis(np.stack(single), nearest[None], 0)[0][differ] == distance[differ])
+
+
+def test_single_source_field_matches_dijkstra():
+    field = ward_field()
+    for target, cells in enumerate(field.sources):
+        expected, _ = dijkstra_fill(field.blocked, [cells], field.cell_size)
+        np.testing.assert_array_equal(field.field(target), expected)
+
+
+def test_flood_fill_does_not_cut_wall_corners():
+    # 两块墙只在角上相接时不能斜穿过去，要绕行
+    blocked = np.zeros((3, 3), dtype=bool)
+    blocked[0, 1] = blocked[1, 0] = True
+    distance, nearest = flood_fill(blocked, [np.array([0])], 1.0)
+    expected, _ = dijkstra_fill(blocked, [np.array([0])], 1.0)
+    np.testing.assert_array_equal(distance, expected)
+    assert distance[1, 1] == np.inf
+    assert nearest[0, 0] == 0 and nearest[2, 2] == -1
+
+
+def test_flood_fill_times_out():
+    field = ward_field()
+    with pytest.raises(TimeoutError):
+        flood_fill(field.blocked, field.sources, field.cell_size, deadline=0.0)
@@ -92,11 +92,7 @@ class Patient:
                 attraction_force = k_attraction * target_dist
                 force_x += attraction_force * target_dx / target_dist
                 force_y += attraction_force * target_dy / target_dist
-            print(f"Attraction force: ({force_x}, {force_y})")
-        else:
-            print("No staircase found.")
-
-        print(f"Repulsion force: ({force_x}, {force_y})")  # 打印排斥力
+        # 每次调用都会执行，不在这里打印；批量计算见 social_force.SocialForceModel
         return force_x, force_y
 
     def update_position(self):